@@ -1,12 +1,24 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse
-import json
 import logging
 from datetime import datetime
-import uuid
 
 from app.api.health import router as health_router
 from app.api.v1.ondc_bap import router as ondc_bap_router
+from app.core.logging_config import body_logger
+from app.core.ondc_models import (
+    EKYCInitiateRequest,
+    EKYCSearchRequest,
+    EKYCSelectRequest,
+    EKYCStatusRequest,
+    EKYCVerifyRequest,
+    UpdateRequest,
+    parse_envelope,
+)
+from app.core.ondc_context import context_factory, format_ondc_timestamp
+from app.core.config import settings
+from app.core.ondc_responses import FastJSONResponse, ndjson_response
+from app.core.transaction_store import decode_cursor, ekyc_store, order_store
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +62,7 @@ async def lookup():
             logger.warning(f"Could not load cryptographic keys: {str(e)}")
             result["keys_available"] = False
         
-        logger.info(f"Lookup result: {json.dumps(result, indent=2)}")
+        body_logger.body(logger, "Lookup result", result, "/lookup")
         return result
         
     except Exception as e:
@@ -71,7 +83,7 @@ async def vlookup(request: Request):
     try:
         # Get request body
         body = await request.json()
-        logger.info(f"ONDC vlookup request: {json.dumps(body, indent=2)}")
+        body_logger.body(logger, "ONDC vlookup request", body, request.url.path)
         
         # Validate required fields
         required_fields = ["sender_subscriber_id", "request_id", "timestamp", "signature", "search_parameters"]
@@ -103,10 +115,20 @@ async def vlookup(request: Request):
         signature_data = f"{search_parameters['country']}|{search_parameters['domain']}|{search_parameters['type']}|{search_parameters['city']}|{search_parameters['subscriber_id']}"
         
         logger.info(f"Signature data to verify: {signature_data}")
-        logger.info(f"Received signature: {signature}")
+        
+        # Verify the body signature with the sender's cached signing key (log-only for now)
+        from app.core.ondc_auth import auth_verifier
+        signature_valid = await auth_verifier.verify_detached(
+            sender_subscriber_id, None, signature_data.encode("utf-8"), signature
+        )
+        header_auth = getattr(request.state, "ondc_auth", None)
+        logger.info(
+            f"vlookup signature valid: {signature_valid}, "
+            f"Authorization header verified: {header_auth.verified if header_auth else 'not checked'}"
+        )
         
         # For now, we'll return a mock response
-        # In production, you would verify the signature and query the actual registry
+        # In production, you would query the actual registry
         
         # Mock response for neo-server.rozana.in lookup
         if search_parameters["subscriber_id"] == "neo-server.rozana.in":
@@ -139,8 +161,9 @@ async def vlookup(request: Request):
                 "data": None
             }
         
-        logger.info(f"ONDC vlookup response: {json.dumps(response, indent=2)}")
-        return response
+        body_logger.body(logger, "ONDC vlookup response", response, request.url.path)
+        # Plain str/int payload: render directly, skipping jsonable_encoder
+        return FastJSONResponse(response)
         
     except HTTPException:
         raise
@@ -161,7 +184,7 @@ async def site_verification():
     """
     try:
         # Try to read the generated verification file
-        with open("ondc-site-verification.html", 'r') as f:
+        with open(settings.ONDC_SITE_VERIFICATION_PATH, 'r') as f:
             content = f.read()
         return HTMLResponse(content=content)
     except FileNotFoundError:
@@ -184,40 +207,20 @@ async def site_verification():
 
 # eKYC Endpoints - Direct access at root level (for production compatibility)
 from typing import Optional, List, Dict, Any
-import uuid
-from datetime import datetime, timezone
 
-# In-memory storage for eKYC transactions (replace with database in production)
-ekyc_transactions = {}
-
-class EKYCContext:
-    def __init__(self, domain="ONDC:RET10", country="IND", city="std:011", action="", 
-                 core_version="1.2.0", bap_id="neo-server.rozana.in", 
-                 bap_uri="https://neo-server.rozana.in", transaction_id="", 
-                 message_id="", timestamp="", ttl="PT30S"):
-        self.domain = domain
-        self.country = country
-        self.city = city
-        self.action = action
-        self.core_version = core_version
-        self.bap_id = bap_id
-        self.bap_uri = bap_uri
-        self.transaction_id = transaction_id
-        self.message_id = message_id
-        self.timestamp = timestamp
-        self.ttl = ttl
+# eKYC transactions live in the shared transaction store (app.core.transaction_store)
 
 def generate_transaction_id() -> str:
     """Generate unique transaction ID"""
-    return str(uuid.uuid4())
+    return context_factory.new_transaction_id()
 
 def generate_message_id() -> str:
     """Generate unique message ID"""
-    return str(uuid.uuid4())
+    return context_factory.next_message_id()
 
 def get_current_timestamp() -> str:
-    """Get current timestamp in ISO format"""
-    return datetime.now(timezone.utc).isoformat()
+    """Get current timestamp in ONDC format (UTC, milliseconds)"""
+    return format_ondc_timestamp()
 
 @api_router.get("/ekyc/health")
 async def ekyc_health():
@@ -245,8 +248,8 @@ async def ekyc_search(request: Request):
     Search for eKYC providers
     """
     try:
-        body = await request.json()
-        logger.info(f"eKYC Search request received: {json.dumps(body, indent=2)}")
+        envelope = await parse_envelope(request, EKYCSearchRequest)
+        body_logger.body(logger, "eKYC Search request received", request.state.raw_body, request.url.path)
         
         # Mock eKYC providers
         providers = [
@@ -277,23 +280,11 @@ async def ekyc_search(request: Request):
         ]
         
         # Extract context from request
-        context = body.get("context", {})
-        transaction_id = context.get("transaction_id", generate_transaction_id())
+        context = envelope.context
+        transaction_id = context.transaction_id or generate_transaction_id()
         
         response = {
-            "context": {
-                "domain": context.get("domain", "ONDC:RET10"),
-                "country": context.get("country", "IND"),
-                "city": context.get("city", "std:011"),
-                "action": "search",
-                "core_version": context.get("core_version", "1.2.0"),
-                "bap_id": context.get("bap_id", "neo-server.rozana.in"),
-                "bap_uri": context.get("bap_uri", "https://neo-server.rozana.in"),
-                "transaction_id": transaction_id,
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": context.get("ttl", "PT30S")
-            },
+            "context": context_factory.reply(context, "search", transaction_id),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -306,8 +297,10 @@ async def ekyc_search(request: Request):
         }
         
         logger.info(f"eKYC Search response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"eKYC Search error: {e}")
         raise HTTPException(
@@ -321,13 +314,13 @@ async def ekyc_select(request: Request):
     Select eKYC provider
     """
     try:
-        body = await request.json()
-        logger.info(f"eKYC Select request received: {json.dumps(body, indent=2)}")
+        envelope = await parse_envelope(request, EKYCSelectRequest)
+        body_logger.body(logger, "eKYC Select request received", request.state.raw_body, request.url.path)
         
-        context = body.get("context", {})
-        message = body.get("message", {})
+        context = envelope.context
+        message = envelope.message
         
-        provider_id = message.get("order", {}).get("provider", {}).get("id")
+        provider_id = message.order.provider_id
         if not provider_id:
             provider_id = "pramaan.ondc.org"  # Default provider
         
@@ -342,22 +335,10 @@ async def ekyc_select(request: Request):
             "success_rate": "99.5%"
         }
         
-        transaction_id = context.get("transaction_id", generate_transaction_id())
+        transaction_id = context.transaction_id or generate_transaction_id()
         
         response = {
-            "context": {
-                "domain": context.get("domain", "ONDC:RET10"),
-                "country": context.get("country", "IND"),
-                "city": context.get("city", "std:011"),
-                "action": "select",
-                "core_version": context.get("core_version", "1.2.0"),
-                "bap_id": context.get("bap_id", "neo-server.rozana.in"),
-                "bap_uri": context.get("bap_uri", "https://neo-server.rozana.in"),
-                "transaction_id": transaction_id,
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": context.get("ttl", "PT30S")
-            },
+            "context": context_factory.reply(context, "select", transaction_id),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -379,8 +360,10 @@ async def ekyc_select(request: Request):
         }
         
         logger.info(f"eKYC Select response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"eKYC Select error: {e}")
         raise HTTPException(
@@ -394,38 +377,26 @@ async def ekyc_initiate(request: Request):
     Initiate eKYC process
     """
     try:
-        body = await request.json()
-        logger.info(f"eKYC Initiate request received: {json.dumps(body, indent=2)}")
+        envelope = await parse_envelope(request, EKYCInitiateRequest)
+        body_logger.body(logger, "eKYC Initiate request received", request.state.raw_body, request.url.path)
         
-        context = body.get("context", {})
-        message = body.get("message", {})
+        context = envelope.context
+        message = envelope.message
         
-        transaction_id = context.get("transaction_id", generate_transaction_id())
+        transaction_id = context.transaction_id or generate_transaction_id()
         order_id = f"ekyc_order_{int(datetime.now().timestamp())}"
         
         # Store transaction
-        ekyc_transactions[transaction_id] = {
+        await ekyc_store.put(transaction_id, {
             "order_id": order_id,
             "status": "INITIATED",
-            "provider": message.get("order", {}).get("provider", {}).get("id", "pramaan.ondc.org"),
+            "provider": message.order.provider_id or "pramaan.ondc.org",
             "created_at": get_current_timestamp(),
             "updated_at": get_current_timestamp()
-        }
+        })
         
         response = {
-            "context": {
-                "domain": context.get("domain", "ONDC:RET10"),
-                "country": context.get("country", "IND"),
-                "city": context.get("city", "std:011"),
-                "action": "initiate",
-                "core_version": context.get("core_version", "1.2.0"),
-                "bap_id": context.get("bap_id", "neo-server.rozana.in"),
-                "bap_uri": context.get("bap_uri", "https://neo-server.rozana.in"),
-                "transaction_id": transaction_id,
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": context.get("ttl", "PT30S")
-            },
+            "context": context_factory.reply(context, "initiate", transaction_id),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -434,7 +405,7 @@ async def ekyc_initiate(request: Request):
                     "id": order_id,
                     "status": "INITIATED",
                     "provider": {
-                        "id": message.get("order", {}).get("provider", {}).get("id", "pramaan.ondc.org")
+                        "id": message.order.provider_id or "pramaan.ondc.org"
                     },
                     "items": [
                         {
@@ -453,8 +424,10 @@ async def ekyc_initiate(request: Request):
         }
         
         logger.info(f"eKYC Initiate response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"eKYC Initiate error: {e}")
         raise HTTPException(
@@ -468,13 +441,13 @@ async def ekyc_verify(request: Request):
     Verify eKYC documents
     """
     try:
-        body = await request.json()
-        logger.info(f"eKYC Verify request received: {json.dumps(body, indent=2)}")
+        envelope = await parse_envelope(request, EKYCVerifyRequest)
+        body_logger.body(logger, "eKYC Verify request received", request.state.raw_body, request.url.path)
         
-        context = body.get("context", {})
-        message = body.get("message", {})
+        context = envelope.context
+        message = envelope.message
         
-        transaction_id = context.get("transaction_id", generate_transaction_id())
+        transaction_id = context.transaction_id or generate_transaction_id()
         
         # Mock verification process
         verification_result = {
@@ -487,25 +460,15 @@ async def ekyc_verify(request: Request):
         }
         
         # Update transaction if exists
-        if transaction_id in ekyc_transactions:
-            ekyc_transactions[transaction_id]["status"] = "VERIFIED"
-            ekyc_transactions[transaction_id]["updated_at"] = get_current_timestamp()
-            ekyc_transactions[transaction_id]["verification_result"] = verification_result
+        await ekyc_store.update(
+            transaction_id,
+            status="VERIFIED",
+            updated_at=get_current_timestamp(),
+            verification_result=verification_result,
+        )
         
         response = {
-            "context": {
-                "domain": context.get("domain", "ONDC:RET10"),
-                "country": context.get("country", "IND"),
-                "city": context.get("city", "std:011"),
-                "action": "verify",
-                "core_version": context.get("core_version", "1.2.0"),
-                "bap_id": context.get("bap_id", "neo-server.rozana.in"),
-                "bap_uri": context.get("bap_uri", "https://neo-server.rozana.in"),
-                "transaction_id": transaction_id,
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": context.get("ttl", "PT30S")
-            },
+            "context": context_factory.reply(context, "verify", transaction_id),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -515,8 +478,10 @@ async def ekyc_verify(request: Request):
         }
         
         logger.info(f"eKYC Verify response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"eKYC Verify error: {e}")
         raise HTTPException(
@@ -525,17 +490,43 @@ async def ekyc_verify(request: Request):
         )
 
 @api_router.get("/ekyc/transactions")
-async def get_ekyc_transactions():
+async def get_ekyc_transactions(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.TRANSACTION_PAGE_SIZE, ge=1, le=settings.TRANSACTION_PAGE_MAX),
+    status: Optional[str] = None,
+    provider: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
     """
-    Get all stored eKYC transaction data
+    Get stored eKYC transaction data, most recently updated first.
+    Pages are resumed with the returned next_cursor; format=ndjson streams every
+    matching transaction as one JSON line each, reading the store page by page.
     """
+    filters = {"status": status, "provider_id": provider, "since": since, "until": until}
     try:
-        return {
+        if format == "ndjson":
+            if cursor:
+                # Reject a bad cursor before the stream starts
+                decode_cursor(cursor)
+            records = (
+                {"transaction_id": transaction_id, **record}
+                async for transaction_id, record in ekyc_store.iter_records(limit, cursor, **filters)
+            )
+            return ndjson_response(records)
+
+        transactions, next_cursor = await ekyc_store.page(limit, cursor, **filters)
+        return FastJSONResponse({
             "status": "success",
-            "total_transactions": len(ekyc_transactions),
-            "transactions": ekyc_transactions,
-            "message": "Current eKYC transactions stored in memory"
-        }
+            "total_transactions": await ekyc_store.count(),
+            "count": len(transactions),
+            "transactions": transactions,
+            "next_cursor": next_cursor,
+            "message": "Current eKYC transactions stored in the transaction store"
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving eKYC transactions: {e}")
         raise HTTPException(
@@ -546,19 +537,21 @@ async def get_ekyc_transactions():
 @api_router.get("/ekyc/transaction/{transaction_id}")
 async def get_ekyc_transaction(transaction_id: str):
     """
-    Get specific eKYC transaction by ID
+    Get specific eKYC transaction by transaction ID or order ID
     """
     try:
-        if transaction_id not in ekyc_transactions:
+        found = await ekyc_store.resolve(transaction_id, order_id=transaction_id)
+        if found is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"Transaction {transaction_id} not found"
             )
+        transaction_id, transaction_data = found
         
         return {
             "status": "success",
             "transaction_id": transaction_id,
-            "transaction_data": ekyc_transactions[transaction_id]
+            "transaction_data": transaction_data
         }
     except HTTPException:
         raise
@@ -575,37 +568,26 @@ async def ekyc_status(request: Request):
     Check eKYC verification status
     """
     try:
-        body = await request.json()
-        logger.info(f"eKYC Status request received: {json.dumps(body, indent=2)}")
+        envelope = await parse_envelope(request, EKYCStatusRequest)
+        body_logger.body(logger, "eKYC Status request received", request.state.raw_body, request.url.path)
         
-        context = body.get("context", {})
-        message = body.get("message", {})
+        context = envelope.context
+        message = envelope.message
         
-        transaction_id = context.get("transaction_id")
-        order_id = message.get("order_id")
+        transaction_id = context.transaction_id
+        order_id = message.order_id
         
-        # Look up transaction status
+        # Look up transaction status, by order id when the transaction id is unknown
         transaction_status = "UNKNOWN"
         transaction_data = None
         
-        if transaction_id and transaction_id in ekyc_transactions:
-            transaction_data = ekyc_transactions[transaction_id]
+        found = await ekyc_store.resolve(transaction_id, order_id)
+        if found:
+            transaction_id, transaction_data = found
             transaction_status = transaction_data["status"]
         
         response = {
-            "context": {
-                "domain": context.get("domain", "ONDC:RET10"),
-                "country": context.get("country", "IND"),
-                "city": context.get("city", "std:011"),
-                "action": "status",
-                "core_version": context.get("core_version", "1.2.0"),
-                "bap_id": context.get("bap_id", "neo-server.rozana.in"),
-                "bap_uri": context.get("bap_uri", "https://neo-server.rozana.in"),
-                "transaction_id": transaction_id or generate_transaction_id(),
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": context.get("ttl", "PT30S")
-            },
+            "context": context_factory.reply(context, "status", transaction_id),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -620,8 +602,10 @@ async def ekyc_status(request: Request):
         }
         
         logger.info(f"eKYC Status response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"eKYC Status error: {e}")
         raise HTTPException(
@@ -635,30 +619,18 @@ async def update_order(request: Request):
     Update order endpoint - handles order modifications, returns, cancellations
     """
     try:
-        body = await request.json()
-        logger.info(f"Update request received: {json.dumps(body, indent=2)}")
+        envelope = await parse_envelope(request, UpdateRequest)
+        body_logger.body(logger, "Update request received", request.state.raw_body, request.url.path)
         
-        context = body.get("context", {})
-        message = body.get("message", {})
+        context = envelope.context
+        message = envelope.message
         
         # Extract update details
-        update_target = message.get("update_target", "order")
-        order_id = message.get("order", {}).get("id", "default_order")
+        update_target = message.update_target
+        order_id = message.order.id or "default_order"
         
         response = {
-            "context": {
-                "domain": context.get("domain", "ONDC:RET10"),
-                "country": context.get("country", "IND"),
-                "city": context.get("city", "std:011"),
-                "action": "update",
-                "core_version": context.get("core_version", "1.2.0"),
-                "bap_id": context.get("bap_id", "neo-server.rozana.in"),
-                "bap_uri": context.get("bap_uri", "https://neo-server.rozana.in"),
-                "transaction_id": context.get("transaction_id", generate_transaction_id()),
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": context.get("ttl", "PT30S")
-            },
+            "context": context_factory.reply(context, "update"),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -672,9 +644,22 @@ async def update_order(request: Request):
             }
         }
         
+        # Record the update against the order's transaction
+        transaction_id = response["context"]["transaction_id"]
+        await order_store.update(
+            transaction_id,
+            default={"created_at": get_current_timestamp()},
+            order_id=order_id,
+            status="UPDATED",
+            update_target=update_target,
+            updated_at=response["message"]["order"]["updated_at"],
+        )
+        
         logger.info(f"Update response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Update error: {e}")
         return "OK"
@@ -3,33 +3,28 @@ eKYC Service Implementation for ONDC
 Implements all eKYC operations: search, select, initiate, verify, status
 """
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-import uuid
-import json
-from datetime import datetime, timezone
 import logging
 
+from app.core.config import settings
+from app.core.ondc_models import EKYCContext as BaseEKYCContext, ONDCRequest, envelope_dependency
+from app.core.ondc_context import context_factory, format_ondc_timestamp
+from app.core.ondc_responses import FastJSONResponse, ndjson_response
+from app.core.transaction_store import decode_cursor, ekyc_session_store
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ekyc", tags=["eKYC"])
 
-# In-memory storage for eKYC transactions (replace with database in production)
-ekyc_transactions = {}
+# eKYC sessions live in the shared transaction store (app.core.transaction_store)
 
-class EKYCContext(BaseModel):
-    domain: str = "ONDC:RET10"
-    country: str = "IND"
-    city: str = "std:011"
+class EKYCContext(BaseEKYCContext):
     action: str
-    core_version: str = "1.2.0"
-    bap_id: str = "neo-server.rozana.in"
-    bap_uri: str = "https://neo-server.rozana.in"
     transaction_id: str
     message_id: str
     timestamp: str
-    ttl: str = "PT30S"
 
 class EKYCRequester(BaseModel):
     type: str = "CONSUMER"
@@ -41,40 +36,40 @@ class EKYCProvider(BaseModel):
     description: Optional[str] = None
     category: Optional[str] = None
 
-class EKYCInitiateRequest(BaseModel):
+class EKYCEnvelope(ONDCRequest):
+    """eKYC envelope; validated from the raw body bytes by envelope_dependency"""
     context: EKYCContext
     message: Dict[str, Any]
 
-class EKYCVerifyRequest(BaseModel):
-    context: EKYCContext
-    message: Dict[str, Any]
+class EKYCInitiateRequest(EKYCEnvelope):
+    pass
 
-class EKYCStatusRequest(BaseModel):
-    context: EKYCContext
-    message: Dict[str, Any]
+class EKYCVerifyRequest(EKYCEnvelope):
+    pass
 
-class EKYCSearchRequest(BaseModel):
-    context: EKYCContext
-    message: Dict[str, Any]
+class EKYCStatusRequest(EKYCEnvelope):
+    pass
 
-class EKYCSelectRequest(BaseModel):
-    context: EKYCContext
-    message: Dict[str, Any]
+class EKYCSearchRequest(EKYCEnvelope):
+    pass
+
+class EKYCSelectRequest(EKYCEnvelope):
+    pass
 
 def generate_transaction_id() -> str:
     """Generate unique transaction ID"""
-    return str(uuid.uuid4())
+    return context_factory.new_transaction_id()
 
 def generate_message_id() -> str:
     """Generate unique message ID"""
-    return str(uuid.uuid4())
+    return context_factory.next_message_id()
 
 def get_current_timestamp() -> str:
-    """Get current timestamp in ISO format"""
-    return datetime.now(timezone.utc).isoformat()
+    """Get current timestamp in ONDC format (UTC, milliseconds)"""
+    return format_ondc_timestamp()
 
 @router.post("/search", status_code=status.HTTP_200_OK)
-async def ekyc_search(request: EKYCSearchRequest):
+async def ekyc_search(request: EKYCSearchRequest = Depends(envelope_dependency(EKYCSearchRequest))):
     """
     Search for eKYC providers
     """
@@ -110,19 +105,7 @@ async def ekyc_search(request: EKYCSearchRequest):
         ]
         
         response = {
-            "context": {
-                "domain": request.context.domain,
-                "country": request.context.country,
-                "city": request.context.city,
-                "action": "search",
-                "core_version": request.context.core_version,
-                "bap_id": request.context.bap_id,
-                "bap_uri": request.context.bap_uri,
-                "transaction_id": request.context.transaction_id,
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": request.context.ttl
-            },
+            "context": context_factory.reply(request.context, "search"),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -135,7 +118,7 @@ async def ekyc_search(request: EKYCSearchRequest):
         }
         
         logger.info(f"eKYC Search response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
     except Exception as e:
         logger.error(f"eKYC Search error: {e}")
@@ -145,7 +128,7 @@ async def ekyc_search(request: EKYCSearchRequest):
         )
 
 @router.post("/select", status_code=status.HTTP_200_OK)
-async def ekyc_select(request: EKYCSelectRequest):
+async def ekyc_select(request: EKYCSelectRequest = Depends(envelope_dependency(EKYCSelectRequest))):
     """
     Select eKYC provider
     """
@@ -171,19 +154,7 @@ async def ekyc_select(request: EKYCSelectRequest):
         }
         
         response = {
-            "context": {
-                "domain": request.context.domain,
-                "country": request.context.country,
-                "city": request.context.city,
-                "action": "select",
-                "core_version": request.context.core_version,
-                "bap_id": request.context.bap_id,
-                "bap_uri": request.context.bap_uri,
-                "transaction_id": request.context.transaction_id,
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": request.context.ttl
-            },
+            "context": context_factory.reply(request.context, "select"),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -209,7 +180,7 @@ async def ekyc_select(request: EKYCSelectRequest):
         }
         
         logger.info(f"eKYC Select response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
     except Exception as e:
         logger.error(f"eKYC Select error: {e}")
@@ -219,7 +190,7 @@ async def ekyc_select(request: EKYCSelectRequest):
         )
 
 @router.post("/initiate", status_code=status.HTTP_200_OK)
-async def ekyc_initiate(request: EKYCInitiateRequest):
+async def ekyc_initiate(request: EKYCInitiateRequest = Depends(envelope_dependency(EKYCInitiateRequest))):
     """
     Initiate eKYC process
     """
@@ -230,33 +201,24 @@ async def ekyc_initiate(request: EKYCInitiateRequest):
         ekyc_transaction_id = generate_transaction_id()
         
         # Store transaction details
-        ekyc_transactions[ekyc_transaction_id] = {
+        created_at = get_current_timestamp()
+        transaction = {
             "status": "INITIATED",
-            "created_at": get_current_timestamp(),
+            "created_at": created_at,
+            "updated_at": created_at,
             "requester": request.message.get("init", {}).get("requester", {}),
             "purpose": request.message.get("init", {}).get("purpose", {}),
             "auth_type": request.message.get("init", {}).get("auth", {}).get("type", "OTP"),
             "provider_id": request.message.get("init", {}).get("provider", {}).get("id"),
             "documents": request.message.get("init", {}).get("documents", [])
         }
+        await ekyc_session_store.put(ekyc_transaction_id, transaction)
         
         # Mock OTP generation
         otp = "123456"  # In production, generate real OTP
         
         response = {
-            "context": {
-                "domain": request.context.domain,
-                "country": request.context.country,
-                "city": request.context.city,
-                "action": "initiate",
-                "core_version": request.context.core_version,
-                "bap_id": request.context.bap_id,
-                "bap_uri": request.context.bap_uri,
-                "transaction_id": request.context.transaction_id,
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": request.context.ttl
-            },
+            "context": context_factory.reply(request.context, "initiate"),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -265,15 +227,15 @@ async def ekyc_initiate(request: EKYCInitiateRequest):
                     "id": ekyc_transaction_id,
                     "status": "INITIATED",
                     "provider": {
-                        "id": ekyc_transactions[ekyc_transaction_id]["provider_id"],
+                        "id": transaction["provider_id"],
                         "name": "eKYC Provider"
                     },
                     "fulfillment": {
                         "type": "eKYC",
                         "status": "INITIATED",
                         "auth": {
-                            "type": ekyc_transactions[ekyc_transaction_id]["auth_type"],
-                            "otp": otp if ekyc_transactions[ekyc_transaction_id]["auth_type"] == "OTP" else None
+                            "type": transaction["auth_type"],
+                            "otp": otp if transaction["auth_type"] == "OTP" else None
                         }
                     }
                 }
@@ -281,7 +243,7 @@ async def ekyc_initiate(request: EKYCInitiateRequest):
         }
         
         logger.info(f"eKYC Initiate response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
     except Exception as e:
         logger.error(f"eKYC Initiate error: {e}")
@@ -291,7 +253,7 @@ async def ekyc_initiate(request: EKYCInitiateRequest):
         )
 
 @router.post("/verify", status_code=status.HTTP_200_OK)
-async def ekyc_verify(request: EKYCVerifyRequest):
+async def ekyc_verify(request: EKYCVerifyRequest = Depends(envelope_dependency(EKYCVerifyRequest))):
     """
     Verify eKYC process
     """
@@ -305,7 +267,8 @@ async def ekyc_verify(request: EKYCVerifyRequest):
                 detail="Transaction ID is required"
             )
         
-        if transaction_id not in ekyc_transactions:
+        transaction = await ekyc_session_store.get(transaction_id)
+        if transaction is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Transaction not found"
@@ -313,7 +276,7 @@ async def ekyc_verify(request: EKYCVerifyRequest):
         
         # Mock verification process
         verification_data = request.message.get("verification", {})
-        auth_type = ekyc_transactions[transaction_id]["auth_type"]
+        auth_type = transaction["auth_type"]
         
         # Simulate verification
         is_verified = False
@@ -325,38 +288,30 @@ async def ekyc_verify(request: EKYCVerifyRequest):
             is_verified = bool(biometric_data)  # Mock biometric validation
         
         # Update transaction status
+        now = get_current_timestamp()
         if is_verified:
-            ekyc_transactions[transaction_id]["status"] = "VERIFIED"
-            ekyc_transactions[transaction_id]["verified_at"] = get_current_timestamp()
-            ekyc_transactions[transaction_id]["verification_data"] = verification_data
+            fields = {"status": "VERIFIED", "verified_at": now, "verification_data": verification_data}
         else:
-            ekyc_transactions[transaction_id]["status"] = "FAILED"
-            ekyc_transactions[transaction_id]["failed_at"] = get_current_timestamp()
+            fields = {"status": "FAILED", "failed_at": now}
+        transaction = await ekyc_session_store.update(transaction_id, updated_at=now, **fields)
+        if transaction is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Transaction not found"
+            )
         
         response = {
-            "context": {
-                "domain": request.context.domain,
-                "country": request.context.country,
-                "city": request.context.city,
-                "action": "verify",
-                "core_version": request.context.core_version,
-                "bap_id": request.context.bap_id,
-                "bap_uri": request.context.bap_uri,
-                "transaction_id": request.context.transaction_id,
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": request.context.ttl
-            },
+            "context": context_factory.reply(request.context, "verify"),
             "message": {
                 "ack": {
                     "status": "ACK"
                 },
                 "order": {
                     "id": transaction_id,
-                    "status": ekyc_transactions[transaction_id]["status"],
+                    "status": transaction["status"],
                     "fulfillment": {
                         "type": "eKYC",
-                        "status": ekyc_transactions[transaction_id]["status"],
+                        "status": transaction["status"],
                         "verification_result": {
                             "verified": is_verified,
                             "confidence_score": 0.95 if is_verified else 0.0,
@@ -368,7 +323,7 @@ async def ekyc_verify(request: EKYCVerifyRequest):
         }
         
         logger.info(f"eKYC Verify response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
     except Exception as e:
         logger.error(f"eKYC Verify error: {e}")
@@ -378,7 +333,7 @@ async def ekyc_verify(request: EKYCVerifyRequest):
         )
 
 @router.post("/status", status_code=status.HTTP_200_OK)
-async def ekyc_status(request: EKYCStatusRequest):
+async def ekyc_status(request: EKYCStatusRequest = Depends(envelope_dependency(EKYCStatusRequest))):
     """
     Check eKYC status
     """
@@ -386,34 +341,24 @@ async def ekyc_status(request: EKYCStatusRequest):
         logger.info(f"eKYC Status request received: {request.context.transaction_id}")
         
         transaction_id = request.message.get("transaction_id")
-        if not transaction_id:
+        order_id = request.message.get("order_id")
+        if not transaction_id and not order_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Transaction ID is required"
+                detail="Transaction ID or order ID is required"
             )
         
-        if transaction_id not in ekyc_transactions:
+        # Orders here are keyed by the eKYC transaction id (see order.id below)
+        found = await ekyc_session_store.resolve(transaction_id or order_id, order_id)
+        if found is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Transaction not found"
             )
-        
-        transaction = ekyc_transactions[transaction_id]
+        transaction_id, transaction = found
         
         response = {
-            "context": {
-                "domain": request.context.domain,
-                "country": request.context.country,
-                "city": request.context.city,
-                "action": "status",
-                "core_version": request.context.core_version,
-                "bap_id": request.context.bap_id,
-                "bap_uri": request.context.bap_uri,
-                "transaction_id": request.context.transaction_id,
-                "message_id": generate_message_id(),
-                "timestamp": get_current_timestamp(),
-                "ttl": request.context.ttl
-            },
+            "context": context_factory.reply(request.context, "status"),
             "message": {
                 "ack": {
                     "status": "ACK"
@@ -452,7 +397,7 @@ async def ekyc_status(request: EKYCStatusRequest):
             }
         
         logger.info(f"eKYC Status response sent: {response['context']['message_id']}")
-        return response
+        return FastJSONResponse(response)
         
     except Exception as e:
         logger.error(f"eKYC Status error: {e}")
@@ -464,16 +409,16 @@ async def ekyc_status(request: EKYCStatusRequest):
 @router.get("/track/{transaction_id}", status_code=status.HTTP_200_OK)
 async def ekyc_track(transaction_id: str):
     """
-    Track eKYC transaction (web interface)
+    Track eKYC transaction by transaction or order ID (web interface)
     """
     try:
-        if transaction_id not in ekyc_transactions:
+        found = await ekyc_session_store.resolve(transaction_id, order_id=transaction_id)
+        if found is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Transaction not found"
             )
-        
-        transaction = ekyc_transactions[transaction_id]
+        transaction_id, transaction = found
         
         # Return HTML tracking page
         html_content = f"""
@@ -516,18 +461,42 @@ async def ekyc_track(transaction_id: str):
         )
 
 @router.get("/transactions", status_code=status.HTTP_200_OK)
-async def list_ekyc_transactions():
+async def list_ekyc_transactions(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.TRANSACTION_PAGE_SIZE, ge=1, le=settings.TRANSACTION_PAGE_MAX),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    provider: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
     """
-    List all eKYC transactions (admin endpoint)
+    List eKYC transactions (admin endpoint), most recently updated first.
+    Cursor-paginated; format=ndjson streams all matches page by page.
     """
+    filters = {"status": status_filter, "provider_id": provider, "since": since, "until": until}
     try:
-        return {
-            "transactions": ekyc_transactions,
-            "total_count": len(ekyc_transactions)
-        }
+        if format == "ndjson":
+            if cursor:
+                # Reject a bad cursor before the stream starts
+                decode_cursor(cursor)
+            records = (
+                {"transaction_id": transaction_id, **record}
+                async for transaction_id, record in ekyc_session_store.iter_records(limit, cursor, **filters)
+            )
+            return ndjson_response(records)
+
+        transactions, next_cursor = await ekyc_session_store.page(limit, cursor, **filters)
+        return FastJSONResponse({
+            "transactions": transactions,
+            "total_count": await ekyc_session_store.count(),
+            "next_cursor": next_cursor
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"List eKYC transactions error: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to list transactions: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
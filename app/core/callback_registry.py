@@ -0,0 +1,182 @@
+"""
+ONDC Callback Registry Module
+Correlates on_* callbacks with outbound requests by message_id through futures bounded by context.ttl
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from app.core.config import settings
+from app.core.ondc_context import Deadline, parse_duration
+from app.core.timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+
+class DuplicateMessageId(ValueError):
+    """A request reuses the message_id of one still waiting for its callback; the caller should NACK"""
+
+
+@dataclass
+class CallbackResult:
+    """The on_* callback answering a request"""
+    action: str
+    context: Dict[str, Any]
+    message: Optional[Dict[str, Any]] = None
+    error: Optional[Dict[str, Any]] = None
+    received_at: float = field(default_factory=time.time)
+
+    def body(self) -> Dict[str, Any]:
+        body = {"context": self.context, "message": self.message}
+        if self.error:
+            body["error"] = self.error
+        return body
+
+
+class PendingCallback:
+    """An outbound request waiting for its callback until deadline"""
+
+    __slots__ = ("message_id", "transaction_id", "action", "deadline", "future")
+
+    def __init__(self, message_id: str, transaction_id: Optional[str], action: str, deadline: float,
+                 future: asyncio.Future):
+        self.message_id = message_id
+        self.transaction_id = transaction_id
+        self.action = action
+        self.deadline = deadline
+        self.future = future
+
+
+class CallbackRegistry:
+    """
+    Pending requests by message_id. register() stores a future due at now +
+    context.ttl; resolve() looks the callback's message_id up in one dict access
+    and completes the future, so any number of in-flight requests costs O(1) per
+    callback. A timer wheel purges entries whose ttl passed without a callback.
+    The ids of recently expired and resolved entries are remembered (up to
+    ONDC_CALLBACK_LATE_MEMORY) so late and duplicate callbacks are told apart
+    from unknown ones; all three are counted and dropped.
+    """
+
+    def __init__(self, default_ttl: Optional[float] = None, late_memory: Optional[int] = None,
+                 clock: Callable[[], float] = time.time):
+        self.default_ttl = default_ttl or settings.ONDC_CALLBACK_DEFAULT_TTL
+        self.late_memory = late_memory or settings.ONDC_CALLBACK_LATE_MEMORY
+        self.clock = clock
+        self._pending: Dict[str, PendingCallback] = {}
+        self._finished: "OrderedDict[str, str]" = OrderedDict()  # message_id -> "expired" | "resolved"
+        self._wheel = TimerWheel(tick=1.0, slots=3600, clock=clock)
+        self._counters = {"registered": 0, "resolved": 0, "expired": 0, "late": 0, "duplicate": 0,
+                          "unknown": 0, "mismatched": 0, "reused": 0}
+
+    def _finish(self, message_id: str, outcome: str) -> None:
+        self._finished[message_id] = outcome
+        self._finished.move_to_end(message_id)
+        while len(self._finished) > self.late_memory:
+            self._finished.popitem(last=False)
+
+    def _expire(self) -> None:
+        for message_id in self._wheel.advance():
+            pending = self._pending.get(message_id)
+            if pending is not None:
+                self._expire_one(pending)
+
+    def _expire_one(self, pending: PendingCallback) -> None:
+        del self._pending[pending.message_id]
+        self._wheel.cancel(pending.message_id)
+        # Cancelling (rather than failing) the future keeps unawaited futures quiet
+        pending.future.cancel()
+        self._counters["expired"] += 1
+        self._finish(pending.message_id, "expired")
+
+    def register(self, action: str, context: Mapping[str, Any], deadline: Optional[Deadline] = None) -> PendingCallback:
+        """
+        Expect on_<action> for the request with this context (call before sending it),
+        until deadline when given, else context.ttl from now. Raises DuplicateMessageId
+        when a request with the same message_id is still pending.
+        """
+        self._expire()
+        message_id = context["message_id"]
+        existing = self._pending.get(message_id)
+        if existing is not None:
+            if self.clock() < existing.deadline:
+                self._counters["reused"] += 1
+                raise DuplicateMessageId(f"message_id {message_id} is already awaiting {existing.action}")
+            self._expire_one(existing)
+        if deadline is not None:
+            deadline = self.clock() + deadline.remaining()
+        else:
+            deadline = self.clock() + parse_duration(context.get("ttl"), self.default_ttl)
+        pending = PendingCallback(message_id, context.get("transaction_id"), f"on_{action}", deadline,
+                                  asyncio.get_running_loop().create_future())
+        self._pending[message_id] = pending
+        self._wheel.schedule(message_id, deadline)
+        self._counters["registered"] += 1
+        return pending
+
+    def discard(self, message_id: str) -> None:
+        """Forget a request that was never sent"""
+        pending = self._pending.pop(message_id, None)
+        if pending is not None:
+            self._wheel.cancel(message_id)
+            pending.future.cancel()
+
+    def resolve(self, action: str, context: Mapping[str, Any], message: Optional[Dict[str, Any]] = None,
+                error: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Complete the request a callback answers. Returns "resolved", or why the
+        callback was dropped: "late", "duplicate", "mismatched" or "unknown".
+        """
+        self._expire()
+        message_id = context.get("message_id")
+        pending = self._pending.get(message_id)
+        if pending is not None and self.clock() >= pending.deadline:
+            # Due but not yet purged by the wheel (it ticks once per second)
+            self._expire_one(pending)
+            pending = None
+
+        if pending is None:
+            outcome = {"expired": "late", "resolved": "duplicate"}.get(self._finished.get(message_id), "unknown")
+            self._counters[outcome] += 1
+            logger.info(f"Dropping {outcome} {action} for message {message_id}")
+            return outcome
+        if pending.action != action or (pending.transaction_id and
+                                        pending.transaction_id != context.get("transaction_id")):
+            self._counters["mismatched"] += 1
+            logger.warning(f"Dropping {action} for message {message_id}: expected {pending.action} "
+                           f"of transaction {pending.transaction_id}")
+            return "mismatched"
+
+        del self._pending[message_id]
+        self._wheel.cancel(message_id)
+        self._finish(message_id, "resolved")
+        if not pending.future.done():
+            pending.future.set_result(CallbackResult(action, dict(context), message, error))
+        self._counters["resolved"] += 1
+        return "resolved"
+
+    async def wait(self, pending: PendingCallback) -> CallbackResult:
+        """The callback for a registered request; raises asyncio.TimeoutError once its ttl passes"""
+        remaining = pending.deadline - self.clock()
+        if remaining > 0 and not pending.future.done():
+            await asyncio.wait({pending.future}, timeout=remaining)
+        if pending.future.done() and not pending.future.cancelled():
+            return pending.future.result()
+        if self._pending.get(pending.message_id) is pending:
+            self._expire_one(pending)
+        raise asyncio.TimeoutError(f"No {pending.action} for message {pending.message_id} within its ttl")
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire()
+        return {"pending": len(self._pending), **self._counters}
+
+
+# Global callback registry instance
+callback_registry = CallbackRegistry()
@@ -0,0 +1,414 @@
+"""
+ONDC Catalog Download Module
+Streams catalog_full download links through an incremental JSON parser into the catalog store
+"""
+
+import asyncio
+import codecs
+import json
+import logging
+import re
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from app.core.catalog_store import CatalogStore, ProviderKey, catalog_store
+from app.core.config import settings
+from app.core.http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+
+# Keys that lead from the top of the file to the provider array
+_WRAPPER_KEYS = ("message", "catalog")
+_PROVIDERS_KEY = "bpp/providers"
+
+# Frame roles
+_WRAPPER, _PROVIDERS, _PROVIDER, _ITEMS = "wrapper", "providers", "provider", "items"
+
+
+class CatalogLinkRejected(ValueError):
+    """A catalog link that is not https on the host of the BPP that sent it"""
+
+
+def check_link(url: str, bpp_uri: Optional[str]) -> None:
+    """Only fetch https links served by the sending BPP itself, never an arbitrary host"""
+    try:
+        link = httpx.URL(url)
+        base = httpx.URL(bpp_uri) if bpp_uri else None
+    except (httpx.InvalidURL, TypeError) as e:
+        raise CatalogLinkRejected(f"Invalid catalog link {url!r}: {e}") from e
+    if link.scheme != "https":
+        raise CatalogLinkRejected(f"Catalog link {url} is not https")
+    if base is None or not base.host or (link.host, link.port) != (base.host, base.port):
+        raise CatalogLinkRejected(f"Catalog link {url} is not on the BPP host of {bpp_uri}")
+
+
+class CatalogStreamParser:
+    """
+    Incremental parser for a catalog file: a bare catalog or a full on_search body
+    ({"message": {"catalog": {"bpp/providers": [...]}}}). feed() takes bytes as they
+    arrive and returns events:
+
+        ("item", provider_id, item)   one element of a provider's items array
+        ("provider", fields)          a provider's other fields, at the end of the provider
+
+    Only the path down to the items is tracked token by token; every item and every
+    other value is decoded whole by the C JSON decoder once all its bytes have
+    arrived. Memory is bounded by the largest single value (max_value), not by the
+    file. Items seen before their provider's "id" are held until it arrives.
+    """
+
+    def __init__(self, max_value: Optional[int] = None):
+        self.max_value = max_value or settings.ONDC_CATALOG_DOWNLOAD_MAX_VALUE
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._wait_until = 0
+        # Frames: [role, expect, key, fields, pending items]
+        self._stack: List[list] = []
+        self._started = False
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[tuple]:
+        self._buf += self._utf8.decode(chunk)
+        if len(self._buf) < self._wait_until:
+            return []
+        return self._run(final=False)
+
+    def close(self) -> List[tuple]:
+        """Parse what is left; raises ValueError when the document is incomplete"""
+        self._buf += self._utf8.decode(b"", final=True)
+        events = self._run(final=True)
+        if not self.done:
+            raise ValueError("Catalog stream ended inside the document")
+        return events
+
+    def _run(self, final: bool) -> List[tuple]:
+        events: List[tuple] = []
+        while self._step(final, events):
+            pass
+        # Drop consumed text so the buffer only holds the value in progress
+        consumed = self._pos
+        self._buf = self._buf[consumed:]
+        self._pos = 0
+        self._wait_until = max(0, self._wait_until - consumed)
+        if len(self._buf) > self.max_value:
+            raise ValueError(f"Catalog value larger than {self.max_value} characters")
+        return events
+
+    def _step(self, final: bool, events: List[tuple]) -> bool:
+        buf = self._buf
+        pos = _WHITESPACE.match(buf, self._pos).end()
+        self._pos = pos
+        if pos >= len(buf) or self.done:
+            return False
+        char = buf[pos]
+
+        if not self._started:
+            if char != "{":
+                raise ValueError("Catalog document must be a JSON object")
+            self._started = True
+            self._stack.append([_WRAPPER, "key", None, None, None])
+            self._pos = pos + 1
+            return True
+
+        frame = self._stack[-1]
+        role, expect = frame[0], frame[1]
+
+        if expect == "next":
+            if char == ",":
+                frame[1] = "key" if role in (_WRAPPER, _PROVIDER) else "value"
+                self._pos = pos + 1
+                return True
+            return self._close(char, events)
+
+        if expect == "key":
+            if char in "}]":
+                return self._close(char, events)
+            match = _STRING.match(buf, pos)
+            if match is None:
+                return self._incomplete(final)
+            frame[2] = json.loads(match.group())
+            frame[1] = "colon"
+            self._pos = match.end()
+            return True
+
+        if expect == "colon":
+            if char != ":":
+                raise ValueError(f"Expected ':' in catalog at {frame[2]!r}")
+            frame[1] = "value"
+            self._pos = pos + 1
+            return True
+
+        # expect == "value"
+        if char == "]" and role in (_PROVIDERS, _ITEMS):
+            return self._close(char, events)
+        key = frame[2]
+        child = None
+        if role == _WRAPPER and char == "{" and key in _WRAPPER_KEYS:
+            child = [_WRAPPER, "key", None, None, None]
+        elif role == _WRAPPER and char == "[" and key == _PROVIDERS_KEY:
+            child = [_PROVIDERS, "value", None, None, None]
+        elif role == _PROVIDERS and char == "{":
+            child = [_PROVIDER, "key", None, {}, []]
+        elif role == _PROVIDER and char == "[" and key == "items":
+            child = [_ITEMS, "value", None, None, None]
+        frame[1] = "next"
+        if child is not None:
+            self._stack.append(child)
+            self._pos = pos + 1
+            return True
+
+        value = self._decode(pos, final)
+        if value is self:
+            frame[1] = "value"
+            return False
+        if role == _ITEMS:
+            self._item(self._stack[-2], value, events)
+        elif role == _PROVIDER:
+            frame[3][key] = value
+            if key == "id":
+                for item in frame[4]:
+                    events.append(("item", str(value), item))
+                frame[4] = []
+        return True
+
+    def _decode(self, pos: int, final: bool) -> Any:
+        """Decode the complete value at pos, or return self when more bytes are needed"""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, pos)
+        except json.JSONDecodeError:
+            self._incomplete(final)
+            # Retry once the pending value has had room to double
+            self._wait_until = len(self._buf) + max(len(self._buf) - pos, 4096)
+            return self
+        if end == len(self._buf) and not final and isinstance(value, (int, float)) \
+                and not isinstance(value, bool):
+            # A number at the end of the buffer may continue in the next chunk
+            return self
+        self._pos = end
+        return value
+
+    def _incomplete(self, final: bool) -> bool:
+        if final:
+            raise ValueError("Catalog stream ended inside a value")
+        return False
+
+    def _item(self, provider: list, item: Any, events: List[tuple]) -> None:
+        provider_id = provider[3].get("id")
+        if provider_id is None:
+            provider[4].append(item)
+        else:
+            events.append(("item", str(provider_id), item))
+
+    def _close(self, char: str, events: List[tuple]) -> bool:
+        frame = self._stack.pop()
+        expected = "}" if frame[0] in (_WRAPPER, _PROVIDER) else "]"
+        if char != expected:
+            raise ValueError(f"Unexpected {char!r} in catalog")
+        self._pos += 1
+        if frame[0] == _PROVIDER:
+            if frame[4]:
+                logger.warning(f"Dropping {len(frame[4])} catalog items of a provider without an id")
+            if "id" in frame[3]:
+                events.append(("provider", frame[3]))
+        if not self._stack:
+            self.done = True
+        return True
+
+
+class CatalogDownload:
+    """Progress of one linked catalog"""
+
+    def __init__(self, bpp_id: str, url: str):
+        self.bpp_id = bpp_id
+        self.url = url
+        self.state = "queued"
+        self.bytes_received = 0
+        self.total_bytes: Optional[int] = None
+        self.items = 0
+        self.providers = 0
+        self.removed = 0
+        self.resumes = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        return {
+            "bpp_id": self.bpp_id, "url": self.url, "state": self.state,
+            "bytes_received": self.bytes_received, "total_bytes": self.total_bytes,
+            "percent": round(100 * self.bytes_received / self.total_bytes, 1) if self.total_bytes else None,
+            "items": self.items, "providers": self.providers, "removed": self.removed,
+            "resumes": self.resumes, "elapsed_s": round(elapsed, 2),
+            "bytes_per_s": round(self.bytes_received / elapsed) if elapsed else None,
+            "error": self.error,
+        }
+
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-\d+/(\d+|\*)")
+
+
+class CatalogDownloader:
+    """
+    Background fetcher for catalog_full download links. Each link is streamed in
+    chunks into a CatalogStreamParser and its items are upserted into the catalog
+    store as they are parsed; when a provider ends, its items that were not in the
+    file are removed (the file is the provider's full catalog).
+
+    A dropped connection resumes with a Range request from the last byte fed to
+    the parser, up to ONDC_CATALOG_DOWNLOAD_RETRIES times; a server that ignores
+    Range is read from the start with the already-parsed prefix skipped.
+    """
+
+    def __init__(self, store: CatalogStore = catalog_store, concurrency: Optional[int] = None,
+                 chunk_size: Optional[int] = None, retries: Optional[int] = None,
+                 client_factory: Callable[[], httpx.AsyncClient] = http_client.get_client):
+        self.store = store
+        self.concurrency = concurrency or settings.ONDC_CATALOG_DOWNLOAD_CONCURRENCY
+        self.chunk_size = chunk_size or settings.ONDC_CATALOG_DOWNLOAD_CHUNK_SIZE
+        self.retries = retries if retries is not None else settings.ONDC_CATALOG_DOWNLOAD_RETRIES
+        self.client_factory = client_factory
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._active: Dict[str, Tuple[CatalogDownload, asyncio.Task]] = {}
+        self._recent: "deque[CatalogDownload]" = deque(maxlen=50)
+        self._counters = {"started": 0, "completed": 0, "failed": 0, "bytes": 0, "items": 0}
+
+    def submit(self, bpp_id: str, url: str, bpp_uri: Optional[str],
+               on_provider: Optional[Callable[[ProviderKey], None]] = None) -> CatalogDownload:
+        """
+        Start streaming a linked catalog in the background (one download per URL at a time).
+        Raises CatalogLinkRejected unless url is https on the host of bpp_uri.
+        """
+        check_link(url, bpp_uri)
+        if url in self._active:
+            return self._active[url][0]
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        download = CatalogDownload(bpp_id, url)
+        task = asyncio.create_task(self._run(download, on_provider))
+        self._active[url] = (download, task)
+        self._counters["started"] += 1
+        return download
+
+    async def _run(self, download: CatalogDownload, on_provider: Optional[Callable[[ProviderKey], None]]) -> None:
+        async with self._semaphore:
+            download.state = "running"
+            download.started_at = time.monotonic()
+            try:
+                await self.download(download, on_provider)
+                download.state = "completed"
+                self._counters["completed"] += 1
+            except Exception as e:
+                download.state = "failed"
+                download.error = str(e)
+                self._counters["failed"] += 1
+                logger.error(f"Catalog download {download.url} failed after {download.bytes_received} bytes: {e}")
+            finally:
+                download.finished_at = time.monotonic()
+                self._active.pop(download.url, None)
+                self._recent.append(download)
+
+    async def download(self, download: CatalogDownload,
+                       on_provider: Optional[Callable[[ProviderKey], None]] = None) -> None:
+        """Stream download.url into the store, resuming on connection errors"""
+        parser = CatalogStreamParser()
+        seen: Dict[str, Set[str]] = {}
+        attempt = 0
+        while True:
+            try:
+                await self._fetch(download, parser, seen, on_provider)
+                break
+            except httpx.TransportError as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                download.resumes += 1
+                logger.warning(f"Catalog download {download.url} interrupted at byte "
+                               f"{download.bytes_received} ({e!r}); resuming")
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 5.0))
+        self._apply(download, parser.close(), seen, on_provider)
+
+    async def _fetch(self, download: CatalogDownload, parser: CatalogStreamParser,
+                     seen: Dict[str, Set[str]], on_provider: Optional[Callable[[ProviderKey], None]]) -> None:
+        offset = download.bytes_received
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        async with self.client_factory().stream("GET", download.url, headers=headers) as response:
+            response.raise_for_status()
+            skip = 0
+            if offset and response.status_code == 206:
+                match = _CONTENT_RANGE.match(response.headers.get("content-range", ""))
+                if match is None or int(match.group(1)) != offset:
+                    raise ValueError(f"Unexpected Content-Range {response.headers.get('content-range')!r}")
+                if match.group(2) != "*":
+                    download.total_bytes = int(match.group(2))
+            else:
+                # Full body: skip what the parser already has
+                skip = offset
+                length = response.headers.get("content-length")
+                download.total_bytes = int(length) if length and length.isdigit() else None
+
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                if skip:
+                    if len(chunk) <= skip:
+                        skip -= len(chunk)
+                        continue
+                    chunk, skip = chunk[skip:], 0
+                events = parser.feed(chunk)
+                download.bytes_received += len(chunk)
+                self._counters["bytes"] += len(chunk)
+                self._apply(download, events, seen, on_provider)
+
+    def _apply(self, download: CatalogDownload, events: List[tuple], seen: Dict[str, Set[str]],
+               on_provider: Optional[Callable[[ProviderKey], None]]) -> None:
+        bpp_id = download.bpp_id
+        for event in events:
+            if event[0] == "item":
+                _, provider_id, item = event
+                self.store.upsert_item(bpp_id, provider_id, item)
+                seen.setdefault(provider_id, set()).add(str(item.get("id")))
+                download.items += 1
+                self._counters["items"] += 1
+            else:
+                fields = event[1]
+                provider_id = str(fields["id"])
+                self.store.upsert_provider(bpp_id, fields)
+                kept = seen.pop(provider_id, set())
+                stale = [item.id for item in self.store.items_for_provider(bpp_id, provider_id)
+                         if item.id not in kept]
+                download.removed += self.store.apply_changes(bpp_id, provider_id, (), stale)["removed"]
+                download.providers += 1
+                if on_provider is not None:
+                    on_provider((bpp_id, provider_id))
+
+    def get(self, url: str) -> Optional[CatalogDownload]:
+        if url in self._active:
+            return self._active[url][0]
+        return next((download for download in reversed(self._recent) if download.url == url), None)
+
+    async def join(self) -> None:
+        """Wait for the downloads in progress"""
+        tasks = [task for _, task in self._active.values()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "active": [download.progress() for download, _ in self._active.values()],
+            "recent": [download.progress() for download in self._recent],
+        }
+
+
+# Global catalog downloader instance
+catalog_downloader = CatalogDownloader()
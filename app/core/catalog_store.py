@@ -0,0 +1,302 @@
+"""
+ONDC Catalog Store Module
+Indexed in-memory store of on_search catalogs: providers, locations, categories and compact items
+"""
+
+import hashlib
+import logging
+import re
+import sys
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from app.core.ondc_responses import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# (bpp_id, provider_id, item_id)
+ItemKey = Tuple[str, str, str]
+ProviderKey = Tuple[str, str]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> Set[str]:
+    """Lower-cased alphanumeric tokens used by the item-name index"""
+    return {token for token in _TOKEN.findall((text or "").lower()) if len(token) > 1}
+
+
+def _intern(value: Any) -> Optional[str]:
+    return None if value is None else sys.intern(str(value))
+
+
+def content_digest(payload: bytes) -> bytes:
+    """64-bit content hash of a serialized item, compared to skip unchanged upserts"""
+    return hashlib.blake2b(payload, digest_size=8).digest()
+
+
+class CatalogItem:
+    """
+    One catalog item: the fields used for lookup and pricing as slots, and the full
+    ONDC item kept as its serialized JSON bytes (decoded only by to_dict()) with its digest.
+    """
+
+    __slots__ = ("key", "name", "category_id", "location_id", "price", "currency", "payload", "digest")
+
+    def __init__(self, key: ItemKey, item: Mapping[str, Any], payload: Optional[bytes] = None):
+        descriptor = item.get("descriptor") or {}
+        price = item.get("price") or {}
+        self.key = key
+        self.name: Optional[str] = descriptor.get("name")
+        self.category_id = _intern(item.get("category_id"))
+        self.location_id = _intern(item.get("location_id"))
+        self.price: Optional[str] = None if price.get("value") is None else str(price.get("value"))
+        self.currency = _intern(price.get("currency"))
+        self.payload = dumps(item) if payload is None else payload
+        self.digest = content_digest(self.payload)
+
+    @property
+    def bpp_id(self) -> str:
+        return self.key[0]
+
+    @property
+    def provider_id(self) -> str:
+        return self.key[1]
+
+    @property
+    def id(self) -> str:
+        return self.key[2]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return loads(self.payload)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "bpp_id": self.bpp_id, "provider_id": self.provider_id, "name": self.name,
+            "category_id": self.category_id, "price": {"currency": self.currency, "value": self.price},
+        }
+
+
+class CatalogStore:
+    """
+    Items by (bpp_id, provider_id, item_id) plus secondary indexes kept in step on
+    every upsert/removal: item id -> keys, provider -> keys, category -> keys and an
+    inverted token index over item names, plus provider id -> BPPs for lookups that
+    do not name the BPP. Item and price resolution is a dict lookup; name search
+    intersects the posting sets of the query tokens, smallest first.
+    """
+
+    def __init__(self):
+        self._items: Dict[ItemKey, CatalogItem] = {}
+        self._providers: Dict[ProviderKey, Dict[str, Any]] = {}
+        self._locations: Dict[ProviderKey, Dict[str, Dict[str, Any]]] = {}
+        self._categories: Dict[ProviderKey, Dict[str, Dict[str, Any]]] = {}
+        self._by_item_id: Dict[str, Set[ItemKey]] = {}
+        self._by_provider: Dict[ProviderKey, Set[ItemKey]] = {}
+        self._by_category: Dict[str, Set[ItemKey]] = {}
+        self._by_token: Dict[str, Set[ItemKey]] = {}
+        self._provider_bpps: Dict[str, Set[str]] = {}
+        self._counters = {"catalogs": 0, "upserts": 0, "unchanged": 0, "removals": 0}
+
+    @staticmethod
+    def _add(index: Dict[Any, Set[ItemKey]], value: Any, key: ItemKey) -> None:
+        if value is not None:
+            index.setdefault(value, set()).add(key)
+
+    @staticmethod
+    def _discard(index: Dict[Any, Set[ItemKey]], value: Any, key: ItemKey) -> None:
+        keys = index.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+    def _index(self, item: CatalogItem) -> None:
+        self._add(self._by_item_id, item.id, item.key)
+        self._add(self._by_provider, item.key[:2], item.key)
+        self._add(self._by_category, item.category_id, item.key)
+        for token in tokenize(item.name):
+            self._add(self._by_token, token, item.key)
+
+    def _unindex(self, item: CatalogItem) -> None:
+        self._discard(self._by_item_id, item.id, item.key)
+        self._discard(self._by_provider, item.key[:2], item.key)
+        self._discard(self._by_category, item.category_id, item.key)
+        for token in tokenize(item.name):
+            self._discard(self._by_token, token, item.key)
+
+    def upsert_provider(self, bpp_id: str, provider: Mapping[str, Any]) -> ProviderKey:
+        """
+        Merge provider details, locations and categories (by id) into what is stored,
+        so partial (incremental) provider entries keep the rest; items are upserted separately
+        """
+        key = (_intern(bpp_id), _intern(provider.get("id")))
+        self._provider_bpps.setdefault(key[1], set()).add(key[0])
+        details = self._providers.setdefault(key, {})
+        details.update((k, v) for k, v in provider.items() if k not in ("items", "locations", "categories"))
+        locations = self._locations.setdefault(key, {})
+        for loc in provider.get("locations") or []:
+            locations[str(loc.get("id"))] = loc
+        categories = self._categories.setdefault(key, {})
+        for cat in provider.get("categories") or []:
+            categories[str(cat.get("id"))] = cat
+        return key
+
+    def upsert_item(self, bpp_id: str, provider_id: str, item: Mapping[str, Any]) -> CatalogItem:
+        return self._upsert(bpp_id, provider_id, item)[0]
+
+    def _upsert(self, bpp_id: str, provider_id: str, item: Mapping[str, Any]) -> Tuple[CatalogItem, bool]:
+        """Store an item unless its content digest is unchanged; returns (item, changed)"""
+        key = (_intern(bpp_id), _intern(provider_id), str(item.get("id")))
+        payload = dumps(item)
+        previous = self._items.get(key)
+        if previous is not None:
+            if previous.digest == content_digest(payload):
+                self._counters["unchanged"] += 1
+                return previous, False
+            self._unindex(previous)
+        compact = self._items[key] = CatalogItem(key, item, payload)
+        self._index(compact)
+        self._counters["upserts"] += 1
+        return compact, True
+
+    def remove_item(self, bpp_id: str, provider_id: str, item_id: str) -> bool:
+        item = self._items.pop((bpp_id, provider_id, item_id), None)
+        if item is None:
+            return False
+        self._unindex(item)
+        self._counters["removals"] += 1
+        return True
+
+    def remove_provider(self, bpp_id: str, provider_id: str) -> int:
+        """Drop a provider and all its items; returns the number of items removed"""
+        key = (bpp_id, provider_id)
+        removed = 0
+        for item_key in list(self._by_provider.get(key, ())):
+            removed += self.remove_item(*item_key)
+        self._providers.pop(key, None)
+        bpps = self._provider_bpps.get(provider_id)
+        if bpps is not None:
+            bpps.discard(bpp_id)
+            if not bpps:
+                del self._provider_bpps[provider_id]
+        self._locations.pop(key, None)
+        self._categories.pop(key, None)
+        return removed
+
+    def apply_changes(self, bpp_id: str, provider_id: str, upserts: Iterable[Mapping[str, Any]],
+                      deletes: Iterable[str] = (), replace: bool = False) -> Dict[str, int]:
+        """
+        Apply item upserts and deletions to one provider. With replace, items of the
+        provider absent from upserts are deleted too (a full re-index of the provider).
+        Returns upserted/unchanged/removed counts.
+        """
+        counts = {"upserted": 0, "unchanged": 0, "removed": 0}
+        kept = set()
+        for item in upserts:
+            compact, changed = self._upsert(bpp_id, provider_id, item)
+            counts["upserted" if changed else "unchanged"] += 1
+            kept.add(compact.key)
+        deleted = {(bpp_id, provider_id, str(item_id)) for item_id in deletes}
+        if replace:
+            deleted.update(self._by_provider.get((bpp_id, provider_id), set()) - kept)
+        for key in deleted:
+            counts["removed"] += self.remove_item(*key)
+        return counts
+
+    def ingest(self, context: Mapping[str, Any], catalog: Mapping[str, Any]) -> int:
+        """Upsert every provider and item of an on_search catalog; returns the item count"""
+        bpp_id = str(context.get("bpp_id") or "unknown")
+        count = 0
+        for provider in catalog.get("bpp/providers") or []:
+            _, provider_id = self.upsert_provider(bpp_id, provider)
+            for item in provider.get("items") or []:
+                self.upsert_item(bpp_id, provider_id, item)
+                count += 1
+        self._counters["catalogs"] += 1
+        return count
+
+    def get_item(self, item_id: str, provider_id: Optional[str] = None,
+                 bpp_id: Optional[str] = None) -> Optional[CatalogItem]:
+        """Resolve an item id, narrowed by provider and BPP when given"""
+        if provider_id is not None:
+            bpps = (bpp_id,) if bpp_id is not None else self._provider_bpps.get(provider_id, ())
+            for bpp in bpps:
+                item = self._items.get((bpp, provider_id, item_id))
+                if item is not None:
+                    return item
+            return None
+        for key in self._by_item_id.get(item_id, ()):
+            if bpp_id is None or key[0] == bpp_id:
+                return self._items[key]
+        return None
+
+    def has_provider(self, provider_id: str, bpp_id: Optional[str] = None) -> bool:
+        if bpp_id is not None:
+            return (bpp_id, provider_id) in self._providers
+        return provider_id in self._provider_bpps
+
+    def missing_order_items(self, bpp_id: Optional[str], provider_id: Optional[str],
+                            items: Iterable[Mapping[str, Any]]) -> List[str]:
+        """
+        Ids of the items of a select/init order that the provider's catalog does not have.
+        Orders for providers we hold no catalog for have nothing to check.
+        """
+        if provider_id is None or not self.has_provider(provider_id, bpp_id):
+            return []
+        return [str(item.get("id")) for item in items
+                if self.get_item(str(item.get("id")), provider_id, bpp_id) is None]
+
+    def provider(self, bpp_id: str, provider_id: str) -> Optional[Dict[str, Any]]:
+        key = (bpp_id, provider_id)
+        if key not in self._providers:
+            return None
+        return {
+            **self._providers[key],
+            "locations": list(self._locations.get(key, {}).values()),
+            "categories": list(self._categories.get(key, {}).values()),
+            "item_count": len(self._by_provider.get(key, ())),
+        }
+
+    def items_for_provider(self, bpp_id: str, provider_id: str) -> Iterable[CatalogItem]:
+        return (self._items[key] for key in self._by_provider.get((bpp_id, provider_id), ()))
+
+    def search(self, query: Optional[str] = None, category_id: Optional[str] = None,
+               provider_id: Optional[str] = None, bpp_id: Optional[str] = None,
+               limit: int = 50) -> List[CatalogItem]:
+        """Items whose name contains every query token, filtered by category/provider"""
+        postings: List[Set[ItemKey]] = []
+        for token in tokenize(query):
+            postings.append(self._by_token.get(token, set()))
+        if category_id is not None:
+            postings.append(self._by_category.get(category_id, set()))
+        if provider_id is not None and bpp_id is not None:
+            postings.append(self._by_provider.get((bpp_id, provider_id), set()))
+
+        if postings:
+            postings.sort(key=len)
+            candidates: Iterable[ItemKey] = postings[0]
+            rest = postings[1:]
+            candidates = (key for key in candidates if all(key in posting for posting in rest))
+        else:
+            candidates = iter(self._items)
+
+        results = []
+        for key in candidates:
+            if (provider_id is None or key[1] == provider_id) and (bpp_id is None or key[0] == bpp_id):
+                results.append(self._items[key])
+                if len(results) >= limit:
+                    break
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": len(self._providers),
+            "items": len(self._items),
+            "categories": len(self._by_category),
+            "tokens": len(self._by_token),
+            **self._counters,
+        }
+
+
+# Global catalog store instance
+catalog_store = CatalogStore()
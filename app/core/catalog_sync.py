@@ -0,0 +1,281 @@
+"""
+ONDC Catalog Sync Module
+Applies catalog_inc deltas to the catalog store, tracks per-provider high-water marks and schedules refresh windows
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Mapping, Optional, Set, Tuple
+
+from app.core.catalog_download import CatalogDownloader, CatalogLinkRejected, catalog_downloader
+from app.core.catalog_store import CatalogStore, ProviderKey, catalog_store
+from app.core.config import settings
+from app.core.ondc_context import context_factory, format_ondc_timestamp, parse_ondc_timestamp
+from app.core.timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+# time.label of a provider or item withdrawn from the catalog
+DISABLED_LABEL = "disable"
+
+
+def tag_values(entity: Optional[Mapping[str, Any]], code: str) -> Optional[Dict[str, str]]:
+    """The list of an intent/catalog tag with the given code as a dict, or None if absent"""
+    for tag in (entity or {}).get("tags") or []:
+        if tag.get("code") == code:
+            return {entry.get("code"): entry.get("value") for entry in tag.get("list") or []}
+    return None
+
+
+def _disabled(entry: Mapping[str, Any]) -> bool:
+    return ((entry.get("time") or {}).get("label") or "").lower() == DISABLED_LABEL
+
+
+@dataclass
+class CatalogRequest:
+    """A catalog search we are expecting on_search callbacks for"""
+    kind: str  # "inc" | "full"
+    start_ms: Optional[int] = None
+    end_ms: Optional[int] = None
+    # Providers already re-indexed by this full request (callbacks may be paginated)
+    replaced: Set[ProviderKey] = field(default_factory=set)
+
+
+class CatalogSync:
+    """
+    Keeps the catalog store current from on_search callbacks.
+
+    catalog_inc searches cover a [start_time, end_time] window. Each provider has a
+    high-water mark (epoch ms) up to which its items are known complete; a delta
+    whose window starts at or before the mark is applied as item upserts (skipped
+    when the content digest is unchanged) and deletions (time.label "disable"),
+    and moves the mark to the window end. A window starting after the mark leaves
+    a gap: the delta is still applied, but the provider is marked stale and one
+    full catalog search is sent to its BPP; the full catalog replaces the
+    provider's items and resets the mark. A full catalog sent as a download link
+    (catalog_link tag) is streamed in by the catalog downloader with the same
+    effect, but only when the callback is signed by the BPP and answers one of our
+    catalog_full searches. Other on_search results are upserted; a provider first seen in one gets
+    its mark set to the time it arrived.
+
+    When ONDC_CATALOG_INC_INTERVAL is set (it is off by default), the scheduler requests
+    the window [previous end, now] at that interval, so consecutive windows are contiguous.
+    """
+
+    def __init__(self, store: CatalogStore = catalog_store, downloader: CatalogDownloader = catalog_downloader,
+                 interval: Optional[float] = None,
+                 retention: Optional[float] = None, clock: Callable[[], float] = time.time,
+                 submit: Optional[Callable[[str, Mapping[str, Any]], Any]] = None):
+        self.store = store
+        self.downloader = downloader
+        self.interval = interval if interval is not None else settings.ONDC_CATALOG_INC_INTERVAL
+        self.retention = retention if retention is not None else settings.ONDC_SEARCH_RESULT_RETENTION
+        self.clock = clock
+        self._submit = submit
+        self._requests: Dict[str, CatalogRequest] = {}
+        self._wheel = TimerWheel(tick=1.0, slots=3600, clock=clock)
+        self._high_water: Dict[ProviderKey, int] = {}
+        self._stale: Set[ProviderKey] = set()
+        self._pending_full: Dict[str, str] = {}  # bpp_id -> transaction_id
+        self._next_start_ms: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._counters = {"windows": 0, "deltas": 0, "gaps": 0, "full_requests": 0, "full_reindexes": 0,
+                          "upserted": 0, "unchanged": 0, "removed": 0, "links_refused": 0}
+
+    def _now_ms(self) -> int:
+        return int(self.clock() * 1000)
+
+    def submit(self, action: str, payload: Mapping[str, Any]) -> Any:
+        if self._submit is None:
+            from app.core.ondc_dispatcher import dispatcher
+            self._submit = dispatcher.submit
+        return self._submit(action, payload)
+
+    def _expire(self) -> None:
+        for transaction_id in self._wheel.advance():
+            self._requests.pop(transaction_id, None)
+            for bpp_id, pending in list(self._pending_full.items()):
+                if pending == transaction_id:
+                    del self._pending_full[bpp_id]
+
+    def _track(self, transaction_id: str, request: CatalogRequest) -> None:
+        self._requests[transaction_id] = request
+        self._wheel.schedule(transaction_id, self.clock() + self.retention)
+
+    def register(self, transaction_id: str, intent: Optional[Mapping[str, Any]]) -> Optional[CatalogRequest]:
+        """Note an outgoing search so its callbacks are applied as a delta or a full catalog"""
+        self._expire()
+        window = tag_values(intent, "catalog_inc")
+        if window is not None:
+            start = parse_ondc_timestamp(window.get("start_time") or "")
+            end = parse_ondc_timestamp(window.get("end_time") or "")
+            if start is None or end is None:
+                logger.warning(f"catalog_inc search {transaction_id} without a valid window: {window}")
+                return None
+            request = CatalogRequest("inc", start, end)
+        elif tag_values(intent, "catalog_full") is not None:
+            request = CatalogRequest("full", end_ms=self._now_ms())
+        else:
+            return None
+        self._track(transaction_id, request)
+        return request
+
+    def apply(self, context: Mapping[str, Any], catalog: Mapping[str, Any], signed: bool = False) -> Dict[str, int]:
+        """
+        Apply one on_search callback; returns upserted/unchanged/removed item counts.
+        signed tells that the callback's signature verified as the BPP's own.
+        """
+        self._expire()
+        transaction_id = context.get("transaction_id")
+        request = self._requests.get(transaction_id)
+        bpp_id = str(context.get("bpp_id") or "unknown")
+        if self._pending_full.get(bpp_id) == transaction_id:
+            # The full catalog is arriving; later gaps may request another one
+            del self._pending_full[bpp_id]
+        totals = {"upserted": 0, "unchanged": 0, "removed": 0}
+
+        link = tag_values(catalog, "catalog_link")
+        if link is not None and link.get("type_value"):
+            self._download(context, link["type_value"], request, signed)
+
+        for provider in catalog.get("bpp/providers") or []:
+            key = (bpp_id, str(provider.get("id")))
+            if _disabled(provider):
+                totals["removed"] += self.store.remove_provider(*key)
+                self._high_water.pop(key, None)
+                self._stale.discard(key)
+                continue
+
+            replace = False
+            if request is not None and request.kind == "full":
+                replace = key not in request.replaced
+                request.replaced.add(key)
+            elif request is not None and request.kind == "inc":
+                self._counters["deltas"] += 1
+                self._check_window(key, request, context)
+            elif key not in self._high_water:
+                # First seen in a plain search: track it from now, so the next delta is not a gap
+                self._high_water[key] = self._now_ms()
+
+            self.store.upsert_provider(bpp_id, provider)
+            upserts, deletes = [], []
+            for item in provider.get("items") or []:
+                (deletes if _disabled(item) else upserts).append(item)
+            counts = self.store.apply_changes(key[0], key[1], upserts, [item.get("id") for item in deletes],
+                                              replace=replace)
+
+            if replace:
+                self._reindexed(key, request)
+            for name, count in counts.items():
+                totals[name] += count
+
+        for name, count in totals.items():
+            self._counters[name] += count
+        return totals
+
+    def _download(self, context: Mapping[str, Any], url: str, request: Optional[CatalogRequest],
+                  signed: bool) -> None:
+        """Stream a linked full catalog; the link is fetched by us, so its sender must be accountable"""
+        bpp_id = str(context.get("bpp_id") or "unknown")
+        if not signed or request is None or request.kind != "full":
+            self._counters["links_refused"] += 1
+            logger.warning(f"Ignoring catalog link from {bpp_id}: not a signed answer to our catalog_full search")
+            return
+        try:
+            self.downloader.submit(bpp_id, url, context.get("bpp_uri"),
+                                   on_provider=lambda key: self._reindexed(key, request))
+        except CatalogLinkRejected as e:
+            self._counters["links_refused"] += 1
+            logger.warning(f"Ignoring catalog link from {bpp_id}: {e}")
+
+    def _reindexed(self, key: ProviderKey, request: CatalogRequest) -> None:
+        # The full catalog is complete as of when it was requested
+        self._counters["full_reindexes"] += 1
+        self._stale.discard(key)
+        self._high_water[key] = max(self._high_water.get(key, 0), request.end_ms)
+
+    def _check_window(self, key: ProviderKey, request: CatalogRequest, context: Mapping[str, Any]) -> None:
+        high_water = self._high_water.get(key)
+        if key not in self._stale and high_water is not None and request.start_ms <= high_water:
+            self._high_water[key] = max(high_water, request.end_ms)
+            return
+        if key not in self._stale:
+            self._counters["gaps"] += 1
+            self._stale.add(key)
+            logger.info(f"Catalog gap for provider {key[1]} of {key[0]}: high-water "
+                        f"{high_water}, delta starts {request.start_ms}; requesting full catalog")
+        self.request_full(key[0], context.get("bpp_uri"))
+
+    def request_full(self, bpp_id: str, bpp_uri: Optional[str]) -> Optional[str]:
+        """Send one full catalog search to a BPP (deduplicated while one is pending)"""
+        if not bpp_uri or bpp_id in self._pending_full:
+            return None
+        context = context_factory.build("search", bpp_id=bpp_id, bpp_uri=bpp_uri)
+        intent = {"tags": [{"code": "catalog_full", "list": []}]}
+        try:
+            self.submit("search", {"context": context, "message": {"intent": intent}})
+        except Exception as e:
+            logger.warning(f"Full catalog request to {bpp_id} not sent: {e}")
+            return None
+        self._track(context["transaction_id"], CatalogRequest("full", end_ms=self._now_ms()))
+        self._pending_full[bpp_id] = context["transaction_id"]
+        self._counters["full_requests"] += 1
+        return context["transaction_id"]
+
+    def request_window(self) -> Optional[Tuple[int, int]]:
+        """Search the gateway for changes since the previous window; returns the new window"""
+        end = self._now_ms()
+        start = self._next_start_ms if self._next_start_ms is not None else end - int(self.interval * 1000)
+        if end <= start:
+            return None
+        context = context_factory.build("search", city="*")
+        intent = {"tags": [{"code": "catalog_inc", "list": [
+            {"code": "start_time", "value": format_ondc_timestamp.millis(start)},
+            {"code": "end_time", "value": format_ondc_timestamp.millis(end)},
+        ]}]}
+        try:
+            self.submit("search", {"context": context, "message": {"intent": intent}})
+        except Exception as e:
+            # The next window starts where this one would have, so nothing is skipped
+            logger.warning(f"catalog_inc window not sent: {e}")
+            return None
+        self._track(context["transaction_id"], CatalogRequest("inc", start, end))
+        self._next_start_ms = end
+        self._counters["windows"] += 1
+        return start, end
+
+    async def start(self) -> None:
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self._expire()
+            self.request_window()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def high_water(self, bpp_id: str, provider_id: str) -> Optional[int]:
+        return self._high_water.get((bpp_id, provider_id))
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire()
+        next_start = self._next_start_ms
+        return {
+            "providers_tracked": len(self._high_water),
+            "stale_providers": len(self._stale),
+            "pending_requests": len(self._requests),
+            "next_window_start": None if next_start is None else format_ondc_timestamp.millis(next_start),
+            "interval": self.interval,
+            **self._counters,
+        }
+
+
+# Global catalog sync instance
+catalog_sync = CatalogSync()
@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -19,6 +21,16 @@ class Settings(BaseSettings):
     ONDC_TYPE: str = "BAP"
     ONDC_CALLBACK_URL: str = "https://neo-server.rozana.in/on_subscribe"
 
+    # ONDC Context Defaults (static fields of every context block)
+    ONDC_CONTEXT_DOMAIN: str = "ONDC:RET10"
+    ONDC_CONTEXT_COUNTRY: str = "IND"
+    ONDC_CONTEXT_CITY: str = "std:011"
+    ONDC_CORE_VERSION: str = "1.2.0"
+    ONDC_CONTEXT_TTL: str = "PT30S"
+    # Allowance for clock skew against context.timestamp when deriving request deadlines (seconds)
+    ONDC_DEADLINE_CLOCK_SKEW: float = 2.0
+    ONDC_MESSAGE_ID_BATCH: int = 256
+
     # ONDC Registry Settings (for production)
     ONDC_REGISTRY_URL: str = "https://registry.ondc.org"
     ONDC_GATEWAY_URL: str = "https://gateway.ondc.org"
@@ -26,6 +38,111 @@ class Settings(BaseSettings):
     # Security Settings
     ONDC_PRIVATE_KEY_PATH: str = "keys/private_key.pem"
     ONDC_PUBLIC_KEY_PATH: str = "keys/public_key.pem"
+    ONDC_CREDENTIALS_PATH: str = "secrets/ondc_credentials.json"
+    # Site verification page written on key rotation and served at /ondc-site-verification.html
+    ONDC_SITE_VERIFICATION_PATH: str = "ondc-site-verification.html"
+    ONDC_SIGNATURE_VALIDITY: int = 3600
+    ONDC_KEY_ROTATION_OVERLAP: float = 3600.0
+    ONDC_KEY_WATCH_INTERVAL: float = 5.0
+
+    # Outbound HTTP Client Settings (shared connection pool)
+    ONDC_HTTP_MAX_CONNECTIONS: int = 100
+    ONDC_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    ONDC_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    ONDC_HTTP_TIMEOUT: float = 10.0
+    ONDC_HTTP_CONNECT_TIMEOUT: float = 5.0
+    ONDC_HTTP_POOL_TIMEOUT: float = 5.0
+    ONDC_HTTP2_ENABLED: bool = False
+
+    # Outbound Dispatch (bounded queue, worker tasks, concurrent calls per destination host)
+    ONDC_DISPATCH_QUEUE_SIZE: int = 10000
+    ONDC_DISPATCH_WORKERS: int = 32
+    ONDC_DISPATCH_PER_DESTINATION: int = 8
+
+    # Outbound Retry Spool (failed sends kept on disk and retried with backoff until their deadline; seconds/bytes)
+    ONDC_RETRY_SPOOL_ENABLED: bool = True
+    ONDC_RETRY_SPOOL_DIR: str = "data/spool"
+    ONDC_RETRY_SEGMENT_BYTES: int = 16 * 1024 * 1024
+    ONDC_RETRY_COMMIT_INTERVAL: float = 0.002
+    ONDC_RETRY_BASE_DELAY: float = 0.5
+    ONDC_RETRY_MAX_DELAY: float = 30.0
+    ONDC_RETRY_MAX_ATTEMPTS: int = 8
+    ONDC_RETRY_PER_DESTINATION: int = 2
+
+    # Search Aggregation (on_search results per transaction; seconds)
+    ONDC_SEARCH_DEFAULT_TTL: float = 30.0
+    ONDC_SEARCH_RESULT_RETENTION: float = 300.0
+    ONDC_SEARCH_MAX_SESSIONS: int = 10000
+
+    # Callback Correlation (on_* callbacks matched to requests by message_id; seconds)
+    ONDC_CALLBACK_DEFAULT_TTL: float = 30.0
+    ONDC_CALLBACK_LATE_MEMORY: int = 10000
+
+    # Incremental Catalog Refresh (seconds between catalog_inc windows; opt-in, 0 disables the scheduler)
+    ONDC_CATALOG_INC_INTERVAL: float = 0.0
+
+    # Catalog Download Links (catalog_full delivered as a file; sizes in bytes/characters)
+    ONDC_CATALOG_DOWNLOAD_CONCURRENCY: int = 2
+    ONDC_CATALOG_DOWNLOAD_CHUNK_SIZE: int = 65536
+    ONDC_CATALOG_DOWNLOAD_RETRIES: int = 5
+    ONDC_CATALOG_DOWNLOAD_MAX_VALUE: int = 16 * 1024 * 1024
+
+    # Registry Lookup Cache Settings (seconds)
+    ONDC_LOOKUP_CACHE_TTL: float = 300.0
+    ONDC_LOOKUP_CACHE_STALE_TTL: float = 60.0
+    ONDC_LOOKUP_CACHE_NEGATIVE_TTL: float = 30.0
+    ONDC_LOOKUP_CACHE_MAX_ENTRIES: int = 10000
+
+    # Inbound Signature Verification (route prefix -> enforce | log | off)
+    ONDC_AUTH_ROUTE_MODES: Dict[str, str] = {
+        "/on_": "log",
+        "/on_subscribe": "off",
+        "/vlookup": "log",
+    }
+    ONDC_AUTH_LATENCY_BUDGET_MS: float = 5.0
+    # Allowance for sender clock skew against a signature's created/expires window (seconds)
+    ONDC_AUTH_CLOCK_SKEW: int = 5
+
+    # Transaction Store (memory | sqlite; sqlite is shared by all workers via WAL)
+    TRANSACTION_STORE_BACKEND: str = "sqlite"
+    TRANSACTION_STORE_PATH: str = "data/transactions.db"
+    TRANSACTION_STORE_FLUSH_INTERVAL: float = 0.05
+    TRANSACTION_STORE_BATCH_SIZE: int = 500
+
+    # Transaction Retention (status -> seconds since last write; "*" for other statuses, 0 keeps forever)
+    TRANSACTION_RETENTION: Dict[str, float] = {
+        "INITIATED": 600.0,
+        "FAILED": 3600.0,
+        "VERIFIED": 6 * 3600.0,
+        "*": 24 * 3600.0,
+    }
+    TRANSACTION_ARCHIVE_STATUSES: List[str] = ["VERIFIED"]
+    TRANSACTION_RETENTION_TICK: float = 1.0
+    TRANSACTION_RETENTION_SLOTS: int = 3600
+
+    # Transaction Journal (backend "journal": in-memory state, journaled to disk)
+    TRANSACTION_JOURNAL_DIR: str = "data/journal"
+    TRANSACTION_JOURNAL_COMMIT_INTERVAL: float = 0.002
+    TRANSACTION_JOURNAL_SNAPSHOT_EVERY: int = 10000
+
+    # Flow State (order-flow state per transaction, kept in the "flows" transaction store namespace)
+    FLOW_STATE_CACHE_SIZE: int = 100000
+    FLOW_STATE_RETENTION: Dict[str, float] = {
+        "SEARCHING": 3600.0,
+        "*": 30 * 24 * 3600.0,
+    }
+
+    # Transaction Listing
+    TRANSACTION_PAGE_SIZE: int = 100
+    TRANSACTION_PAGE_MAX: int = 1000
+
+    # Body Logging (route prefix -> fraction of bodies logged; bodies capped at LOG_BODY_MAX_CHARS)
+    LOG_BODY_SAMPLE_RATES: Dict[str, float] = {
+        "/": 1.0,
+        "/on_search": 0.1,
+    }
+    LOG_BODY_MAX_CHARS: int = 4096
+    LOG_REDACT_HEADERS: List[str] = ["authorization", "x-gateway-authorization", "proxy-authorization", "cookie", "set-cookie"]
 
 
 settings = Settings()
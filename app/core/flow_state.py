@@ -0,0 +1,196 @@
+"""
+ONDC Flow State Module
+Per-transaction state machine over a transition table, validating the order of order-flow actions and
+persisting each transaction's state in the transaction store
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+
+from app.core.config import settings
+from app.core.ondc_context import Deadline, format_ondc_timestamp
+from app.core.transaction_store import TransactionStore, flow_store
+
+logger = logging.getLogger(__name__)
+
+# State of a transaction with no stored record
+START = "NEW"
+
+# Order flow (search -> select -> init -> confirm -> status/track/update/cancel, as in
+# correct_ondc_transaction_format.py and flow_*.sh): (state, action) -> next state.
+# on_search is not tracked; any number of BPPs answer a search, in any order.
+ORDER_TRANSITIONS: Dict[Tuple[str, str], str] = {
+    (START, "search"): "SEARCHING",
+    ("SEARCHING", "search"): "SEARCHING",
+    (START, "select"): "SELECTING",
+    ("SEARCHING", "select"): "SELECTING",
+    ("SELECTING", "on_select"): "SELECTED",
+    ("SELECTED", "select"): "SELECTING",
+    ("SELECTED", "init"): "INITIALIZING",
+    ("INITIALIZING", "on_init"): "INITIALIZED",
+    ("INITIALIZED", "select"): "SELECTING",
+    ("INITIALIZED", "init"): "INITIALIZING",
+    ("INITIALIZED", "confirm"): "CONFIRMING",
+    ("CONFIRMING", "on_confirm"): "CONFIRMED",
+    **{("CONFIRMED", action): "CONFIRMED" for action in (
+        "status", "track", "update", "support", "rating",
+        "on_status", "on_track", "on_update", "on_support", "on_rating",
+    )},
+    ("CONFIRMED", "cancel"): "CANCELLING",
+    # Cancellation by the seller arrives as an unsolicited on_cancel
+    ("CONFIRMED", "on_cancel"): "CANCELLED",
+    ("CANCELLING", "on_cancel"): "CANCELLED",
+    **{(state, action): state for state in ("CANCELLING", "CANCELLED") for action in (
+        "status", "support", "on_status", "on_support",
+    )},
+    ("CANCELLED", "rating"): "CANCELLED",
+    ("CANCELLED", "on_rating"): "CANCELLED",
+}
+
+# States entered by a request and left by its callback. If the request's deadline
+# passes first, or the callback carries an error, the flow is back in the state it left.
+ORDER_AWAITING: FrozenSet[str] = frozenset({"SELECTING", "INITIALIZING", "CONFIRMING", "CANCELLING"})
+
+
+class FlowTransitionError(Exception):
+    """An action that is out of order (or a repeat) for the transaction's current state"""
+
+    def __init__(self, transaction_id: str, state: str, action: str):
+        self.transaction_id = transaction_id
+        self.state = state
+        self.action = action
+        super().__init__(f"{action} is not allowed for transaction {transaction_id} in state {state}")
+
+
+@dataclass
+class FlowTransition:
+    """One accepted action, with the record it replaced (for undo)"""
+    transaction_id: str
+    action: str
+    from_state: str
+    to_state: str
+    before: Optional[Dict[str, Any]]
+    after: Dict[str, Any]
+
+
+class FlowStateMachine:
+    """
+    Validates each action against its transaction's state with one lookup in the
+    transition table, before anything is sent or resolved, and records the new state.
+
+    State records live in a transaction store (the "flows" namespace; SQLite by
+    default), so flows survive restarts. A bounded LRU cache of records keeps the
+    store off the hot path; misses are one point read. The check and the cache
+    update run without an await between them, so concurrent requests for one
+    transaction cannot both pass the same step.
+    """
+
+    def __init__(self, store: Optional[TransactionStore] = None,
+                 transitions: Optional[Dict[Tuple[str, str], str]] = None,
+                 awaiting: Optional[FrozenSet[str]] = None, cache_size: Optional[int] = None,
+                 clock: Callable[[], float] = time.time):
+        self.store = store if store is not None else flow_store
+        self.transitions = transitions if transitions is not None else ORDER_TRANSITIONS
+        self.awaiting = awaiting if awaiting is not None else ORDER_AWAITING
+        self.cache_size = cache_size or settings.FLOW_STATE_CACHE_SIZE
+        self.clock = clock
+        self._cache: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self._counters = {"accepted": 0, "rejected": 0, "timed_out": 0, "failed_callbacks": 0, "cache_misses": 0}
+
+    def _cached(self, transaction_id: str, record: Optional[Dict[str, Any]]) -> None:
+        self._cache[transaction_id] = record
+        self._cache.move_to_end(transaction_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _record(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            record = self._cache[transaction_id]
+        except KeyError:
+            self._counters["cache_misses"] += 1
+            record = await self.store.get(transaction_id)
+            # Another request for this transaction may have been accepted during the read
+            if transaction_id in self._cache:
+                return self._cache[transaction_id]
+        self._cached(transaction_id, record)
+        return record
+
+    def _state_of(self, record: Optional[Dict[str, Any]]) -> str:
+        """Current state; a request whose callback is overdue leaves the flow where it was"""
+        if record is None:
+            return START
+        until = record.get("awaiting_until")
+        if until is not None and self.clock() >= until:
+            return record.get("previous", START)
+        return record["status"]
+
+    async def state(self, transaction_id: str) -> str:
+        return self._state_of(await self._record(transaction_id))
+
+    async def advance(self, transaction_id: str, action: str, deadline: Optional[Deadline] = None,
+                      failed: bool = False) -> FlowTransition:
+        """
+        Accept action for the transaction or raise FlowTransitionError. deadline bounds
+        the wait for the callback of a request; failed marks a callback carrying an error.
+        """
+        record = await self._record(transaction_id)
+        state = self._state_of(record)
+        next_state = self.transitions.get((state, action))
+        if next_state is None:
+            self._counters["rejected"] += 1
+            logger.warning(f"Rejected {action} for transaction {transaction_id} in state {state}")
+            raise FlowTransitionError(transaction_id, state, action)
+
+        if record is not None and state != record["status"]:
+            self._counters["timed_out"] += 1
+        if failed and state in self.awaiting:
+            self._counters["failed_callbacks"] += 1
+            next_state = record.get("previous", START)
+
+        now = format_ondc_timestamp()
+        if record is not None and next_state == state == record["status"]:
+            # Same state: keeps the previous state and deadline of a pending request
+            updated = {**record, "action": action, "updated_at": now}
+        else:
+            updated = {"status": next_state, "previous": state, "action": action,
+                       "created_at": record.get("created_at", now) if record else now, "updated_at": now}
+            if next_state in self.awaiting:
+                updated["awaiting_until"] = (deadline.expires_at if deadline is not None
+                                             else self.clock() + settings.ONDC_CALLBACK_DEFAULT_TTL)
+
+        self._cached(transaction_id, updated)
+        self._counters["accepted"] += 1
+        await self.store.put(transaction_id, updated)
+        return FlowTransition(transaction_id, action, state, next_state, record, updated)
+
+    async def undo(self, transition: FlowTransition) -> None:
+        """Put back the state before an accepted action that was then not carried out"""
+        if self._cache.get(transition.transaction_id) is not transition.after:
+            return
+        self._cached(transition.transaction_id, transition.before)
+        if transition.before is None:
+            await self.store.delete(transition.transaction_id)
+        else:
+            await self.store.put(transition.transaction_id, transition.before)
+
+    async def describe(self, transaction_id: str) -> Dict[str, Any]:
+        """The transaction's state and the actions it allows next"""
+        record = await self._record(transaction_id)
+        state = self._state_of(record)
+        return {
+            "transaction_id": transaction_id,
+            "state": state,
+            "last_action": record.get("action") if record else None,
+            "updated_at": record.get("updated_at") if record else None,
+            "allowed": sorted(action for (source, action) in self.transitions if source == state),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cached": len(self._cache), **self._counters}
+
+
+# Global flow state machine instance
+flow_states = FlowStateMachine()
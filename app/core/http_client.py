@@ -0,0 +1,69 @@
+"""
+ONDC Outbound HTTP Client Module
+Owns the shared, connection-pooled httpx.AsyncClient used for registry and network calls
+"""
+
+import logging
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ONDCHttpClient:
+    """Process-wide pooled async HTTP client for outbound ONDC calls"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _build_client(self) -> httpx.AsyncClient:
+        """Create the pooled client from settings"""
+        limits = httpx.Limits(
+            max_connections=settings.ONDC_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.ONDC_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.ONDC_HTTP_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(
+            settings.ONDC_HTTP_TIMEOUT,
+            connect=settings.ONDC_HTTP_CONNECT_TIMEOUT,
+            pool=settings.ONDC_HTTP_POOL_TIMEOUT,
+        )
+
+        http2 = settings.ONDC_HTTP2_ENABLED
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("ONDC_HTTP2_ENABLED is set but the 'h2' package is not installed; using HTTP/1.1")
+                http2 = False
+
+        return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+    async def start(self) -> None:
+        """Open the shared client (called from the app lifespan)"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+            logger.info("Shared ONDC HTTP client started")
+
+    def get_client(self) -> httpx.AsyncClient:
+        """
+        Return the shared client, creating it lazily when used outside the
+        app lifespan (scripts, tests)
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def close(self) -> None:
+        """Close the shared client and release pooled connections"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Shared ONDC HTTP client closed")
+        self._client = None
+
+
+# Global HTTP client instance
+http_client = ONDCHttpClient()
@@ -0,0 +1,174 @@
+"""
+ONDC Logging Module
+Off-thread log writing plus lazy, sampled and size-capped request/response body logging
+"""
+
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+from app.core.config import settings
+from app.core.ondc_responses import dumps
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "[REDACTED]"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class LazyJSON:
+    """
+    Body captured on the calling thread, formatted only when a handler formats the record.
+    Records are formatted on the writer thread, so the payload is copied here (bytes are
+    sliced to the size cap, other payloads encoded once) and later mutations cannot race it.
+    """
+
+    __slots__ = ("payload", "max_chars")
+
+    def __init__(self, payload: Any, max_chars: int):
+        # max_chars characters are at most 4 * max_chars UTF-8 bytes; one more shows truncation
+        limit = max_chars * 4 + 1
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = bytes(payload[:limit])
+        elif not isinstance(payload, str):
+            try:
+                payload = dumps(payload)[:limit]
+            except (TypeError, ValueError):
+                payload = repr(payload)[:max_chars + 1]
+        self.payload = payload
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        if isinstance(self.payload, bytes):
+            text = self.payload.decode("utf-8", errors="replace")
+        else:
+            text = self.payload
+        if len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}...[truncated]"
+        return text
+
+
+class RedactedHeaders:
+    """Header mapping rendered with credentials masked, formatted lazily"""
+
+    __slots__ = ("headers", "redact")
+
+    def __init__(self, headers: Iterable[Tuple[str, str]], redact: Iterable[str]):
+        self.headers = list(headers)
+        self.redact = {name.lower() for name in redact}
+
+    def __str__(self) -> str:
+        return json.dumps({
+            name: REDACTED if name.lower() in self.redact else value
+            for name, value in self.headers
+        })
+
+
+class NonFormattingQueueHandler(QueueHandler):
+    """
+    QueueHandler that enqueues the record untouched.
+    The stock prepare() formats the message on the calling thread, which would
+    run the (lazy) body formatting on the event loop; bodies are already captured.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class BodyLogger:
+    """Per-route sampled, size-capped logging of request/response bodies and headers"""
+
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None,
+                 max_chars: Optional[int] = None, redact_headers: Optional[Iterable[str]] = None):
+        rates = sample_rates if sample_rates is not None else settings.LOG_BODY_SAMPLE_RATES
+        # Longest prefix first so specific routes override broad ones
+        self.sample_rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self.max_chars = max_chars if max_chars is not None else settings.LOG_BODY_MAX_CHARS
+        self.redact_headers = list(redact_headers if redact_headers is not None else settings.LOG_REDACT_HEADERS)
+        self._counters = {"logged": 0, "sampled_out": 0, "disabled": 0}
+
+    def rate_for(self, route: str) -> float:
+        for prefix, rate in self.sample_rates:
+            if route.startswith(prefix):
+                return rate
+        return 1.0
+
+    def _should_log(self, log: logging.Logger, route: str, level: int) -> bool:
+        if not log.isEnabledFor(level):
+            self._counters["disabled"] += 1
+            return False
+        rate = self.rate_for(route)
+        if rate < 1.0 and random.random() >= rate:
+            self._counters["sampled_out"] += 1
+            return False
+        self._counters["logged"] += 1
+        return True
+
+    def body(self, log: logging.Logger, label: str, payload: Any, route: str, level: int = logging.INFO) -> None:
+        """Log a body; serialization is deferred to the log writer thread"""
+        if self._should_log(log, route, level):
+            log.log(level, "%s: %s", label, LazyJSON(payload, self.max_chars))
+
+    def headers(self, log: logging.Logger, label: str, headers: Mapping[str, str], route: str,
+                level: int = logging.INFO) -> None:
+        """Log headers with credentials (Authorization, cookies, ...) masked"""
+        if self._should_log(log, route, level):
+            log.log(level, "%s: %s", label, RedactedHeaders(headers.items(), self.redact_headers))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "max_chars": self.max_chars,
+            "sample_rates": dict(self.sample_rates),
+        }
+
+
+class LogWriter:
+    """Routes the app's log records through a queue to a background writer thread"""
+
+    def __init__(self):
+        self.queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        self._listener: Optional[QueueListener] = None
+        self._queue_handler: Optional[QueueHandler] = None
+
+    def start(self, logger_name: str = "app", level: Optional[str] = None) -> None:
+        """Attach the queue handler to the app logger and start the writer thread"""
+        if self._listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self._listener = QueueListener(self.queue, stream_handler, respect_handler_level=True)
+        self._listener.start()
+
+        self._queue_handler = NonFormattingQueueHandler(self.queue)
+        app_logger = logging.getLogger(logger_name)
+        app_logger.setLevel((level or settings.LOG_LEVEL).upper())
+        app_logger.addHandler(self._queue_handler)
+        app_logger.propagate = False
+        logger.info("Background log writer started")
+
+    def stop(self, logger_name: str = "app") -> None:
+        """Detach the queue handler and flush pending records"""
+        if self._listener is None:
+            return
+
+        app_logger = logging.getLogger(logger_name)
+        app_logger.removeHandler(self._queue_handler)
+        app_logger.propagate = True
+        self._listener.stop()
+        self._listener = None
+        self._queue_handler = None
+
+    @property
+    def running(self) -> bool:
+        return self._listener is not None
+
+
+# Global logging instances
+body_logger = BodyLogger()
+log_writer = LogWriter()
@@ -0,0 +1,187 @@
+"""
+ONDC Subscriber Lookup Cache Module
+In-process cache for registry lookups with TTL, stale-while-revalidate,
+negative caching and single-flight request coalescing
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, Optional[str]]
+LookupFetcher = Callable[[str, Optional[str]], Awaitable[Any]]
+# Called with (subscriber_id, unique_key_id, result, negative) whenever an entry is (re)stored
+LookupListener = Callable[[str, Optional[str], Any, bool], None]
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    negative: bool
+    fresh_until: float
+    stale_until: float
+
+
+def parse_valid_until(result: Any) -> Optional[float]:
+    """Return the record's valid_until as an epoch timestamp, if present"""
+    record = result[0] if isinstance(result, list) and result else result
+    if not isinstance(record, dict):
+        return None
+
+    valid_until = record.get("valid_until")
+    if not valid_until:
+        return None
+
+    try:
+        return datetime.fromisoformat(str(valid_until).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        logger.warning(f"Unparseable valid_until in lookup record: {valid_until}")
+        return None
+
+
+def _is_negative(result: Any) -> bool:
+    """A lookup result is negative when the registry had nothing usable"""
+    if not result:
+        return True
+    return isinstance(result, dict) and "error" in result
+
+
+class SubscriberLookupCache:
+    """Cache of registry lookup results keyed by (subscriber_id, unique_key_id)"""
+
+    def __init__(
+        self,
+        fetcher: LookupFetcher,
+        ttl: float = 300.0,
+        stale_ttl: float = 60.0,
+        negative_ttl: float = 30.0,
+        max_entries: int = 10000,
+    ):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[CacheKey, _CacheEntry]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+        self.listeners: List[LookupListener] = []
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "fetch_errors": 0,
+            "evictions": 0,
+        }
+
+    async def get(self, subscriber_id: str, unique_key_id: Optional[str] = None) -> Any:
+        """
+        Return the cached lookup result, fetching it on a miss.
+        Stale entries are served immediately while a background refresh runs.
+        """
+        key = (subscriber_id, unique_key_id)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self._counters["negative_hits" if entry.negative else "hits"] += 1
+                return entry.value
+
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self._counters["stale_hits"] += 1
+                if key not in self._inflight:
+                    self._counters["refreshes"] += 1
+                    self._start_fetch(key)
+                return entry.value
+
+        self._counters["misses"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start_fetch(key)
+        else:
+            self._counters["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def invalidate(self, subscriber_id: Optional[str] = None, unique_key_id: Optional[str] = None) -> None:
+        """Drop one subscriber's entries, or everything when no id is given"""
+        if subscriber_id is None:
+            self._entries.clear()
+            return
+
+        for key in [k for k in self._entries if k[0] == subscriber_id]:
+            if unique_key_id is None or key[1] == unique_key_id:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/refresh counters for sizing the cache"""
+        lookups = self._counters["hits"] + self._counters["stale_hits"] + \
+            self._counters["negative_hits"] + self._counters["misses"]
+        served = lookups - self._counters["misses"]
+        return {
+            **self._counters,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "max_entries": self.max_entries,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+        }
+
+    def _start_fetch(self, key: CacheKey) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(self._fetch(key))
+        self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: CacheKey) -> Any:
+        try:
+            result = await self.fetcher(*key)
+        except Exception as e:
+            logger.error(f"Lookup fetch failed for {key[0]}: {e}")
+            self._counters["fetch_errors"] += 1
+            result = {"error": f"Lookup error: {str(e)}"}
+        finally:
+            self._inflight.pop(key, None)
+
+        self._store(key, result)
+        return result
+
+    def _store(self, key: CacheKey, result: Any) -> None:
+        now = time.monotonic()
+        negative = _is_negative(result)
+
+        if negative:
+            # A failed background refresh keeps serving the stale record
+            current = self._entries.get(key)
+            if current is not None and not current.negative and now < current.stale_until:
+                return
+            fresh_until = now + self.negative_ttl
+            stale_until = fresh_until
+        else:
+            fresh_until = now + self.ttl
+            stale_until = fresh_until + self.stale_ttl
+
+            # Never serve a record (fresh or stale) past its registry validity
+            valid_until = parse_valid_until(result)
+            if valid_until is not None:
+                remaining = valid_until - time.time()
+                fresh_until = min(fresh_until, now + remaining)
+                stale_until = min(stale_until, now + remaining)
+
+        self._entries[key] = _CacheEntry(result, negative, fresh_until, stale_until)
+        self._entries.move_to_end(key)
+        for listener in self.listeners:
+            listener(key[0], key[1], result, negative)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
@@ -0,0 +1,310 @@
+"""
+ONDC Authorization Module
+Verifies the ONDC Authorization header of inbound requests (BLAKE-512 digest + Ed25519)
+"""
+
+import base64
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from app.core.config import settings
+from app.core.lookup_cache import parse_valid_until
+from app.core.ondc_crypto import create_signing_string, hash_message, keyring, parse_authorization_header
+from app.core.ondc_responses import nack_response
+
+logger = logging.getLogger(__name__)
+
+MODE_ENFORCE = "enforce"
+MODE_LOG = "log"
+MODE_OFF = "off"
+
+
+@dataclass
+class AuthResult:
+    """Outcome of verifying one Authorization header"""
+    verified: bool
+    reason: str = ""
+    subscriber_id: Optional[str] = None
+    unique_key_id: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+
+class VerifyKeyCache:
+    """
+    Ready-made Ed25519 public key objects keyed by 'subscriber_id|unique_key_id'.
+    Each key is trusted for ttl seconds (the lookup cache TTL) and never past the
+    registry's valid_until, so a rotated or revoked key is looked up again.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl if ttl is not None else settings.ONDC_LOOKUP_CACHE_TTL
+        self.clock = clock
+        self._keys: "OrderedDict[str, Tuple[Ed25519PublicKey, float]]" = OrderedDict()
+
+    @staticmethod
+    def cache_key(subscriber_id: str, unique_key_id: Optional[str]) -> str:
+        return f"{subscriber_id}|{unique_key_id or ''}"
+
+    def get(self, subscriber_id: str, unique_key_id: Optional[str]) -> Optional[Ed25519PublicKey]:
+        key = self.cache_key(subscriber_id, unique_key_id)
+        entry = self._keys.get(key)
+        if entry is None:
+            return None
+        public_key, expires_at = entry
+        if self.clock() >= expires_at:
+            del self._keys[key]
+            return None
+        self._keys.move_to_end(key)
+        return public_key
+
+    def put(self, subscriber_id: str, unique_key_id: Optional[str], public_key_b64: str,
+            valid_until: Optional[float] = None) -> Ed25519PublicKey:
+        """Decode a base64 raw Ed25519 public key once and keep the key object"""
+        public_key = Ed25519PublicKey.from_public_bytes(base64.b64decode(public_key_b64))
+        expires_at = self.clock() + self.ttl
+        if valid_until is not None:
+            expires_at = min(expires_at, valid_until)
+        key = self.cache_key(subscriber_id, unique_key_id)
+        self._keys[key] = (public_key, expires_at)
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+        return public_key
+
+    def invalidate(self, subscriber_id: str, unique_key_id: Optional[str] = None) -> None:
+        prefix = self.cache_key(subscriber_id, unique_key_id) if unique_key_id else f"{subscriber_id}|"
+        for key in [k for k in self._keys if k.startswith(prefix)]:
+            del self._keys[key]
+
+    def on_lookup(self, subscriber_id: str, unique_key_id: Optional[str], result: Any, negative: bool) -> None:
+        """Lookup cache listener: a refreshed or negative registry entry replaces the decoded key"""
+        self.invalidate(subscriber_id, unique_key_id)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def _extract_signing_record(lookup_result: Any, unique_key_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Pick the record carrying the signing_public_key out of a registry lookup result"""
+    records = lookup_result if isinstance(lookup_result, list) else [lookup_result]
+    for record in records:
+        if not isinstance(record, dict) or "signing_public_key" not in record:
+            continue
+        record_key_id = record.get("ukId", record.get("unique_key_id"))
+        if unique_key_id is None or record_key_id in (None, unique_key_id):
+            return record
+    return None
+
+
+class ONDCAuthVerifier:
+    """Verifies ONDC signatures using cached key objects and the registry lookup cache"""
+
+    def __init__(self, key_cache: Optional[VerifyKeyCache] = None, latency_budget_ms: Optional[float] = None,
+                 clock_skew: Optional[int] = None):
+        self.key_cache = key_cache or VerifyKeyCache()
+        self.latency_budget_ms = latency_budget_ms if latency_budget_ms is not None else settings.ONDC_AUTH_LATENCY_BUDGET_MS
+        self.clock_skew = clock_skew if clock_skew is not None else settings.ONDC_AUTH_CLOCK_SKEW
+        self._counters = {
+            "verified": 0,
+            "failed": 0,
+            "missing_header": 0,
+            "key_lookups": 0,
+            "over_budget": 0,
+        }
+
+    async def resolve_key(self, subscriber_id: str, unique_key_id: Optional[str]) -> Optional[Ed25519PublicKey]:
+        """Return the sender's key object, looking it up in the registry on a cache miss"""
+        # Our own keys, including the previous ones while a rotation overlaps
+        for material in keyring.active_materials():
+            if material.subscriber_id == subscriber_id and unique_key_id in (None, material.unique_key_id):
+                return material.verify_key
+
+        public_key = self.key_cache.get(subscriber_id, unique_key_id)
+        if public_key is not None:
+            return public_key
+
+        from app.core.ondc_registry import registry_client
+
+        listeners = registry_client.lookup_cache.listeners
+        if self.key_cache.on_lookup not in listeners:
+            listeners.append(self.key_cache.on_lookup)
+
+        self._counters["key_lookups"] += 1
+        lookup_result = await registry_client.lookup_subscriber(subscriber_id, unique_key_id)
+        record = _extract_signing_record(lookup_result, unique_key_id)
+        if not record:
+            return None
+
+        try:
+            return self.key_cache.put(subscriber_id, unique_key_id, record["signing_public_key"],
+                                      parse_valid_until(record))
+        except Exception as e:
+            logger.error(f"Invalid signing public key for {subscriber_id}: {e}")
+            return None
+
+    async def verify_header(self, auth_header: Optional[str], body: bytes) -> AuthResult:
+        """Verify an Authorization header against the raw request body"""
+        started = time.perf_counter()
+        result = await self._verify_header(auth_header, body)
+        result.elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if result.verified:
+            self._counters["verified"] += 1
+        elif result.reason == "missing Authorization header":
+            self._counters["missing_header"] += 1
+        else:
+            self._counters["failed"] += 1
+
+        if result.elapsed_ms > self.latency_budget_ms:
+            self._counters["over_budget"] += 1
+            logger.warning(f"Signature verification took {result.elapsed_ms:.2f}ms "
+                           f"(budget {self.latency_budget_ms}ms) for {result.subscriber_id}")
+        return result
+
+    async def _verify_header(self, auth_header: Optional[str], body: bytes) -> AuthResult:
+        if not auth_header:
+            return AuthResult(False, "missing Authorization header")
+
+        params = parse_authorization_header(auth_header)
+        try:
+            subscriber_id, unique_key_id, algorithm = params["keyId"].split("|")
+            created = int(params["created"])
+            expires = int(params["expires"])
+            signature = base64.b64decode(params["signature"])
+        except (KeyError, ValueError):
+            return AuthResult(False, "malformed Authorization header")
+
+        if algorithm != "ed25519":
+            return AuthResult(False, f"unsupported algorithm {algorithm}", subscriber_id, unique_key_id)
+
+        now = int(time.time())
+        # A sender whose clock runs slightly ahead or behind is not rejected
+        if not created - self.clock_skew <= now <= expires + self.clock_skew:
+            return AuthResult(False, "signature expired or not yet valid", subscriber_id, unique_key_id)
+
+        public_key = await self.resolve_key(subscriber_id, unique_key_id)
+        if public_key is None:
+            return AuthResult(False, "unknown signing key", subscriber_id, unique_key_id)
+
+        signing_string = create_signing_string(hash_message(body), created, expires)
+        try:
+            public_key.verify(signature, signing_string.encode("utf-8"))
+        except InvalidSignature:
+            return AuthResult(False, "signature mismatch", subscriber_id, unique_key_id)
+
+        return AuthResult(True, "", subscriber_id, unique_key_id)
+
+    async def verify_detached(self, subscriber_id: str, unique_key_id: Optional[str],
+                              data: bytes, signature_b64: str) -> bool:
+        """Verify a plain Ed25519 signature over data (e.g. the vlookup search string)"""
+        public_key = await self.resolve_key(subscriber_id, unique_key_id)
+        if public_key is None:
+            return False
+        try:
+            public_key.verify(base64.b64decode(signature_b64), data)
+            return True
+        except (InvalidSignature, ValueError):
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "cached_keys": len(self.key_cache),
+            "latency_budget_ms": self.latency_budget_ms,
+        }
+
+
+class ONDCAuthMiddleware:
+    """
+    ASGI middleware verifying the Authorization header on the raw body bytes.
+    Each route prefix runs in 'enforce' (NACK with 401), 'log' (log and pass) or 'off' mode.
+    """
+
+    def __init__(self, app, verifier: Optional[ONDCAuthVerifier] = None,
+                 route_modes: Optional[Dict[str, str]] = None):
+        self.app = app
+        self.verifier = verifier or auth_verifier
+        modes = route_modes if route_modes is not None else settings.ONDC_AUTH_ROUTE_MODES
+        # Longest prefix first so specific routes override broad ones
+        self.route_modes = sorted(modes.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def mode_for(self, path: str) -> str:
+        for prefix, mode in self.route_modes:
+            if path.startswith(prefix):
+                return mode
+        return MODE_OFF
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        mode = self.mode_for(scope["path"])
+        if mode == MODE_OFF:
+            await self.app(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        auth_header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
+
+        result = await self.verifier.verify_header(auth_header, body)
+        state = scope.setdefault("state", {})
+        state["ondc_auth"] = result
+        # Handlers parse these same bytes (app.core.ondc_models) instead of re-reading the stream
+        state["raw_body"] = body
+
+        if not result.verified:
+            logger.warning(f"ONDC signature check failed on {scope['path']} ({mode}): {result.reason}")
+            if mode == MODE_ENFORCE:
+                response = nack_response(
+                    "POLICY-ERROR", "10001", result.reason, status_code=401,
+                    headers={
+                        "WWW-Authenticate": f'Signature realm="{settings.ONDC_SUBSCRIBER_ID}",'
+                                            f'headers="(created) (expires) digest"'
+                    },
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, self._replay(body, receive), send)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        return b"".join(chunks)
+
+    @staticmethod
+    def _replay(body: bytes, receive):
+        sent = False
+
+        async def replay_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay_receive
+
+
+# Global verifier instance
+auth_verifier = ONDCAuthVerifier()
@@ -0,0 +1,238 @@
+"""
+ONDC Context Module
+Builds ONDC context blocks from a cached template with fast timestamps and pre-generated message ids
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Mapping, Optional, Union
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Fields a reply copies from the incoming context when present
+_ECHOED_FIELDS = ("domain", "country", "city", "core_version", "bap_id", "bap_uri", "ttl")
+
+
+class _TimestampFormatter:
+    """ONDC timestamps (2024-01-01T10:00:00.123Z); the per-second prefix is formatted once"""
+
+    def __init__(self):
+        # (second, prefix) swapped as one tuple so threads never see a torn pair
+        self._cached = (-1, "")
+
+    def __call__(self, epoch: Optional[float] = None) -> str:
+        now = time.time() if epoch is None else epoch
+        second = int(now)
+        return f"{self._prefix(second)}.{int((now - second) * 1000):03d}Z"
+
+    def millis(self, epoch_ms: int) -> str:
+        """Exact formatting of an integer epoch in milliseconds (no float rounding)"""
+        second, milli = divmod(epoch_ms, 1000)
+        return f"{self._prefix(second)}.{milli:03d}Z"
+
+    def _prefix(self, second: int) -> str:
+        cached_second, prefix = self._cached
+        if second != cached_second:
+            prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+            self._cached = (second, prefix)
+        return prefix
+
+
+format_ondc_timestamp = _TimestampFormatter()
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def parse_ondc_timestamp(value: str) -> Optional[int]:
+    """
+    Epoch milliseconds for a timestamp in the exact ONDC format, or None when the
+    string is not in that format (so format_ondc_timestamp.millis() round-trips it)
+    """
+    if len(value) != 24 or value[-1] != "Z" or value[19] != ".":
+        return None
+    try:
+        parsed = datetime.fromisoformat(value[:-1]).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return (parsed - _EPOCH) // _MILLISECOND
+
+
+_DURATION = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$")
+
+
+def parse_duration(value: Optional[str], default: Optional[float] = None) -> Optional[float]:
+    """Seconds in an ISO 8601 duration as used by context.ttl (e.g. PT30S), or default"""
+    match = _DURATION.match(value or "")
+    if not match or not any(match.groups()):
+        return default
+    days, hours, minutes, seconds = (float(group or 0) for group in match.groups())
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+class Deadline:
+    """
+    When a request stops being worth working on: context.timestamp (or receipt,
+    if later or unparseable) plus context.ttl, parsed once and carried with the
+    request. Timeouts, queue waits and callback waits are clamped to remaining().
+    """
+
+    __slots__ = ("expires_at", "clock")
+
+    def __init__(self, expires_at: float, clock: Callable[[], float] = time.time):
+        self.expires_at = expires_at
+        self.clock = clock
+
+    @classmethod
+    def after(cls, seconds: float, clock: Callable[[], float] = time.time) -> "Deadline":
+        return cls(clock() + seconds, clock)
+
+    @classmethod
+    def from_context(cls, context: Union[Mapping[str, Any], BaseModel, None],
+                     clock: Callable[[], float] = time.time) -> "Deadline":
+        if context is None:
+            context = {}
+        get = context.get if isinstance(context, Mapping) else lambda name: getattr(context, name, None)
+        ttl = parse_duration(get("ttl"), parse_duration(settings.ONDC_CONTEXT_TTL, 30.0))
+        now = clock()
+        sent_ms = parse_ondc_timestamp(get("timestamp") or "")
+        start = now if sent_ms is None else min(sent_ms / 1000, now)
+        return cls(start + ttl + settings.ONDC_DEADLINE_CLOCK_SKEW, clock)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.clock() >= self.expires_at
+
+    def clamp(self, seconds: float) -> float:
+        """seconds, or what is left of the budget if that is less"""
+        return min(seconds, self.remaining())
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.3f}s)"
+
+
+def uuid4_batch(count: int) -> List[str]:
+    """count random (version 4) UUID strings from a single os.urandom call"""
+    raw = bytearray(os.urandom(16 * count))
+    ids = []
+    for offset in range(0, 16 * count, 16):
+        raw[offset + 6] = (raw[offset + 6] & 0x0F) | 0x40
+        raw[offset + 8] = (raw[offset + 8] & 0x3F) | 0x80
+        h = raw[offset:offset + 16].hex()
+        ids.append(f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}")
+    return ids
+
+
+class MessageIdPool:
+    """Hands out pre-generated UUIDv4 strings, refilling in batches"""
+
+    def __init__(self, batch_size: int = 256):
+        self.batch_size = batch_size
+        self._ids: "deque[str]" = deque()
+        self._lock = threading.Lock()
+
+    def next_id(self) -> str:
+        try:
+            return self._ids.popleft()
+        except IndexError:
+            with self._lock:
+                if not self._ids:
+                    self._ids.extend(uuid4_batch(self.batch_size))
+            return self.next_id()
+
+
+class ContextFactory:
+    """
+    Builds ONDC context dicts by copying a template of the static subscriber fields.
+    Only action, transaction_id, message_id and timestamp are filled per call.
+    """
+
+    def __init__(
+        self,
+        domain: Optional[str] = None,
+        country: Optional[str] = None,
+        city: Optional[str] = None,
+        core_version: Optional[str] = None,
+        bap_id: Optional[str] = None,
+        bap_uri: Optional[str] = None,
+        ttl: Optional[str] = None,
+        id_batch_size: Optional[int] = None,
+    ):
+        # Key order matches the ONDC examples; per-call fields are placeholders
+        self._template: Dict[str, Any] = {
+            "domain": domain or settings.ONDC_CONTEXT_DOMAIN,
+            "country": country or settings.ONDC_CONTEXT_COUNTRY,
+            "city": city or settings.ONDC_CONTEXT_CITY,
+            "action": None,
+            "core_version": core_version or settings.ONDC_CORE_VERSION,
+            "bap_id": bap_id or settings.ONDC_SUBSCRIBER_ID,
+            "bap_uri": bap_uri or settings.ONDC_SUBSCRIBER_URL,
+            "transaction_id": None,
+            "message_id": None,
+            "timestamp": None,
+            "ttl": ttl or settings.ONDC_CONTEXT_TTL,
+        }
+        self.ids = MessageIdPool(id_batch_size or settings.ONDC_MESSAGE_ID_BATCH)
+
+    @property
+    def static_fields(self) -> Dict[str, Any]:
+        return {k: v for k, v in self._template.items() if v is not None}
+
+    def next_message_id(self) -> str:
+        return self.ids.next_id()
+
+    def new_transaction_id(self) -> str:
+        return self.ids.next_id()
+
+    def build(self, action: str, transaction_id: Optional[str] = None, message_id: Optional[str] = None,
+              bpp_id: Optional[str] = None, bpp_uri: Optional[str] = None, **overrides: Any) -> Dict[str, Any]:
+        """Context for an outbound request (or a reply built from scratch)"""
+        context = self._template.copy()
+        context["action"] = action
+        context["transaction_id"] = transaction_id or self.ids.next_id()
+        context["message_id"] = message_id or self.ids.next_id()
+        context["timestamp"] = format_ondc_timestamp()
+        if bpp_id:
+            context["bpp_id"] = bpp_id
+        if bpp_uri:
+            context["bpp_uri"] = bpp_uri
+        if overrides:
+            context.update(overrides)
+        return context
+
+    def reply(self, incoming: Union[Mapping[str, Any], BaseModel, None], action: str,
+              transaction_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Context answering an incoming one: echoes its routing fields (falling back to
+        ours), keeps its transaction_id and stamps a fresh message_id and timestamp
+        """
+        context = self._template.copy()
+        if incoming is not None:
+            get = incoming.get if isinstance(incoming, Mapping) else lambda name: getattr(incoming, name, None)
+            for name in _ECHOED_FIELDS:
+                value = get(name)
+                if value:
+                    context[name] = value
+            transaction_id = transaction_id or get("transaction_id")
+
+        context["action"] = action
+        context["transaction_id"] = transaction_id or self.ids.next_id()
+        context["message_id"] = self.ids.next_id()
+        context["timestamp"] = format_ondc_timestamp()
+        return context
+
+
+# Global context factory instance
+context_factory = ContextFactory()
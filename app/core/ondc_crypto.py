@@ -3,73 +3,361 @@ ONDC Cryptography Module
 Handles encryption, decryption, signing, and verification for ONDC protocol
 """
 
+import asyncio
 import base64
+import hashlib
 import json
 import logging
-from typing import Dict, Any, Optional
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
 from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
-import os
+
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+_AUTH_PARAM_RE = re.compile(r'(\w+)="([^"]*)"')
 
-class ONDCCrypto:
-    """ONDC Cryptography handler"""
+
+def hash_message(body: bytes) -> str:
+    """BLAKE-512 digest of the raw request body, base64 encoded"""
+    return base64.b64encode(hashlib.blake2b(body, digest_size=64).digest()).decode('utf-8')
+
+
+def create_signing_string(digest_base64: str, created: int, expires: int) -> str:
+    """Build the ONDC signing string for an Authorization header"""
+    return f"(created): {created}\n(expires): {expires}\ndigest: BLAKE-512={digest_base64}"
+
+
+def parse_authorization_header(auth_header: str) -> Dict[str, str]:
+    """Split an ONDC 'Signature keyId=...,signature=...' header into its parameters"""
+    return dict(_AUTH_PARAM_RE.findall(auth_header))
+
+
+@dataclass(frozen=True)
+class KeyMaterial:
+    """Immutable snapshot of loaded ONDC key material with ready-to-use key objects"""
+    credentials: Dict[str, Any]
+    subscriber_id: str
+    unique_key_id: str
+    signing_key: Ed25519PrivateKey
+    signing_public_key: str
+    verify_key: Ed25519PublicKey
+    encryption_key: X25519PrivateKey
+    encryption_public_key: str
+    key_id: str
+
+
+DEFAULT_ONDC_PUBLIC_KEYS = {
+    "prod": "MCowBQYDK2VuAyEAvVEyZY91O2yV8w8/CAwVDAnqIZDJJUPdLUUKwLo3K0M=",
+    "pre_prod": "MCowBQYDK2VuAyEAa9Wbpvd9SsrpOZFcynyt/TO3x0Yrqyys4NUGIvyxX2Q=",
+    "staging": "MCowBQYDK2VuAyEAduMuZgmtpjdCuxv+Nc49K0cB6tL/Dj3HZetvVN7ZekM="
+}
+
+
+def generate_credentials(subscriber_id: str, ondc_public_keys: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Generate a fresh credentials dict (same layout as scripts/generate_ondc_keys.py):
+    Ed25519 signing keys, X25519 encryption keys and a signed request id
+    """
+    signing_key = Ed25519PrivateKey.generate()
+    encryption_key = X25519PrivateKey.generate()
+    request_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
     
-    def __init__(self):
-        self.credentials = self._load_credentials()
-        self.signing_private_key = self._load_signing_private_key()
-        self.encryption_private_key = self._load_encryption_private_key()
+    return {
+        "generated_at": now.isoformat(),
+        "subscriber_id": subscriber_id,
+        "request_id": request_id,
+        "signed_request_id": base64.b64encode(signing_key.sign(request_id.encode('utf-8'))).decode('utf-8'),
+        "signing_keys": {
+            "private_key": base64.b64encode(signing_key.private_bytes(
+                serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption()
+            )).decode('utf-8'),
+            "public_key": base64.b64encode(signing_key.public_key().public_bytes(
+                serialization.Encoding.Raw, serialization.PublicFormat.Raw
+            )).decode('utf-8')
+        },
+        "encryption_keys": {
+            "private_key": base64.b64encode(encryption_key.private_bytes(
+                serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption()
+            )).decode('utf-8'),
+            "public_key": base64.b64encode(encryption_key.public_key().public_bytes(
+                serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+            )).decode('utf-8')
+        },
+        # Nanosecond ids: two rotations within one second still get distinct keys
+        "unique_key_id": f"key_{time.time_ns()}",
+        "ondc_public_keys": dict(ondc_public_keys or DEFAULT_ONDC_PUBLIC_KEYS)
+    }
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """(inode, size, mtime_ns) of a file, or None when it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class KeyRing:
+    """
+    Process-wide holder of ONDC signing/encryption keys.
+    Credentials are read and turned into key objects once; signing reuses them.
     
-    def _load_credentials(self) -> Dict[str, Any]:
-        """Load ONDC credentials from file"""
+    The loaded KeyMaterial is immutable and replaced by a single reference swap,
+    so in-flight requests always see a complete key set. After a swap the previous
+    material stays available for ONDC_KEY_ROTATION_OVERLAP seconds so challenges
+    and signatures made with the old keys still verify during rotation.
+    """
+
+    def __init__(self, credentials_path: Optional[str] = None, site_verification_path: Optional[str] = None):
+        self.credentials_path = credentials_path or settings.ONDC_CREDENTIALS_PATH
+        self.site_verification_path = site_verification_path or settings.ONDC_SITE_VERIFICATION_PATH
+        self._previous: Optional[KeyMaterial] = None
+        self._previous_until = 0.0
+        self._rotation_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+        self._file_signature = _file_signature(self.credentials_path)
+        self._material: Optional[KeyMaterial] = self._load()
+
+    def _load(self) -> Optional[KeyMaterial]:
+        """Load credentials from file and build key objects"""
         try:
-            with open("secrets/ondc_credentials.json", 'r') as f:
-                return json.load(f)
+            with open(self.credentials_path, 'r') as f:
+                credentials = json.load(f)
         except FileNotFoundError:
             logger.warning("ONDC credentials file not found. Generate keys first.")
-            return {}
+            return None
         except Exception as e:
             logger.error(f"Error loading ONDC credentials: {e}")
-            return {}
-    
-    def _load_signing_private_key(self) -> Optional[Ed25519PrivateKey]:
-        """Load Ed25519 signing private key"""
-        if not self.credentials:
             return None
-        
+
         try:
-            private_key_b64 = self.credentials['signing_keys']['private_key']
-            private_key_bytes = base64.b64decode(private_key_b64)
-            return Ed25519PrivateKey.from_private_bytes(private_key_bytes)
+            return self.build_material(credentials)
         except Exception as e:
-            logger.error(f"Error loading signing private key: {e}")
+            logger.error(f"Error loading ONDC key material: {e}")
             return None
+
+    @staticmethod
+    def build_material(credentials: Dict[str, Any]) -> KeyMaterial:
+        """Turn a credentials dict into a KeyMaterial snapshot"""
+        # Accept both 32-byte seeds and 64-byte libsodium secret keys
+        signing_key = Ed25519PrivateKey.from_private_bytes(
+            base64.b64decode(credentials['signing_keys']['private_key'])[:32]
+        )
+        encryption_private = base64.b64decode(credentials['encryption_keys']['private_key'])
+
+        subscriber_id = credentials.get('subscriber_id') or settings.ONDC_SUBSCRIBER_ID
+        unique_key_id = credentials['unique_key_id']
+
+        return KeyMaterial(
+            credentials=credentials,
+            subscriber_id=subscriber_id,
+            unique_key_id=unique_key_id,
+            signing_key=signing_key,
+            signing_public_key=credentials['signing_keys']['public_key'],
+            verify_key=signing_key.public_key(),
+            encryption_key=X25519PrivateKey.from_private_bytes(encryption_private),
+            encryption_public_key=credentials['encryption_keys']['public_key'],
+            key_id=f"{subscriber_id}|{unique_key_id}|ed25519",
+        )
+
+    def _swap(self, material: KeyMaterial) -> None:
+        """Atomically publish new material, keeping the old one for the overlap window"""
+        current = self._material
+        if current is not None and current.credentials != material.credentials:
+            self._previous = current
+            self._previous_until = time.monotonic() + settings.ONDC_KEY_ROTATION_OVERLAP
+        self._material = material
+        logger.info(f"ONDC key material active: {material.key_id}")
+
+    def reload(self) -> Optional[KeyMaterial]:
+        """
+        Re-read the credentials file and swap in the new material.
+        A missing or broken file keeps the current keys.
+        """
+        signature = _file_signature(self.credentials_path)
+        material = self._load()
+        if material is not None:
+            self._file_signature = signature
+            self._swap(material)
+        return self._material
+
+    async def rotate(self) -> KeyMaterial:
+        """
+        Generate new keys off the event loop, persist them atomically and swap them in
+        """
+        async with self._rotation_lock:
+            current = self._material
+            subscriber_id = current.subscriber_id if current else settings.ONDC_SUBSCRIBER_ID
+            ondc_public_keys = current.credentials.get('ondc_public_keys') if current else None
+
+            credentials = await asyncio.to_thread(generate_credentials, subscriber_id, ondc_public_keys)
+            material = self.build_material(credentials)
+            await asyncio.to_thread(self._write_credentials, credentials)
+
+            self._swap(material)
+            return material
+
+    def _write_credentials(self, credentials: Dict[str, Any]) -> None:
+        """Write the credentials file and site verification page via rename (never half-written)"""
+        directory = os.path.dirname(self.credentials_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.credentials_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(credentials, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.credentials_path)
+        self._file_signature = _file_signature(self.credentials_path)
+
+        verification_content = f"""<!-- Contents of ondc-site-verification.html -->
+<html>
+    <head>
+        <meta name='ondc-site-verification' content='{credentials["signed_request_id"]}' />
+    </head>
+    <body>
+        ONDC Site Verification Page
+        <br>
+        Subscriber ID: {credentials["subscriber_id"]}
+        <br>
+        Generated: {credentials["generated_at"]}
+    </body>
+</html>"""
+        verification_temp_path = f"{self.site_verification_path}.tmp"
+        with open(verification_temp_path, 'w') as f:
+            f.write(verification_content)
+        os.replace(verification_temp_path, self.site_verification_path)
+
+    async def start_watching(self) -> None:
+        """Start polling the credentials file for out-of-band changes"""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop_watching(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(settings.ONDC_KEY_WATCH_INTERVAL)
+            try:
+                await self.check_for_changes()
+            except Exception as e:
+                logger.error(f"Error watching ONDC credentials file: {e}")
+
+    async def check_for_changes(self) -> bool:
+        """Reload when the credentials file changed on disk; returns True when keys were swapped"""
+        signature = _file_signature(self.credentials_path)
+        if signature is None or signature == self._file_signature:
+            return False
+
+        async with self._rotation_lock:
+            material = await asyncio.to_thread(self._load)
+            self._file_signature = signature
+            if material is None:
+                return False
+            logger.info("ONDC credentials file changed on disk, reloading keys")
+            self._swap(material)
+            return True
+
+    @property
+    def material(self) -> Optional[KeyMaterial]:
+        return self._material
+
+    @property
+    def previous(self) -> Optional[KeyMaterial]:
+        """Material replaced by the last rotation, while the overlap window is open"""
+        if self._previous is not None and time.monotonic() < self._previous_until:
+            return self._previous
+        return None
+
+    def active_materials(self) -> List[KeyMaterial]:
+        """Current material first, then the previous one during rotation overlap"""
+        materials = [self._material] if self._material is not None else []
+        previous = self.previous
+        if previous is not None:
+            materials.append(previous)
+        return materials
+
+    @property
+    def available(self) -> bool:
+        return self._material is not None
+
+    def sign(self, data: bytes) -> bytes:
+        """Raw Ed25519 signature over data"""
+        material = self._material
+        if material is None:
+            raise RuntimeError("ONDC signing key not available. Generate keys first.")
+        return material.signing_key.sign(data)
+
+    def sign_request(self, body: bytes, created: Optional[int] = None, expires: Optional[int] = None) -> str:
+        """Return the finished ONDC Authorization header for a raw request body"""
+        material = self._material
+        if material is None:
+            raise RuntimeError("ONDC signing key not available. Generate keys first.")
+
+        created = int(time.time()) if created is None else created
+        expires = created + settings.ONDC_SIGNATURE_VALIDITY if expires is None else expires
+        signing_string = create_signing_string(hash_message(body), created, expires)
+        signature = base64.b64encode(material.signing_key.sign(signing_string.encode('utf-8'))).decode('utf-8')
+        return (
+            f'Signature keyId="{material.key_id}",algorithm="ed25519",created="{created}",'
+            f'expires="{expires}",headers="(created) (expires) digest",signature="{signature}"'
+        )
+
+
+class ONDCCrypto:
+    """ONDC Cryptography handler"""
     
-    def _load_encryption_private_key(self) -> Optional[X25519PrivateKey]:
-        """Load X25519 encryption private key"""
-        if not self.credentials:
-            return None
-        
-        try:
-            private_key_b64 = self.credentials['encryption_keys']['private_key']
-            private_key_bytes = base64.b64decode(private_key_b64)
-            return X25519PrivateKey.from_private_bytes(private_key_bytes)
-        except Exception as e:
-            logger.error(f"Error loading encryption private key: {e}")
-            return None
+    def __init__(self, keyring: KeyRing):
+        self.keyring = keyring
+        # environment -> [(key material it was derived from, AES key, AES algorithm object)]
+        self._shared_keys: Dict[str, List[Tuple[KeyMaterial, bytes, algorithms.AES]]] = {}
+    
+    @property
+    def credentials(self) -> Dict[str, Any]:
+        """Loaded ONDC credentials (empty when keys are not generated)"""
+        material = self.keyring.material
+        return material.credentials if material else {}
+    
+    @property
+    def signing_private_key(self) -> Optional[Ed25519PrivateKey]:
+        """Ed25519 signing private key"""
+        material = self.keyring.material
+        return material.signing_key if material else None
     
-    def get_ondc_public_key(self, environment: str = "staging") -> Optional[X25519PublicKey]:
+    @property
+    def encryption_private_key(self) -> Optional[X25519PrivateKey]:
+        """X25519 encryption private key"""
+        material = self.keyring.material
+        return material.encryption_key if material else None
+    
+    def get_ondc_public_key(self, environment: str = "staging",
+                            material: Optional[KeyMaterial] = None) -> Optional[X25519PublicKey]:
         """Get ONDC public key for the specified environment"""
-        if not self.credentials:
+        credentials = material.credentials if material else self.credentials
+        if not credentials:
             return None
         
         try:
-            ondc_public_key_b64 = self.credentials['ondc_public_keys'][environment]
+            ondc_public_key_b64 = credentials['ondc_public_keys'][environment]
             # ONDC public key is in DER format, need to decode it
             ondc_public_key_der = base64.b64decode(ondc_public_key_b64)
             return serialization.load_der_public_key(ondc_public_key_der)
@@ -78,19 +366,45 @@ class ONDCCrypto:
             return None
     
     def create_shared_key(self, environment: str = "staging") -> Optional[bytes]:
-        """Create shared key for encryption/decryption"""
-        if not self.encryption_private_key:
+        """Create shared key for encryption/decryption (memoized per environment)"""
+        entry = self._get_shared_key_entry(environment, self.keyring.material)
+        return entry[1] if entry else None
+    
+    def invalidate_shared_keys(self) -> None:
+        """Drop memoized shared keys (they are also dropped when the key ring reloads)"""
+        self._shared_keys.clear()
+    
+    def _get_shared_key_entry(self, environment: str,
+                              material: Optional[KeyMaterial]) -> Optional[Tuple[KeyMaterial, bytes, algorithms.AES]]:
+        if material is None:
             logger.error("Encryption private key not available")
             return None
         
-        ondc_public_key = self.get_ondc_public_key(environment)
+        entries = self._shared_keys.get(environment, [])
+        for entry in entries:
+            if entry[0] is material:
+                return entry
+        
+        derived_key = self._derive_shared_key(environment, material)
+        if not derived_key:
+            return None
+        
+        # Keep entries only for material the key ring still considers active
+        active = self.keyring.active_materials()
+        entry = (material, derived_key, algorithms.AES(derived_key))
+        self._shared_keys[environment] = [e for e in entries if any(e[0] is m for m in active)] + [entry]
+        return entry
+    
+    def _derive_shared_key(self, environment: str, material: KeyMaterial) -> Optional[bytes]:
+        """X25519 exchange with the ONDC public key followed by HKDF"""
+        ondc_public_key = self.get_ondc_public_key(environment, material)
         if not ondc_public_key:
             logger.error(f"ONDC public key not available for {environment}")
             return None
         
         try:
             # Perform X25519 key exchange
-            shared_key = self.encryption_private_key.exchange(ondc_public_key)
+            shared_key = material.encryption_key.exchange(ondc_public_key)
             
             # Use HKDF to derive a 32-byte key for AES-256
             derived_key = HKDF(
@@ -106,33 +420,49 @@ class ONDCCrypto:
             return None
     
     def decrypt_challenge(self, encrypted_challenge: str, environment: str = "staging") -> Optional[str]:
-        """Decrypt ONDC challenge using shared key"""
+        """
+        Decrypt ONDC challenge using shared key.
+        During a key rotation the previous encryption key is tried as a fallback.
+        """
         try:
-            # Get shared key
-            shared_key = self.create_shared_key(environment)
-            if not shared_key:
-                return None
-            
             # Decode base64 encrypted challenge
             encrypted_data = base64.b64decode(encrypted_challenge)
+        except Exception as e:
+            logger.error(f"Error decrypting challenge: {e}")
+            return None
+        
+        for material in self.keyring.active_materials():
+            # Get memoized shared key and AES algorithm object
+            entry = self._get_shared_key_entry(environment, material)
+            if not entry:
+                continue
             
+            plaintext = self._decrypt_cbc(entry[2], encrypted_data)
+            if plaintext is not None:
+                return plaintext
+        
+        logger.error("Error decrypting challenge: no active key could decrypt it")
+        return None
+    
+    @staticmethod
+    def _decrypt_cbc(aes: algorithms.AES, encrypted_data: bytes) -> Optional[str]:
+        """AES-256-CBC decrypt of IV || ciphertext with PKCS7 padding check"""
+        try:
             # Extract IV (first 16 bytes) and ciphertext
             iv = encrypted_data[:16]
             ciphertext = encrypted_data[16:]
             
-            # Decrypt using AES-256-CBC
-            cipher = Cipher(algorithms.AES(shared_key), modes.CBC(iv))
-            decryptor = cipher.decryptor()
+            decryptor = Cipher(aes, modes.CBC(iv)).decryptor()
             padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
             
-            # Remove PKCS7 padding
+            # Remove PKCS7 padding (a wrong key almost never yields valid padding)
             padding_length = padded_plaintext[-1]
-            plaintext = padded_plaintext[:-padding_length]
-            
-            return plaintext.decode('utf-8')
+            if not 1 <= padding_length <= 16 or \
+                    padded_plaintext[-padding_length:] != bytes([padding_length]) * padding_length:
+                return None
             
-        except Exception as e:
-            logger.error(f"Error decrypting challenge: {e}")
+            return padded_plaintext[:-padding_length].decode('utf-8')
+        except Exception:
             return None
     
     def sign_data(self, data: str) -> Optional[str]:
@@ -142,7 +472,7 @@ class ONDCCrypto:
             return None
         
         try:
-            signature = self.signing_private_key.sign(data.encode('utf-8'))
+            signature = self.keyring.sign(data.encode('utf-8'))
             return base64.b64encode(signature).decode('utf-8')
         except Exception as e:
             logger.error(f"Error signing data: {e}")
@@ -192,5 +522,6 @@ class ONDCCrypto:
         return self.credentials['signed_request_id']
 
 
-# Global crypto instance
-crypto = ONDCCrypto()
\ No newline at end of file
+# Global key ring and crypto instances
+keyring = KeyRing()
+crypto = ONDCCrypto(keyring)
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""
+ONDC Dispatcher Module
+Bounded outbound queue drained by workers with per-destination concurrency limits
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.http_client import http_client
+from app.core.ondc_context import Deadline
+from app.core.ondc_crypto import keyring
+from app.core.ondc_responses import dumps
+from app.core.retry_spool import DELIVERED, REJECTED, RETRY, RetrySpool, SpoolEntry, retry_spool
+
+logger = logging.getLogger(__name__)
+
+# Answers worth another attempt; other 4xx mean the BPP rejected the call itself
+RETRYABLE_STATUS = frozenset({408, 425, 429})
+
+
+class DispatchQueueFull(Exception):
+    """The outbound queue is at ONDC_DISPATCH_QUEUE_SIZE; the caller should NACK"""
+
+
+class DispatchDestinationError(ValueError):
+    """No destination can be derived for an action (e.g. missing context.bpp_uri)"""
+
+
+class DispatchDeadlineExceeded(Exception):
+    """The request's context.ttl has already run out; it is not worth sending"""
+
+
+@dataclass
+class OutboundRequest:
+    """A signed outbound ONDC call waiting for delivery"""
+    action: str
+    url: str
+    destination: str
+    body: bytes
+    headers: Dict[str, str]
+    transaction_id: Optional[str] = None
+    message_id: Optional[str] = None
+    deadline: Optional[Deadline] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class LatencyWindow:
+    """Count/mean/max over all samples and percentiles over the most recent ones (ms)"""
+
+    def __init__(self, size: int = 1024):
+        self._recent: "deque[float]" = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms: float) -> None:
+        self._recent.append(ms)
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def snapshot(self) -> Dict[str, float]:
+        recent = sorted(self._recent)
+
+        def percentile(p: float) -> float:
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 2) if recent else 0.0
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(self.max, 2),
+        }
+
+
+def destination_url(action: str, context: Mapping[str, Any]) -> str:
+    """search goes to the gateway; every other action to the BPP named in the context"""
+    if action == "search" and not context.get("bpp_uri"):
+        return f"{settings.ONDC_GATEWAY_URL.rstrip('/')}/search"
+    bpp_uri = context.get("bpp_uri")
+    if not bpp_uri:
+        raise DispatchDestinationError(f"context.bpp_uri is required for {action}")
+    return f"{str(bpp_uri).rstrip('/')}/{action}"
+
+
+class ONDCDispatcher:
+    """
+    submit() signs the request and puts it on a bounded queue without awaiting;
+    worker tasks drain the queue and POST through the shared HTTP client, at most
+    per_destination at a time per BPP so one slow BPP cannot take every connection.
+    A request for a BPP whose slots are all taken is parked on that BPP's ready
+    queue and the worker moves on; whichever worker frees a slot sends the parked
+    requests next, so no worker ever sits idle holding a request.
+    Workers start lazily on first submit when the app lifespan has not started them.
+
+    Every request carries its Deadline: the HTTP timeouts are clamped to what is
+    left of it, and a request whose deadline passes while queued or parked is
+    dropped instead of sent.
+
+    With a spool, calls that fail with a connection error, a timeout or a
+    retryable status are written to it and retried (re-signed) until their deadline.
+    """
+
+    def __init__(self, queue_size: Optional[int] = None, workers: Optional[int] = None,
+                 per_destination: Optional[int] = None,
+                 client_factory: Callable[[], httpx.AsyncClient] = http_client.get_client,
+                 spool: Optional[RetrySpool] = None):
+        self.queue_size = queue_size or settings.ONDC_DISPATCH_QUEUE_SIZE
+        self.worker_count = workers or settings.ONDC_DISPATCH_WORKERS
+        self.per_destination = per_destination or settings.ONDC_DISPATCH_PER_DESTINATION
+        self.client_factory = client_factory
+        self.spool = spool
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # destination -> requests parked until one of its slots frees up
+        self._ready: Dict[str, "deque[OutboundRequest]"] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._queue_wait = LatencyWindow()
+        self._delivery = LatencyWindow()
+        self._counters = {"submitted": 0, "rejected": 0, "delivered": 0, "failed": 0, "unsigned": 0,
+                          "expired": 0, "spooled": 0, "retried": 0}
+
+    async def start(self) -> None:
+        self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        # (Re)create loop-bound state, e.g. when a new event loop replaced the old one
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._ready = {}
+        self._in_flight = {}
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.worker_count)]
+        if self.spool is not None:
+            self.spool.start(self._redeliver)
+        logger.info(f"ONDC dispatcher started with {self.worker_count} workers")
+
+    def submit(self, action: str, payload: Mapping[str, Any], deadline: Optional[Deadline] = None) -> OutboundRequest:
+        """
+        Sign and enqueue an outbound call; never waits on the network or the queue.
+        deadline defaults to the one given by the payload's context.timestamp and ttl.
+        """
+        context = payload.get("context") or {}
+        url = destination_url(action, context)
+        deadline = deadline or Deadline.from_context(context)
+        if deadline.expired:
+            self._counters["expired"] += 1
+            raise DispatchDeadlineExceeded(f"context.ttl of {action} has already elapsed")
+        body = dumps(payload)
+        request = OutboundRequest(
+            action=action, url=url, destination=httpx.URL(url).host, body=body, headers=self._headers(body),
+            transaction_id=context.get("transaction_id"), message_id=context.get("message_id"),
+            deadline=deadline,
+        )
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self._counters["rejected"] += 1
+            raise DispatchQueueFull(f"Outbound queue full ({self.queue_size})")
+        self._counters["submitted"] += 1
+        return request
+
+    def _headers(self, body: bytes) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if keyring.available:
+            headers["Authorization"] = keyring.sign_request(body)
+        else:
+            self._counters["unsigned"] += 1
+        return headers
+
+    async def _worker(self) -> None:
+        while True:
+            request = await self._queue.get()
+            destination = request.destination
+            if self._in_flight.get(destination, 0) >= self.per_destination:
+                # Stays unfinished for join() until a worker holding a slot sends it
+                self._ready.setdefault(destination, deque()).append(request)
+                continue
+            self._in_flight[destination] = self._in_flight.get(destination, 0) + 1
+            try:
+                while request is not None:
+                    try:
+                        await self._deliver(request)
+                    except Exception as e:
+                        logger.error(f"Dispatch worker error for {request.action} to {request.url}: {e}")
+                    finally:
+                        self._queue.task_done()
+                    request = self._next_ready(destination)
+            finally:
+                self._in_flight[destination] -= 1
+
+    def _next_ready(self, destination: str) -> Optional[OutboundRequest]:
+        """The next parked request for a destination whose slot this worker holds"""
+        ready = self._ready.get(destination)
+        while ready:
+            request = ready.popleft()
+            if request.deadline is None or not request.deadline.expired:
+                return request
+            self._expire(request, f"waiting for a connection to {destination}")
+            self._queue.task_done()
+        self._ready.pop(destination, None)
+        return None
+
+    def _expire(self, request: OutboundRequest, stage: str) -> None:
+        self._counters["expired"] += 1
+        logger.info(f"Dropping {request.action} to {request.url} (transaction {request.transaction_id}): "
+                    f"deadline passed {stage}")
+
+    @staticmethod
+    def _timeout(deadline: Deadline) -> httpx.Timeout:
+        return httpx.Timeout(
+            deadline.clamp(settings.ONDC_HTTP_TIMEOUT),
+            connect=deadline.clamp(settings.ONDC_HTTP_CONNECT_TIMEOUT),
+            pool=deadline.clamp(settings.ONDC_HTTP_POOL_TIMEOUT),
+        )
+
+    async def _deliver(self, request: OutboundRequest) -> None:
+        deadline = request.deadline or Deadline.after(settings.ONDC_HTTP_TIMEOUT)
+        if deadline.expired:
+            self._expire(request, "in the queue")
+            return
+        started = time.monotonic()
+        self._queue_wait.add((started - request.enqueued_at) * 1000)
+        try:
+            outcome = await self._post(request, deadline)
+        finally:
+            self._delivery.add((time.monotonic() - request.enqueued_at) * 1000)
+
+        if outcome == RETRY and self.spool is not None:
+            try:
+                if await self.spool.add(request.action, request.url, request.destination, request.body,
+                                        deadline.expires_at, request.transaction_id, request.message_id):
+                    self._counters["spooled"] += 1
+            except Exception as e:
+                logger.error(f"Could not spool {request.action} to {request.url} for retry: {e}")
+
+    async def _post(self, request: OutboundRequest, deadline: Deadline) -> str:
+        """One attempt: DELIVERED, REJECTED (answered with a final 4xx) or RETRY"""
+        try:
+            response = await self.client_factory().post(request.url, content=request.body, headers=request.headers,
+                                                        timeout=self._timeout(deadline))
+        except httpx.HTTPError as e:
+            self._counters["failed"] += 1
+            logger.warning(f"{request.action} to {request.url} failed: {e!r}")
+            return RETRY
+        if response.status_code < 400:
+            self._counters["delivered"] += 1
+            return DELIVERED
+        self._counters["failed"] += 1
+        logger.warning(f"{request.action} to {request.url} answered {response.status_code} "
+                       f"(transaction {request.transaction_id})")
+        return RETRY if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS else REJECTED
+
+    async def _redeliver(self, entry: SpoolEntry, body: bytes) -> str:
+        """Retry a spooled call; the signature is made afresh since the first one may have expired"""
+        self._counters["retried"] += 1
+        request = OutboundRequest(
+            action=entry.action, url=entry.url, destination=entry.destination, body=body,
+            headers=self._headers(body), transaction_id=entry.transaction_id, message_id=entry.message_id,
+            deadline=Deadline(entry.expires_at),
+        )
+        return await self._post(request, request.deadline)
+
+    async def join(self) -> None:
+        """Wait until everything queued so far has been delivered (or failed)"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """Deliver what is queued (up to drain_timeout seconds), then stop the workers"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"ONDC dispatcher stopped with {self._queue.qsize()} requests undelivered")
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        if self.spool is not None:
+            await self.spool.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "workers": len(self._workers),
+            "in_flight": {dest: count for dest, count in self._in_flight.items() if count},
+            "parked": {dest: len(ready) for dest, ready in self._ready.items() if ready},
+            "queue_wait": self._queue_wait.snapshot(),
+            "delivery_latency": self._delivery.snapshot(),
+            "retry_spool": self.spool.stats() if self.spool is not None else None,
+        }
+
+
+# Global dispatcher instance
+dispatcher = ONDCDispatcher(spool=retry_spool if settings.ONDC_RETRY_SPOOL_ENABLED else None)
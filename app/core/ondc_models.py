@@ -0,0 +1,320 @@
+"""
+ONDC Envelope Models
+Typed context + message models for every ONDC action, validated straight from raw body bytes
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Type, TypeVar
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from app.core.ondc_context import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class ONDCModel(BaseModel):
+    """Base for ONDC payload models; unknown fields are kept, not rejected"""
+    model_config = ConfigDict(extra="allow")
+
+
+class ONDCContext(ONDCModel):
+    domain: Optional[str] = None
+    country: Optional[str] = None
+    city: Optional[str] = None
+    location: Optional[Dict[str, Any]] = None
+    action: Optional[str] = None
+    core_version: Optional[str] = None
+    version: Optional[str] = None
+    bap_id: Optional[str] = None
+    bap_uri: Optional[str] = None
+    bpp_id: Optional[str] = None
+    bpp_uri: Optional[str] = None
+    transaction_id: Optional[str] = None
+    message_id: Optional[str] = None
+    timestamp: Optional[str] = None
+    key: Optional[str] = None
+    ttl: Optional[str] = None
+
+
+class EKYCContext(ONDCContext):
+    """Context for eKYC calls, with the defaults the BAP answers with"""
+    domain: str = "ONDC:RET10"
+    country: str = "IND"
+    city: str = "std:011"
+    core_version: str = "1.2.0"
+    bap_id: str = "neo-server.rozana.in"
+    bap_uri: str = "https://neo-server.rozana.in"
+    ttl: str = "PT30S"
+
+
+# Message building blocks
+
+class Descriptor(ONDCModel):
+    name: Optional[str] = None
+    code: Optional[str] = None
+    short_desc: Optional[str] = None
+    long_desc: Optional[str] = None
+
+
+class ProviderRef(ONDCModel):
+    id: Optional[str] = None
+    locations: Optional[List[Dict[str, Any]]] = None
+
+
+class Order(ONDCModel):
+    id: Optional[str] = None
+    state: Optional[str] = None
+    status: Optional[str] = None
+    provider: Optional[ProviderRef] = None
+    items: List[Dict[str, Any]] = []
+    billing: Optional[Dict[str, Any]] = None
+    fulfillments: Optional[List[Dict[str, Any]]] = None
+    quote: Optional[Dict[str, Any]] = None
+    payment: Optional[Dict[str, Any]] = None
+
+    @property
+    def provider_id(self) -> Optional[str]:
+        return self.provider.id if self.provider else None
+
+
+class Error(ONDCModel):
+    type: Optional[str] = None
+    code: Optional[str] = None
+    message: Optional[str] = None
+
+
+# Per-action messages
+
+class SearchMessage(ONDCModel):
+    intent: Optional[Dict[str, Any]] = None
+
+
+class OrderMessage(ONDCModel):
+    """select, init, confirm and their on_* callbacks"""
+    order: Order = Field(default_factory=Order)
+
+
+class StatusMessage(ONDCModel):
+    order_id: Optional[str] = None
+    ref_id: Optional[str] = None
+
+
+class TrackMessage(ONDCModel):
+    order_id: Optional[str] = None
+    callback_url: Optional[str] = None
+
+
+class CancelMessage(ONDCModel):
+    order_id: Optional[str] = None
+    cancellation_reason_id: Optional[str] = None
+    descriptor: Optional[Descriptor] = None
+
+
+class UpdateMessage(OrderMessage):
+    update_target: str = "order"
+
+
+class RatingMessage(ONDCModel):
+    ratings: List[Dict[str, Any]] = []
+
+
+class SupportMessage(ONDCModel):
+    ref_id: Optional[str] = None
+    support: Optional[Dict[str, Any]] = None
+
+
+class OnSearchMessage(ONDCModel):
+    catalog: Dict[str, Any] = {}
+
+
+class OnTrackMessage(ONDCModel):
+    tracking: Dict[str, Any] = {}
+
+
+class OnRatingMessage(ONDCModel):
+    feedback_ack: Optional[bool] = None
+    rating_ack: Optional[bool] = None
+
+
+class OnSupportMessage(ONDCModel):
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    uri: Optional[str] = None
+
+
+# Envelopes
+
+class ONDCRequest(ONDCModel):
+    context: ONDCContext = Field(default_factory=ONDCContext)
+    message: ONDCModel = Field(default_factory=ONDCModel)
+    error: Optional[Error] = None
+
+
+class SearchRequest(ONDCRequest):
+    message: SearchMessage = Field(default_factory=SearchMessage)
+
+
+class SelectRequest(ONDCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class InitRequest(ONDCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class ConfirmRequest(ONDCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class StatusRequest(ONDCRequest):
+    message: StatusMessage = Field(default_factory=StatusMessage)
+
+
+class TrackRequest(ONDCRequest):
+    message: TrackMessage = Field(default_factory=TrackMessage)
+
+
+class CancelRequest(ONDCRequest):
+    message: CancelMessage = Field(default_factory=CancelMessage)
+
+
+class UpdateRequest(ONDCRequest):
+    message: UpdateMessage = Field(default_factory=UpdateMessage)
+
+
+class RatingRequest(ONDCRequest):
+    message: RatingMessage = Field(default_factory=RatingMessage)
+
+
+class SupportRequest(ONDCRequest):
+    message: SupportMessage = Field(default_factory=SupportMessage)
+
+
+class OnSearchRequest(ONDCRequest):
+    message: OnSearchMessage = Field(default_factory=OnSearchMessage)
+
+
+class OnSelectRequest(ONDCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class OnInitRequest(ONDCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class OnConfirmRequest(ONDCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class OnStatusRequest(ONDCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class OnTrackRequest(ONDCRequest):
+    message: OnTrackMessage = Field(default_factory=OnTrackMessage)
+
+
+class OnCancelRequest(ONDCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class OnUpdateRequest(ONDCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class OnRatingRequest(ONDCRequest):
+    message: OnRatingMessage = Field(default_factory=OnRatingMessage)
+
+
+class OnSupportRequest(ONDCRequest):
+    message: OnSupportMessage = Field(default_factory=OnSupportMessage)
+
+
+# eKYC envelopes
+
+class EKYCRequest(ONDCRequest):
+    context: EKYCContext = Field(default_factory=EKYCContext)
+
+
+class EKYCSearchRequest(EKYCRequest):
+    message: SearchMessage = Field(default_factory=SearchMessage)
+
+
+class EKYCSelectRequest(EKYCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class EKYCInitiateRequest(EKYCRequest):
+    message: OrderMessage = Field(default_factory=OrderMessage)
+
+
+class EKYCVerifyRequest(EKYCRequest):
+    pass
+
+
+class EKYCStatusRequest(EKYCRequest):
+    message: StatusMessage = Field(default_factory=StatusMessage)
+
+
+REQUEST_MODELS: Dict[str, Type[ONDCRequest]] = {
+    "search": SearchRequest,
+    "select": SelectRequest,
+    "init": InitRequest,
+    "confirm": ConfirmRequest,
+    "status": StatusRequest,
+    "track": TrackRequest,
+    "cancel": CancelRequest,
+    "update": UpdateRequest,
+    "rating": RatingRequest,
+    "support": SupportRequest,
+    "on_search": OnSearchRequest,
+    "on_select": OnSelectRequest,
+    "on_init": OnInitRequest,
+    "on_confirm": OnConfirmRequest,
+    "on_status": OnStatusRequest,
+    "on_track": OnTrackRequest,
+    "on_cancel": OnCancelRequest,
+    "on_update": OnUpdateRequest,
+    "on_rating": OnRatingRequest,
+    "on_support": OnSupportRequest,
+}
+
+RequestModel = TypeVar("RequestModel", bound=ONDCRequest)
+
+
+async def read_raw_body(request: Request) -> bytes:
+    """Raw body bytes, reusing the copy buffered by the auth middleware when present"""
+    raw = getattr(request.state, "raw_body", None)
+    if raw is None:
+        raw = await request.body()
+        request.state.raw_body = raw
+    return raw
+
+
+async def parse_envelope(request: Request, model: Type[RequestModel]) -> RequestModel:
+    """
+    Validate the request body into model in one pass over the raw bytes.
+    The bytes stay on request.state.raw_body for digesting and audit logging, and the
+    request's Deadline (context.timestamp + ttl) is attached as request.state.deadline.
+    """
+    raw = await read_raw_body(request)
+    try:
+        envelope = model.model_validate_json(raw)
+    except ValidationError as e:
+        logger.warning(f"Invalid {model.__name__} on {request.url.path}: {e.error_count()} errors")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid {model.__name__}: {e.errors(include_url=False, include_input=False)}"
+        )
+    request.state.envelope = envelope
+    request.state.deadline = Deadline.from_context(envelope.context)
+    return envelope
+
+
+def envelope_dependency(model: Type[RequestModel]):
+    """FastAPI dependency parsing the body into model (instead of a body parameter)"""
+    async def dependency(request: Request) -> RequestModel:
+        return await parse_envelope(request, model)
+    return dependency
@@ -5,10 +5,11 @@ Handles subscriber registration and onboarding with ONDC registry
 
 import json
 import logging
-import httpx
 from datetime import datetime
 from typing import Dict, Any, Optional
 from app.core.config import settings
+from app.core.http_client import http_client
+from app.core.lookup_cache import SubscriberLookupCache
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,13 @@ class ONDCRegistryClient:
         self.subscriber_url = settings.ONDC_SUBSCRIBER_URL
         self.domain = settings.ONDC_DOMAIN
         self.callback_url = settings.ONDC_CALLBACK_URL
+        self.lookup_cache = SubscriberLookupCache(
+            self._fetch_subscriber,
+            ttl=settings.ONDC_LOOKUP_CACHE_TTL,
+            stale_ttl=settings.ONDC_LOOKUP_CACHE_STALE_TTL,
+            negative_ttl=settings.ONDC_LOOKUP_CACHE_NEGATIVE_TTL,
+            max_entries=settings.ONDC_LOOKUP_CACHE_MAX_ENTRIES,
+        )
     
     async def register_subscriber(self) -> Dict[str, Any]:
         """
@@ -41,39 +49,48 @@ class ONDCRegistryClient:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.registry_url}/subscriber",
-                    json=registration_data,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"Successfully registered subscriber: {self.subscriber_id}")
-                    return response.json()
-                else:
-                    logger.error(f"Failed to register subscriber: {response.status_code} - {response.text}")
-                    return {"error": f"Registration failed: {response.status_code}"}
+            client = http_client.get_client()
+            response = await client.post(
+                f"{self.registry_url}/subscriber",
+                json=registration_data,
+                headers={"Content-Type": "application/json"}
+            )
+            
+            if response.status_code == 200:
+                logger.info(f"Successfully registered subscriber: {self.subscriber_id}")
+                return response.json()
+            else:
+                logger.error(f"Failed to register subscriber: {response.status_code} - {response.text}")
+                return {"error": f"Registration failed: {response.status_code}"}
                     
         except Exception as e:
             logger.error(f"Error registering subscriber: {str(e)}")
             return {"error": f"Registration error: {str(e)}"}
     
-    async def lookup_subscriber(self, subscriber_id: str) -> Dict[str, Any]:
+    async def lookup_subscriber(self, subscriber_id: str, unique_key_id: Optional[str] = None) -> Dict[str, Any]:
         """
-        Lookup subscriber in ONDC registry
+        Lookup subscriber in ONDC registry (served from the lookup cache)
+        """
+        return await self.lookup_cache.get(subscriber_id, unique_key_id)
+    
+    async def _fetch_subscriber(self, subscriber_id: str, unique_key_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Fetch subscriber from ONDC registry, bypassing the cache
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.registry_url}/subscriber/{subscriber_id}"
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"Failed to lookup subscriber: {response.status_code}")
-                    return {"error": f"Lookup failed: {response.status_code}"}
+            client = http_client.get_client()
+            response = await client.get(
+                f"{self.registry_url}/subscriber/{subscriber_id}"
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                if unique_key_id and isinstance(result, list):
+                    result = [record for record in result if record.get("ukId", record.get("unique_key_id")) == unique_key_id]
+                return result
+            else:
+                logger.error(f"Failed to lookup subscriber: {response.status_code}")
+                return {"error": f"Lookup failed: {response.status_code}"}
                     
         except Exception as e:
             logger.error(f"Error looking up subscriber: {str(e)}")
@@ -90,19 +107,19 @@ class ONDCRegistryClient:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.patch(
-                    f"{self.registry_url}/subscriber/{self.subscriber_id}",
-                    json=update_data,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"Successfully updated subscriber status: {status}")
-                    return response.json()
-                else:
-                    logger.error(f"Failed to update status: {response.status_code}")
-                    return {"error": f"Update failed: {response.status_code}"}
+            client = http_client.get_client()
+            response = await client.patch(
+                f"{self.registry_url}/subscriber/{self.subscriber_id}",
+                json=update_data,
+                headers={"Content-Type": "application/json"}
+            )
+            
+            if response.status_code == 200:
+                logger.info(f"Successfully updated subscriber status: {status}")
+                return response.json()
+            else:
+                logger.error(f"Failed to update status: {response.status_code}")
+                return {"error": f"Update failed: {response.status_code}"}
                     
         except Exception as e:
             logger.error(f"Error updating subscriber status: {str(e)}")
@@ -0,0 +1,92 @@
+"""
+ONDC Response Module
+Fast JSON responses: orjson-backed default response class and precomputed ACK/NACK byte templates
+"""
+
+import json
+import logging
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Mapping, Optional, Union
+
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+else:
+    FastJSONResponse = JSONResponse
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+    loads = json.loads
+
+
+ContextLike = Union[Mapping[str, Any], BaseModel, None]
+
+ACK_MESSAGE = b'"message":{"ack":{"status":"ACK"}}'
+NACK_MESSAGE = b'"message":{"ack":{"status":"NACK"}}'
+
+# Whole bodies for replies without a context
+ACK_BODY = b"{" + ACK_MESSAGE + b"}"
+NACK_BODY = b"{" + NACK_MESSAGE + b"}"
+
+
+def _context_bytes(context: ContextLike) -> Optional[bytes]:
+    if context is None:
+        return None
+    if isinstance(context, BaseModel):
+        return context.model_dump_json(exclude_none=True).encode("utf-8")
+    return dumps(context)
+
+
+def ack_body(context: ContextLike = None) -> bytes:
+    """ACK body with only the context serialized; the rest is a constant template"""
+    context_json = _context_bytes(context)
+    if context_json is None:
+        return ACK_BODY
+    return b'{"context":' + context_json + b"," + ACK_MESSAGE + b"}"
+
+
+def nack_body(error: Mapping[str, Any], context: ContextLike = None) -> bytes:
+    """NACK body with the context and error spliced into the template"""
+    context_json = _context_bytes(context)
+    prefix = b"{" if context_json is None else b'{"context":' + context_json + b","
+    return prefix + NACK_MESSAGE + b',"error":' + dumps(error) + b"}"
+
+
+def ack_response(context: ContextLike = None, status_code: int = 200,
+                 headers: Optional[Dict[str, str]] = None) -> Response:
+    """ACK response that skips jsonable_encoder and generic JSON encoding"""
+    return Response(ack_body(context), status_code=status_code, headers=headers, media_type="application/json")
+
+
+def nack_response(error_type: str, code: str, message: str, context: ContextLike = None,
+                  status_code: int = 400, headers: Optional[Dict[str, str]] = None) -> Response:
+    """NACK response carrying an ONDC error object"""
+    error = {"type": error_type, "code": code, "message": message}
+    return Response(nack_body(error, context), status_code=status_code, headers=headers,
+                    media_type="application/json")
+
+
+async def _ndjson_lines(items: AsyncIterable[Any]) -> AsyncIterator[bytes]:
+    async for item in items:
+        yield dumps(item) + b"\n"
+
+
+def ndjson_response(items: AsyncIterable[Any], status_code: int = 200,
+                    headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """Stream items as newline-delimited JSON, one line per item as it is produced"""
+    return StreamingResponse(_ndjson_lines(items), status_code=status_code, headers=headers,
+                             media_type="application/x-ndjson")
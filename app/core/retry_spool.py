@@ -0,0 +1,425 @@
+"""
+ONDC Retry Spool Module
+Failed outbound calls kept in append-only segment files with an in-memory index, and retried with
+exponential backoff and jitter until their deadline
+"""
+
+import asyncio
+import glob
+import heapq
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.transaction_journal import GroupCommit, decode_frame, encode_frame, iter_frames
+
+logger = logging.getLogger(__name__)
+
+# Outcomes a sender reports for one attempt
+DELIVERED = "delivered"
+REJECTED = "rejected"
+RETRY = "retry"
+
+
+class SpoolEntry:
+    """Index entry of a spooled call; the body stays on disk at (segment, offset, size)"""
+
+    __slots__ = ("id", "action", "url", "destination", "transaction_id", "message_id", "expires_at",
+                 "attempts", "next_at", "segment", "offset", "size")
+
+    def __init__(self, id: int, action: str, url: str, destination: str, expires_at: float, attempts: int,
+                 next_at: float, transaction_id: Optional[str] = None, message_id: Optional[str] = None,
+                 segment: int = 0, offset: int = 0, size: int = 0):
+        self.id = id
+        self.action = action
+        self.url = url
+        self.destination = destination
+        self.transaction_id = transaction_id
+        self.message_id = message_id
+        self.expires_at = expires_at
+        self.attempts = attempts
+        self.next_at = next_at
+        self.segment = segment
+        self.offset = offset
+        self.size = size
+
+
+class RetrySpool:
+    """
+    Outbound calls that failed with a retryable error (connection error, timeout,
+    408/425/429/5xx), written as frames to numbered segment files:
+
+        spool.<segment>.seg   {"op": "put", id, ..., body} | {"op": "retry", id, attempts, next_at}
+                              | {"op": "done", id, outcome}
+
+    add() returns once the put frame is fsynced (a GroupCommit, as in the
+    transaction journal). The index holds each entry's metadata and the location
+    of its put frame, so memory does not grow with body size; bodies are read back
+    with pread when an entry is due. A heap orders entries by next attempt.
+
+    The n-th retry waits a uniformly random time up to min(max_delay, base_delay *
+    2**(n-1)) ("full jitter"), so BPPs that come back are not hit by every caller
+    at once. An entry is dropped once its next attempt would fall past its
+    deadline, or after max_attempts. At most per_destination retries run against
+    one host at a time; the rest wait in a per-host queue.
+
+    Segments roll at segment_bytes in the writer thread, so a put frame's location
+    is the one it was actually written at; after a failed write the spool moves
+    on to a new segment, as the old one may end in a partial frame. Segments are
+    deleted once no entry before them is still live. Delivery is at least once: a call whose done frame was not yet
+    written when the process stopped is sent again after restart.
+    """
+
+    def __init__(self, directory: Optional[str] = None, segment_bytes: Optional[int] = None,
+                 base_delay: Optional[float] = None, max_delay: Optional[float] = None,
+                 max_attempts: Optional[int] = None, per_destination: Optional[int] = None,
+                 commit_interval: Optional[float] = None, clock: Callable[[], float] = time.time,
+                 rng: Callable[[], float] = random.random):
+        self.directory = directory or settings.ONDC_RETRY_SPOOL_DIR
+        self.segment_bytes = segment_bytes or settings.ONDC_RETRY_SEGMENT_BYTES
+        self.base_delay = base_delay if base_delay is not None else settings.ONDC_RETRY_BASE_DELAY
+        self.max_delay = max_delay if max_delay is not None else settings.ONDC_RETRY_MAX_DELAY
+        self.max_attempts = max_attempts or settings.ONDC_RETRY_MAX_ATTEMPTS
+        self.per_destination = per_destination or settings.ONDC_RETRY_PER_DESTINATION
+        self.commit_interval = (commit_interval if commit_interval is not None
+                                else settings.ONDC_RETRY_COMMIT_INTERVAL)
+        self.clock = clock
+        self.rng = rng
+        self.sender: Optional[Callable[[SpoolEntry, bytes], Awaitable[str]]] = None
+        self._counters = {"spooled": 0, "attempts": 0, "delivered": 0, "rejected": 0, "expired": 0, "gave_up": 0,
+                          "damaged": 0, "replayed": 0, "commits": 0, "torn_tails": 0, "dropped_segments": 0}
+        self._reset()
+
+    def _reset(self) -> None:
+        """Forget all state; the next start() rebuilds it from disk, as after a restart"""
+        self._opened = False
+        self._entries: Dict[int, SpoolEntry] = {}
+        self._live: Dict[int, int] = {}  # segment -> entries whose put frame it holds
+        self._next_id = 1
+        self._file = None
+        self._file_segment = 0
+        self._file_size = 0
+        self._file_broken = False
+        self._sealed = 0  # segments before this one take no more writes
+        self._readers: Dict[int, int] = {}
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._group: Optional[GroupCommit] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._heap: List[Tuple[float, int]] = []
+        self._ready: Dict[str, Deque[SpoolEntry]] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._attempts: Set[asyncio.Task] = set()
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"spool.{number:012d}.seg")
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """(number, path) of every segment file, oldest first"""
+        found = []
+        for path in glob.glob(os.path.join(glob.escape(self.directory), "spool.*.seg")):
+            number = os.path.basename(path)[len("spool."):-len(".seg")]
+            if number.isdigit():
+                found.append((int(number), path))
+        return sorted(found)
+
+    def _open(self) -> None:
+        """Blocking: rebuild the index from the segments and start a fresh one for new frames"""
+        if self._opened:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self.segments()
+        for number, path in segments:
+            self._live.setdefault(number, 0)
+            with open(path, "rb") as f:
+                data = f.read()
+            end = 0
+            for offset, size, event in iter_frames(data):
+                self._replay(number, offset, size, event)
+                end = offset + size
+            if end < len(data):
+                self._counters["torn_tails"] += 1
+                logger.warning(f"Retry spool {path}: truncating torn tail at byte {end}")
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+
+        now = self.clock()
+        for entry in list(self._entries.values()):
+            if entry.expires_at <= now:
+                self._forget(entry)
+                self._counters["expired"] += 1
+        self._counters["replayed"] = len(self._entries)
+
+        self._file_segment = self._sealed = (segments[-1][0] + 1) if segments else 1
+        self._file_size = 0
+        self._live[self._file_segment] = 0
+        self._file = open(self._segment_path(self._file_segment), "ab")
+        self._opened = True
+        self._drop_segments()
+        if self._entries:
+            logger.info(f"Retry spool recovered {len(self._entries)} pending calls from {self.directory}")
+
+    def _replay(self, segment: int, offset: int, size: int, event: Dict[str, Any]) -> None:
+        op = event.get("op")
+        entry = self._entries.get(event.get("id"))
+        if op == "put":
+            entry = SpoolEntry(event["id"], event["action"], event["url"], event["destination"],
+                               event["expires_at"], event["attempts"], event["next_at"],
+                               event.get("transaction_id"), event.get("message_id"), segment, offset, size)
+            self._entries[entry.id] = entry
+            self._live[segment] += 1
+            self._next_id = max(self._next_id, entry.id + 1)
+        elif op == "retry" and entry is not None:
+            entry.attempts = event["attempts"]
+            entry.next_at = event["next_at"]
+        elif op == "done" and entry is not None:
+            self._forget(entry)
+
+    def start(self, sender: Optional[Callable[[SpoolEntry, bytes], Awaitable[str]]] = None) -> None:
+        """
+        Open the spool and start retrying on the running loop. sender makes one attempt
+        for an entry and its body, returning DELIVERED, REJECTED or RETRY.
+        """
+        if sender is not None:
+            self.sender = sender
+        self._open()
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        # (Re)create loop-bound state; every entry is due again at its recorded time
+        self._loop = loop
+        buffered = self._group.take() if self._group is not None else []
+        self._group = GroupCommit("Retry spool", lambda items: self._write(items), self.commit_interval,
+                                  on_written=self._committed)
+        for item in buffered:
+            self._group.add(item, durable=False)
+        self._wakeup = asyncio.Event()
+        self._ready = {}
+        self._in_flight = {}
+        self._attempts = set()
+        self._heap = [(entry.next_at, entry.id) for entry in self._entries.values()]
+        heapq.heapify(self._heap)
+        self._task = loop.create_task(self._run())
+
+    def _backoff(self, attempts: int) -> float:
+        return self.rng() * min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+    async def add(self, action: str, url: str, destination: str, body: bytes, expires_at: float,
+                  transaction_id: Optional[str] = None, message_id: Optional[str] = None) -> Optional[SpoolEntry]:
+        """
+        Spool a call whose first attempt failed; returns once it is on disk, or None
+        when its deadline leaves no time for a retry
+        """
+        if self._loop is None:
+            raise RuntimeError("Retry spool is not started")
+        next_at = self.clock() + self._backoff(1)
+        if next_at >= expires_at:
+            self._counters["expired"] += 1
+            return None
+
+        entry = SpoolEntry(self._next_id, action, url, destination, expires_at, 1, next_at,
+                           transaction_id, message_id)
+        self._next_id += 1
+        event = {"op": "put", "id": entry.id, "action": action, "url": url, "destination": destination,
+                 "transaction_id": transaction_id, "message_id": message_id, "expires_at": expires_at,
+                 "attempts": 1, "next_at": next_at, "body": body.decode("utf-8")}
+        # The writer fills in the entry's location; _committed indexes it
+        await self._group.add((encode_frame(event), entry))
+        self._counters["spooled"] += 1
+        self._schedule(entry)
+        return entry
+
+    def _append(self, event: Dict[str, Any]) -> None:
+        """Buffer a retry or done frame; it is written with the next group"""
+        self._group.add((encode_frame(event), None), durable=False)
+
+    async def commit(self) -> None:
+        """Write and fsync every buffered frame as one group"""
+        await self._group.commit()
+
+    def _write(self, items: List[Tuple[bytes, Optional[SpoolEntry]]]) -> None:
+        """Blocking: append frames, recording where each put frame lands"""
+        try:
+            for frame, entry in items:
+                if self._file_broken or (self._file_size and self._file_size + len(frame) > self.segment_bytes):
+                    self._roll()
+                if entry is not None:
+                    entry.segment, entry.offset, entry.size = self._file_segment, self._file_size, len(frame)
+                self._file.write(frame)
+                self._file_size += len(frame)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            # The segment may now end in a partial frame; later frames go to a new one
+            self._file_broken = True
+            raise
+
+    def _roll(self) -> None:
+        try:
+            if not self._file_broken:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._file.close()
+        except OSError:
+            if not self._file_broken:
+                raise
+        self._file_segment += 1
+        self._file = open(self._segment_path(self._file_segment), "ab")
+        self._file_size = 0
+        self._file_broken = False
+
+    def _committed(self, items: List[Tuple[bytes, Optional[SpoolEntry]]]) -> None:
+        """On the loop, after a group is on disk: index its puts before anything can drop their segments"""
+        self._counters["commits"] += 1
+        for number in range(self._sealed + 1, self._file_segment + 1):
+            self._live.setdefault(number, 0)
+        self._sealed = self._file_segment
+        for _, entry in items:
+            if entry is not None:
+                self._entries[entry.id] = entry
+                self._live[entry.segment] += 1
+
+    def _read(self, entry: SpoolEntry) -> bytes:
+        fd = self._readers.get(entry.segment)
+        if fd is None:
+            fd = self._readers[entry.segment] = os.open(self._segment_path(entry.segment), os.O_RDONLY)
+        return decode_frame(os.pread(fd, entry.size, entry.offset))["body"].encode("utf-8")
+
+    def _schedule(self, entry: SpoolEntry) -> None:
+        heapq.heappush(self._heap, (entry.next_at, entry.id))
+        if self._heap[0][1] == entry.id:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            now = self.clock()
+            while self._heap and self._heap[0][0] <= now:
+                next_at, entry_id = heapq.heappop(self._heap)
+                entry = self._entries.get(entry_id)
+                # Skip heap items left behind by entries that finished or were rescheduled
+                if entry is not None and entry.next_at == next_at:
+                    self._dispatch(entry)
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self, entry: SpoolEntry) -> None:
+        destination = entry.destination
+        if self._in_flight.get(destination, 0) >= self.per_destination:
+            self._ready.setdefault(destination, deque()).append(entry)
+            return
+        self._in_flight[destination] = self._in_flight.get(destination, 0) + 1
+        task = self._loop.create_task(self._attempt(entry))
+        self._attempts.add(task)
+        task.add_done_callback(self._attempts.discard)
+
+    async def _attempt(self, entry: SpoolEntry) -> None:
+        try:
+            if self.clock() >= entry.expires_at:
+                self._finish(entry, "expired")
+                return
+            try:
+                body = self._read(entry)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Retry spool entry {entry.id} ({entry.action} to {entry.url}) is unreadable: {e}")
+                self._finish(entry, "damaged")
+                return
+
+            self._counters["attempts"] += 1
+            try:
+                outcome = await self.sender(entry, body)
+            except Exception as e:
+                logger.error(f"Retry of {entry.action} to {entry.url} raised: {e!r}")
+                outcome = RETRY
+            if outcome == RETRY:
+                self._retry(entry)
+            else:
+                self._finish(entry, outcome)
+        finally:
+            self._in_flight[entry.destination] -= 1
+            waiting = self._ready.get(entry.destination)
+            if waiting:
+                self._dispatch(waiting.popleft())
+
+    def _retry(self, entry: SpoolEntry) -> None:
+        entry.attempts += 1
+        if entry.attempts >= self.max_attempts:
+            self._finish(entry, "gave_up")
+            return
+        next_at = self.clock() + self._backoff(entry.attempts)
+        if next_at >= entry.expires_at:
+            self._finish(entry, "expired")
+            return
+        entry.next_at = next_at
+        self._append({"op": "retry", "id": entry.id, "attempts": entry.attempts, "next_at": next_at})
+        self._schedule(entry)
+
+    def _finish(self, entry: SpoolEntry, outcome: str) -> None:
+        self._append({"op": "done", "id": entry.id, "outcome": outcome})
+        self._forget(entry)
+        self._counters[outcome] += 1
+        if outcome not in (DELIVERED, REJECTED):
+            logger.warning(f"Dropping spooled {entry.action} to {entry.url} (transaction {entry.transaction_id}) "
+                           f"after {entry.attempts} attempts: {outcome}")
+        self._drop_segments()
+
+    def _forget(self, entry: SpoolEntry) -> None:
+        if self._entries.pop(entry.id, None) is not None:
+            self._live[entry.segment] -= 1
+
+    def _drop_segments(self) -> None:
+        """Delete the oldest segments while they hold no live entry and take no more writes"""
+        for number in sorted(self._live):
+            if self._live[number] > 0 or number >= self._sealed:
+                return
+            del self._live[number]
+            fd = self._readers.pop(number, None)
+            if fd is not None:
+                os.close(fd)
+            try:
+                os.remove(self._segment_path(number))
+            except FileNotFoundError:
+                pass
+            self._counters["dropped_segments"] += 1
+
+    async def stop(self) -> None:
+        """Stop retrying and flush; pending entries stay on disk and are retried after the next start()"""
+        if self._loop is asyncio.get_running_loop():
+            tasks = [task for task in (self._task, *self._attempts) if task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self._group is not None:
+                await self._group.flush()
+        elif self._group is not None and len(self._group):
+            # Started on a loop that is gone; nothing can await these frames any more
+            self._write(self._group.take())
+        for fd in self._readers.values():
+            os.close(fd)
+        if self._file is not None:
+            self._file.close()
+        self._reset()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._entries),
+            "waiting_for_slot": sum(len(waiting) for waiting in self._ready.values()),
+            "in_flight": {dest: count for dest, count in self._in_flight.items() if count},
+            "segments": len(self._live),
+            **self._counters,
+        }
+
+
+# Global retry spool instance
+retry_spool = RetrySpool()
@@ -0,0 +1,187 @@
+"""
+ONDC Search Aggregator Module
+Merges on_search callbacks from many BPPs into one per-transaction result set bounded by the search ttl
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple
+
+from app.core.config import settings
+from app.core.ondc_context import Deadline, format_ondc_timestamp, parse_duration
+from app.core.timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+
+class SearchSession:
+    """
+    Results of one search (transaction_id). Providers are keyed by (bpp_id, provider id)
+    and their items merged by item id, so repeated or paginated callbacks refine the
+    result instead of duplicating it. Every accepted callback is also kept as a chunk
+    for streaming; chunks share the provider/item dicts with the merged view.
+    """
+
+    def __init__(self, transaction_id: str, ttl: float, now: float):
+        self.transaction_id = transaction_id
+        self.created_at = now
+        self.expires_at = now + ttl
+        self.bpps: Dict[str, Dict[str, Any]] = {}
+        self.providers: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.items: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        self.chunks: List[Dict[str, Any]] = []
+        self._changed = asyncio.Event()
+
+    def complete(self, now: float) -> bool:
+        return now >= self.expires_at
+
+    def merge(self, context: Mapping[str, Any], catalog: Mapping[str, Any], now: float) -> Dict[str, Any]:
+        bpp_id = str(context.get("bpp_id") or "unknown")
+        self.bpps[bpp_id] = {
+            "bpp_id": bpp_id,
+            "bpp_uri": context.get("bpp_uri"),
+            "descriptor": catalog.get("bpp/descriptor"),
+        }
+
+        providers = []
+        for provider in catalog.get("bpp/providers") or []:
+            provider_id = str(provider.get("id"))
+            key = (bpp_id, provider_id)
+            self.providers[key] = {k: v for k, v in provider.items() if k != "items"}
+            items = self.items.setdefault(key, {})
+            for item in provider.get("items") or []:
+                items[str(item.get("id"))] = item
+            providers.append({"bpp_id": bpp_id, **provider})
+
+        chunk = {
+            "bpp_id": bpp_id,
+            "bpp_uri": context.get("bpp_uri"),
+            "received_at": format_ondc_timestamp(now),
+            "providers": providers,
+        }
+        self.chunks.append(chunk)
+
+        # Wake streams waiting on this session
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        return chunk
+
+    async def wait_for_change(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        """Merged results received so far"""
+        providers = [
+            {"bpp_id": bpp_id, **provider, "items": list(self.items.get((bpp_id, provider_id), {}).values())}
+            for (bpp_id, provider_id), provider in self.providers.items()
+        ]
+        return {
+            "transaction_id": self.transaction_id,
+            "complete": self.complete(now),
+            "expires_at": format_ondc_timestamp(self.expires_at),
+            "responses": len(self.chunks),
+            "bpps": list(self.bpps.values()),
+            "provider_count": len(providers),
+            "item_count": sum(len(provider["items"]) for provider in providers),
+            "providers": providers,
+        }
+
+
+class SearchAggregator:
+    """
+    Search sessions by transaction_id. A session opens when /search is dispatched
+    (or on its first on_search), accepts callbacks until its ttl elapses and stays
+    readable for ONDC_SEARCH_RESULT_RETENTION seconds after that; a timer wheel
+    evicts it then. Late callbacks are counted and dropped.
+    """
+
+    def __init__(self, default_ttl: Optional[float] = None, retention: Optional[float] = None,
+                 max_sessions: Optional[int] = None, clock: Callable[[], float] = time.time):
+        self.default_ttl = default_ttl or settings.ONDC_SEARCH_DEFAULT_TTL
+        self.retention = retention if retention is not None else settings.ONDC_SEARCH_RESULT_RETENTION
+        self.max_sessions = max_sessions or settings.ONDC_SEARCH_MAX_SESSIONS
+        self.clock = clock
+        self._sessions: Dict[str, SearchSession] = {}
+        self._wheel = TimerWheel(tick=1.0, slots=3600, clock=clock)
+        self._counters = {"opened": 0, "callbacks": 0, "late": 0, "evicted": 0}
+
+    def _expire(self) -> None:
+        for transaction_id in self._wheel.advance():
+            if self._sessions.pop(transaction_id, None) is not None:
+                self._counters["evicted"] += 1
+
+    def open(self, transaction_id: str, ttl: Optional[str] = None,
+             deadline: Optional[Deadline] = None) -> SearchSession:
+        """
+        Start (or return) the session for a search, collecting callbacks until deadline
+        when given, else for its context.ttl (ISO 8601 duration). A session whose window
+        has closed is replaced, so a repeated search collects a fresh result set.
+        """
+        self._expire()
+        now = self.clock()
+        session = self._sessions.get(transaction_id)
+        if session is not None:
+            if not session.complete(now):
+                return session
+            del self._sessions[transaction_id]
+
+        window = deadline.remaining() if deadline is not None else parse_duration(ttl, self.default_ttl)
+        session = self._sessions[transaction_id] = SearchSession(transaction_id, window, now)
+        self._wheel.schedule(transaction_id, session.expires_at + self.retention)
+        self._counters["opened"] += 1
+        # Oldest sessions go first when over capacity
+        while len(self._sessions) > self.max_sessions:
+            oldest = next(iter(self._sessions))
+            self._wheel.cancel(oldest)
+            del self._sessions[oldest]
+            self._counters["evicted"] += 1
+        return session
+
+    def get(self, transaction_id: str) -> Optional[SearchSession]:
+        self._expire()
+        return self._sessions.get(transaction_id)
+
+    async def merge(self, context: Mapping[str, Any], catalog: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fold one on_search callback into its session; returns the new chunk, or None if late"""
+        transaction_id = context.get("transaction_id")
+        if not transaction_id:
+            return None
+        session = self.get(transaction_id) or self.open(transaction_id, context.get("ttl"))
+        now = self.clock()
+        if session.complete(now):
+            self._counters["late"] += 1
+            logger.info(f"Dropping late on_search from {context.get('bpp_id')} for {transaction_id}")
+            return None
+        self._counters["callbacks"] += 1
+        return session.merge(context, catalog, now)
+
+    def snapshot(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        session = self.get(transaction_id)
+        return None if session is None else session.snapshot(self.clock())
+
+    async def stream(self, transaction_id: str, start: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Chunks from index start, then each new one as it arrives, until the ttl elapses"""
+        session = self.get(transaction_id)
+        if session is None:
+            return
+        index = start
+        while True:
+            while index < len(session.chunks):
+                yield session.chunks[index]
+                index += 1
+            remaining = session.expires_at - self.clock()
+            if remaining <= 0:
+                return
+            await session.wait_for_change(remaining)
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire()
+        return {"sessions": len(self._sessions), **self._counters}
+
+
+# Global search aggregator instance
+search_aggregator = SearchAggregator()
@@ -0,0 +1,76 @@
+"""
+ONDC Timer Wheel Module
+Hashed timer wheel for O(1) scheduling/cancellation of many key deadlines
+"""
+
+import math
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+
+class TimerWheel:
+    """
+    Keys are hashed into slots by their deadline tick. advance() only visits the
+    slots for ticks that elapsed since the last call, so expiring costs O(1)
+    amortized per scheduled key instead of a scan over every key. Deadlines more
+    than one revolution away simply stay in their slot for further rounds.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 3600, clock: Callable[[], float] = time.time):
+        self.tick = tick
+        self.clock = clock
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._current = int(clock() / tick)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """(Re)schedule key to expire at the absolute time deadline"""
+        self.cancel(key)
+        # Never schedule into the past: due keys fire on the next advance
+        deadline_tick = max(math.ceil(deadline / self.tick), self._current + 1)
+        slot = deadline_tick % len(self._slots)
+        self._slots[slot][key] = deadline_tick
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Hashable) -> bool:
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """Scheduled deadline of key, rounded up to the wheel tick; None if not scheduled"""
+        slot = self._slot_of.get(key)
+        return None if slot is None else self._slots[slot][key] * self.tick
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Move the wheel to now and return the keys whose deadline passed"""
+        target = int((self.clock() if now is None else now) / self.tick)
+        if target <= self._current:
+            return []
+
+        # A jump of a full revolution or more visits every slot once
+        ticks = range(self._current + 1, target + 1)
+        if len(ticks) >= len(self._slots):
+            slots = range(len(self._slots))
+        else:
+            slots = (t % len(self._slots) for t in ticks)
+
+        expired = []
+        for slot in slots:
+            entries = self._slots[slot]
+            due = [key for key, deadline_tick in entries.items() if deadline_tick <= target]
+            for key in due:
+                del entries[key]
+                del self._slot_of[key]
+            expired.extend(due)
+
+        self._current = target
+        return expired
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
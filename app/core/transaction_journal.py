@@ -0,0 +1,280 @@
+"""
+ONDC Transaction Journal Module
+Append-only, length-prefixed event journal with group-commit fsync and compacted snapshots
+"""
+
+import asyncio
+import glob
+import logging
+import os
+import struct
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.ondc_responses import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Frame header: payload length and CRC32 of the payload, big-endian
+FRAME_HEADER = struct.Struct(">II")
+
+
+def encode_frame(event: Dict[str, Any]) -> bytes:
+    payload = dumps(event)
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """(offset, frame size, event) of each complete frame, stopping at the first torn or corrupt one"""
+    offset = 0
+    while offset + FRAME_HEADER.size <= len(data):
+        length, crc = FRAME_HEADER.unpack_from(data, offset)
+        start = offset + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        yield offset, FRAME_HEADER.size + length, loads(payload)
+        offset = start + length
+
+
+def read_frames(path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Decode every complete frame of a segment. Returns the events and the offset
+    just past the last valid frame; anything after it is a torn write.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    events, end = [], 0
+    for offset, size, event in iter_frames(data):
+        events.append(event)
+        end = offset + size
+    return events, end
+
+
+def decode_frame(frame: bytes) -> Dict[str, Any]:
+    """The event of one frame read back by offset; raises ValueError if it is damaged"""
+    length, crc = FRAME_HEADER.unpack_from(frame)
+    payload = frame[FRAME_HEADER.size:FRAME_HEADER.size + length]
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        raise ValueError("Damaged frame")
+    return loads(payload)
+
+
+class GroupCommit:
+    """
+    Group commit shared by the transaction journal and the retry spool. add()
+    buffers an item; a committer task hands everything buffered to write in one
+    worker-thread call, so concurrent writers share each fsync. After a successful
+    write, on_written runs on the loop before the group's waiters wake up.
+
+    lock is held around each write, so file operations such as a segment roll can
+    keep commits out.
+    """
+
+    def __init__(self, name: str, write: Callable[[List[Any]], None], interval: float = 0.0,
+                 on_written: Optional[Callable[[List[Any]], None]] = None):
+        self.name = name
+        self.write = write
+        self.interval = interval
+        self.on_written = on_written
+        self.lock = asyncio.Lock()
+        self._buffer: List[Any] = []
+        self._waiters: List[asyncio.Future] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, item: Any, durable: bool = True) -> Optional[asyncio.Future]:
+        """Buffer an item; if durable, returns a future resolved once its group is written"""
+        loop = asyncio.get_running_loop()
+        self._buffer.append(item)
+        future = None
+        if durable:
+            future = loop.create_future()
+            self._waiters.append(future)
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._committer())
+        return future
+
+    async def _committer(self) -> None:
+        while self._buffer:
+            if self.interval:
+                # Give concurrent writers a moment to join this group
+                await asyncio.sleep(self.interval)
+            await self.commit()
+
+    async def commit(self) -> None:
+        """Write everything buffered as one group"""
+        async with self.lock:
+            items, waiters = self._buffer, self._waiters
+            self._buffer, self._waiters = [], []
+            if not items:
+                return
+            try:
+                await asyncio.to_thread(self.write, items)
+            except Exception as e:
+                logger.error(f"{self.name} commit failed: {e}")
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                return
+            if self.on_written is not None:
+                self.on_written(items)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def flush(self) -> None:
+        """Wait for the committer, then write whatever is still buffered"""
+        if self._task is not None:
+            await self._task
+        await self.commit()
+
+    def take(self) -> List[Any]:
+        """Remove and return the buffered items, for a caller that writes them itself"""
+        items = self._buffer
+        self._buffer, self._waiters = [], []
+        return items
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+
+class TransactionJournal:
+    """
+    Journal of one namespace, kept as numbered segment files plus one snapshot:
+
+        <name>.<first seq>.journal   frames of {"seq", "op", ...} events
+        <name>.snapshot              JSON lines: a {"seq": S} header, then one entry per line
+
+    append() buffers frames in a GroupCommit, which writes and fsyncs everything
+    buffered in one go, so concurrent writers share each fsync and every append
+    returns only once its event is durable.
+
+    write_snapshot() rolls to a new segment, writes the snapshot atomically and
+    deletes segments whose events it covers. load() reads the snapshot and the
+    events after it, so replay cost follows the writes since the last snapshot.
+    """
+
+    def __init__(self, directory: str, name: str, commit_interval: float = 0.0):
+        self.directory = directory
+        self.name = name
+        self.commit_interval = commit_interval
+        self.seq = 0
+        self.snapshot_seq = 0
+
+        self._file = None
+        self._group = GroupCommit(f"Journal {name}", lambda frames: self._write(b"".join(frames)),
+                                  commit_interval, on_written=self._committed)
+        self._counters = {"appends": 0, "commits": 0, "bytes": 0, "replayed": 0, "snapshots": 0,
+                          "torn_tails": 0}
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}.snapshot")
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"{self.name}.{first_seq:012d}.journal")
+
+    def segments(self) -> List[Tuple[int, str]]:
+        """(first seq, path) of every segment, oldest first"""
+        found = []
+        for path in glob.glob(os.path.join(self.directory, f"{glob.escape(self.name)}.*.journal")):
+            first = os.path.basename(path)[len(self.name) + 1:-len(".journal")]
+            if first.isdigit():
+                found.append((int(first), path))
+        return sorted(found)
+
+    @property
+    def events_since_snapshot(self) -> int:
+        return self.seq - self.snapshot_seq
+
+    def load(self) -> Tuple[List[Any], List[Dict[str, Any]]]:
+        """
+        Blocking; run in a thread. Returns the snapshot entries and the journal events
+        after the snapshot, truncating a torn final frame left by a crash.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        entries: List[Any] = []
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                header = loads(f.readline())
+                entries = [loads(line) for line in f if line.strip()]
+            self.snapshot_seq = self.seq = header["seq"]
+
+        tail = []
+        for _, path in self.segments():
+            events, valid_until = read_frames(path)
+            if valid_until < os.path.getsize(path):
+                self._counters["torn_tails"] += 1
+                logger.warning(f"Journal {path}: truncating torn tail at byte {valid_until}")
+                with open(path, "r+b") as f:
+                    f.truncate(valid_until)
+            for event in events:
+                if event["seq"] > self.snapshot_seq:
+                    tail.append(event)
+                    self.seq = max(self.seq, event["seq"])
+
+        self._counters["replayed"] = len(tail)
+        # New writes always start a fresh segment
+        self._file = open(self._segment_path(self.seq + 1), "ab")
+        return entries, tail
+
+    async def append(self, event: Dict[str, Any]) -> int:
+        """Journal an event; returns its sequence number once it is fsynced"""
+        self.seq += 1
+        event["seq"] = self.seq
+        self._counters["appends"] += 1
+        await self._group.add(encode_frame(event))
+        return event["seq"]
+
+    def _committed(self, frames: List[bytes]) -> None:
+        self._counters["commits"] += 1
+        self._counters["bytes"] += sum(len(frame) for frame in frames)
+
+    async def commit(self) -> None:
+        """Write and fsync everything buffered as one group"""
+        await self._group.commit()
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def write_snapshot(self, seq: int, lines: Iterable[bytes]) -> None:
+        """
+        Persist a snapshot of the state after event seq. lines is consumed in a worker
+        thread, so it may lazily serialize the captured state.
+        """
+        async with self._group.lock:
+            # Later events go to a new segment; the old one is dropped by the next snapshot
+            self._file.close()
+            self._file = open(self._segment_path(self.seq + 1), "ab")
+
+        await asyncio.to_thread(self._write_snapshot, seq, lines)
+        self.snapshot_seq = seq
+        self._counters["snapshots"] += 1
+
+    def _write_snapshot(self, seq: int, lines: Iterable[bytes]) -> None:
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(dumps({"seq": seq}) + b"\n")
+            for line in lines:
+                f.write(line + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+        # A segment is covered when the next one starts at or before seq + 1
+        segments = self.segments()
+        for (_, path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first <= seq + 1:
+                os.remove(path)
+
+    async def close(self) -> None:
+        await self._group.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"seq": self.seq, "snapshot_seq": self.snapshot_seq, "segments": len(self.segments()),
+                **self._counters}
@@ -0,0 +1,137 @@
+"""
+ONDC Transaction Records Module
+Compact slotted records for eKYC transactions and orders, converted to the JSON dict shape only at the edge
+"""
+
+import sys
+from enum import Enum
+from typing import Any, Dict, Optional, Union
+
+from app.core.ondc_context import format_ondc_timestamp, parse_ondc_timestamp
+
+# Keys that older records use for the provider id
+PROVIDER_KEYS = ("provider", "provider_id")
+
+_TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+
+class TransactionStatus(str, Enum):
+    """Transaction and order statuses set by this BAP; other values are kept as interned strings"""
+
+    INITIATED = "INITIATED"
+    PENDING = "PENDING"
+    VERIFIED = "VERIFIED"
+    FAILED = "FAILED"
+    UPDATED = "UPDATED"
+
+
+_STATUSES = {status.value: status for status in TransactionStatus}
+
+
+def _status(value: Any) -> Union[TransactionStatus, str, None]:
+    if value is None:
+        return None
+    if isinstance(value, TransactionStatus):
+        return value
+    value = str(value)
+    return _STATUSES.get(value) or sys.intern(value)
+
+
+class TransactionRecord:
+    """
+    One transaction (eKYC session or order) in __slots__ form: epoch-millisecond int
+    timestamps, enum statuses and interned provider ids. Keys outside the fixed slots
+    go to extra, as do explicit None values and timestamps that are not in the ONDC
+    format, so from_dict(d).to_dict() == d for any record.
+
+    get() mirrors dict.get with the edge (JSON) values, so code written against the
+    dict shape (filters, sort keys, index extraction) works on records unchanged.
+    A slot holding None means the key is absent.
+    """
+
+    __slots__ = ("order_id", "status", "provider", "provider_key", "created_at", "updated_at",
+                 "verification_result", "extra")
+
+    def __init__(
+        self,
+        order_id: Optional[str] = None,
+        status: Union[TransactionStatus, str, None] = None,
+        provider: Optional[str] = None,
+        provider_key: str = "provider",
+        created_at: Optional[int] = None,
+        updated_at: Optional[int] = None,
+        verification_result: Optional[Dict[str, Any]] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ):
+        self.order_id = order_id
+        self.status = _status(status)
+        self.provider = None if provider is None else sys.intern(provider)
+        self.provider_key = provider_key
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.verification_result = verification_result
+        # None rather than {} so records without extra keys carry no dict at all
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TransactionRecord":
+        record = cls()
+        extra: Dict[str, Any] = {}
+        for key, value in data.items():
+            if key == "order_id" and isinstance(value, str):
+                record.order_id = value
+            elif key == "status" and isinstance(value, str):
+                record.status = _status(value)
+            elif key in PROVIDER_KEYS and record.provider is None and isinstance(value, str):
+                record.provider = sys.intern(value)
+                record.provider_key = "provider" if key == "provider" else "provider_id"
+            elif key in _TIMESTAMP_FIELDS and isinstance(value, str) and parse_ondc_timestamp(value) is not None:
+                setattr(record, key, parse_ondc_timestamp(value))
+            elif key == "verification_result" and isinstance(value, dict):
+                record.verification_result = value
+            else:
+                extra[key] = value
+        record.extra = extra or None
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The record in its JSON (API) shape"""
+        data: Dict[str, Any] = {}
+        if self.order_id is not None:
+            data["order_id"] = self.order_id
+        if self.status is not None:
+            data["status"] = self.status.value if isinstance(self.status, TransactionStatus) else self.status
+        if self.provider is not None:
+            data[self.provider_key] = self.provider
+        if self.created_at is not None:
+            data["created_at"] = format_ondc_timestamp.millis(self.created_at)
+        if self.updated_at is not None:
+            data["updated_at"] = format_ondc_timestamp.millis(self.updated_at)
+        if self.verification_result is not None:
+            data["verification_result"] = dict(self.verification_result)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "order_id" and self.order_id is not None:
+            return self.order_id
+        if key == "status" and self.status is not None:
+            return self.status.value if isinstance(self.status, TransactionStatus) else self.status
+        if key == self.provider_key and self.provider is not None:
+            return self.provider
+        if key in _TIMESTAMP_FIELDS and getattr(self, key) is not None:
+            return format_ondc_timestamp.millis(getattr(self, key))
+        if key == "verification_result" and self.verification_result is not None:
+            return self.verification_result
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        return default
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, TransactionRecord):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"TransactionRecord({self.to_dict()!r})"
@@ -0,0 +1,927 @@
+"""
+ONDC Transaction Store Module
+Pluggable storage for eKYC and order transactions: in-memory (optionally journaled to disk) or SQLite (WAL)
+with write-behind batching, and per-status retention
+"""
+
+import asyncio
+import base64
+import bisect
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.ondc_responses import dumps
+from app.core.timer_wheel import TimerWheel
+from app.core.transaction_journal import TransactionJournal
+from app.core.transaction_records import TransactionRecord
+
+logger = logging.getLogger(__name__)
+
+# Record fields mirrored into indexed columns
+INDEXED_FIELDS = ("order_id", "status", "provider_id", "created_at", "updated_at")
+
+# Fields with secondary indexes (value -> transaction ids) usable for lookups and counts
+SECONDARY_INDEXES = ("order_id", "status", "provider_id")
+
+
+def sort_key(record: Dict[str, Any]) -> str:
+    """Listing order key: last update, falling back to creation time"""
+    return str(record.get("updated_at") or record.get("created_at") or "")
+
+
+def provider_of(record: Dict[str, Any]) -> Optional[str]:
+    # eKYC session records use provider_id, BAP transaction records use provider
+    provider = record.get("provider_id") or record.get("provider")
+    return None if provider is None else str(provider)
+
+
+def indexed_values(record: Dict[str, Any]) -> Tuple[Optional[str], ...]:
+    """Column values for INDEXED_FIELDS; updated_at holds the listing sort key"""
+    order_id, status = record.get("order_id"), record.get("status")
+    created_at = record.get("created_at")
+    return (
+        None if order_id is None else str(order_id),
+        None if status is None else str(status),
+        provider_of(record),
+        None if created_at is None else str(created_at),
+        sort_key(record),
+    )
+
+
+def secondary_values(record: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Values of the SECONDARY_INDEXES fields for a record"""
+    order_id, status = record.get("order_id"), record.get("status")
+    return {
+        "order_id": None if order_id is None else str(order_id),
+        "status": None if status is None else str(status),
+        "provider_id": provider_of(record),
+    }
+
+
+def encode_cursor(position: Tuple[str, str]) -> str:
+    """Opaque page cursor for a (sort key, transaction_id) position"""
+    return base64.urlsafe_b64encode(json.dumps(list(position)).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, transaction_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(key, str) or not isinstance(transaction_id, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return key, transaction_id
+
+
+def matches(record: Dict[str, Any], order_id: Optional[str] = None, status: Optional[str] = None,
+            provider_id: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None) -> bool:
+    """Filter shared by the in-memory queries; since is inclusive, until exclusive"""
+    if order_id is not None and record.get("order_id") != order_id:
+        return False
+    if status is not None and record.get("status") != status:
+        return False
+    if provider_id is not None and provider_of(record) != provider_id:
+        return False
+    if since is not None or until is not None:
+        key = sort_key(record)
+        if (since is not None and key < since) or (until is not None and key >= until):
+            return False
+    return True
+
+
+class TransactionStore(ABC):
+    """
+    Async key/value store of transaction records (plain dicts) for one namespace.
+    Records are indexed by transaction_id, order_id, status and updated_at.
+
+    Every write (re)arms the record's expiry from the retention for its status
+    (TRANSACTION_RETENTION, "*" as fallback); expired records are dropped, or
+    archived when their status is in TRANSACTION_ARCHIVE_STATUSES.
+    """
+
+    def __init__(self, namespace: str, retention: Optional[Dict[str, float]] = None,
+                 archive_statuses: Optional[List[str]] = None):
+        self.namespace = namespace
+        self.retention = retention if retention is not None else settings.TRANSACTION_RETENTION
+        self.archive_statuses = set(archive_statuses if archive_statuses is not None
+                                    else settings.TRANSACTION_ARCHIVE_STATUSES)
+        self._counters = {"reads": 0, "writes": 0, "expired": 0, "archived": 0}
+        # transaction_id -> [lock, users] while updates of that transaction are running
+        self._update_locks: Dict[str, List[Any]] = {}
+
+    def retention_for(self, status: Optional[str]) -> Optional[float]:
+        """Seconds a record with this status is kept; None keeps it forever"""
+        seconds = self.retention.get(status) if status is not None else None
+        if seconds is None:
+            seconds = self.retention.get("*")
+        return seconds if seconds and seconds > 0 else None
+
+    def expires_at_for(self, record: Dict[str, Any], now: Optional[float] = None) -> Optional[float]:
+        seconds = self.retention_for(record.get("status"))
+        return None if seconds is None else (time.time() if now is None else now) + seconds
+
+    @abstractmethod
+    async def get(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the record, or None"""
+
+    @abstractmethod
+    async def put(self, transaction_id: str, record: Dict[str, Any]) -> None:
+        """Insert or replace a record"""
+
+    @abstractmethod
+    async def delete(self, transaction_id: str) -> bool:
+        """Remove a record; returns True when it existed"""
+
+    @abstractmethod
+    async def find(self, order_id: Optional[str] = None, status: Optional[str] = None,
+                   limit: Optional[int] = None, provider_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Records matching the given index values, most recently updated first"""
+
+    @abstractmethod
+    async def counts(self, field: str) -> Dict[str, int]:
+        """Number of records per value of a SECONDARY_INDEXES field"""
+
+    async def get_by_order(self, order_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(transaction_id, record) of the latest transaction for an order, via the order_id index"""
+        found = await self.find(order_id=order_id, limit=1)
+        return next(iter(found.items()), None)
+
+    async def resolve(self, transaction_id: Optional[str] = None,
+                      order_id: Optional[str] = None) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Look a transaction up by its id, falling back to the order id when only that is known"""
+        if transaction_id:
+            record = await self.get(transaction_id)
+            if record is not None:
+                return transaction_id, record
+        if order_id:
+            return await self.get_by_order(order_id)
+        return None
+
+    @abstractmethod
+    async def count(self) -> int:
+        """Number of records"""
+
+    async def update(self, transaction_id: str, default: Optional[Dict[str, Any]] = None,
+                     **fields: Any) -> Optional[Dict[str, Any]]:
+        """
+        Merge fields into an existing record; returns the new record or None if missing.
+        With default, a missing record is created from it (upsert). Updates of one
+        transaction run one at a time, so concurrent merges are not lost.
+        """
+        entry = self._update_locks.setdefault(transaction_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                record = await self.get(transaction_id)
+                if record is None:
+                    if default is None:
+                        return None
+                    record = dict(default)
+                record.update(fields)
+                await self.put(transaction_id, record)
+                return record
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._update_locks[transaction_id]
+
+    async def contains(self, transaction_id: str) -> bool:
+        return await self.get(transaction_id) is not None
+
+    async def all(self, limit: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """All records, most recently updated first"""
+        return await self.find(limit=limit)
+
+    @abstractmethod
+    async def page(self, limit: int, cursor: Optional[str] = None, status: Optional[str] = None,
+                   provider_id: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+        """
+        One page of records, most recently updated first, after the position in cursor.
+        Returns the page and the cursor for the next one (None on the last page).
+        since/until bound updated_at (inclusive/exclusive, ONDC timestamp strings).
+        """
+
+    async def iter_records(self, batch_size: Optional[int] = None, cursor: Optional[str] = None,
+                           **filters: Any) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Stream (transaction_id, record) pairs page by page; memory stays at one page"""
+        while True:
+            records, cursor = await self.page(batch_size or settings.TRANSACTION_PAGE_SIZE, cursor, **filters)
+            for item in records.items():
+                yield item
+            if cursor is None:
+                return
+
+    @staticmethod
+    def _page_result(rows: List[Tuple[str, str, Dict[str, Any]]],
+                     limit: int) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+        """Build (page, next cursor) from up to limit + 1 (sort key, transaction_id, record) rows"""
+        next_cursor = encode_cursor(rows[limit - 1][:2]) if len(rows) > limit else None
+        return {transaction_id: record for _, transaction_id, record in rows[:limit]}, next_cursor
+
+    async def start(self) -> None:
+        """Open resources; stores also open lazily on first use"""
+
+    async def close(self) -> None:
+        """Flush pending writes and release resources"""
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters only; record counts come from count(), which may read from disk"""
+        return {"namespace": self.namespace, "backend": self.backend, **self._counters}
+
+    @property
+    @abstractmethod
+    def backend(self) -> str:
+        """Backend name for stats"""
+
+
+class InMemoryTransactionStore(TransactionStore):
+    """
+    Per-process dict store (single worker, lost on restart).
+    Expiry runs on a timer wheel advanced on every access, so memory stays bounded
+    by the retention windows without periodic full scans. There is no archive tier:
+    archive-status records are dropped here too.
+
+    Secondary indexes (order_id, status, provider_id -> transaction ids) are updated
+    on every put/delete/expiry, so filtered queries only touch matching records.
+    A sorted (sort key, transaction_id) list lets unfiltered pages bisect to the cursor.
+    Records are held as slotted TransactionRecords and turned back into dicts on read.
+    """
+
+    backend = "memory"
+
+    def __init__(self, namespace: str, retention: Optional[Dict[str, float]] = None,
+                 archive_statuses: Optional[List[str]] = None, clock: Callable[[], float] = time.time):
+        super().__init__(namespace, retention, archive_statuses)
+        self.clock = clock
+        self._records: Dict[str, TransactionRecord] = {}
+        self._indexes: Dict[str, Dict[str, Set[str]]] = {field: {} for field in SECONDARY_INDEXES}
+        self._order: List[Tuple[str, str]] = []
+        self._wheel = TimerWheel(tick=settings.TRANSACTION_RETENTION_TICK,
+                                 slots=settings.TRANSACTION_RETENTION_SLOTS, clock=clock)
+
+    def _index(self, transaction_id: str, record: TransactionRecord) -> None:
+        for field, value in secondary_values(record).items():
+            if value is not None:
+                self._indexes[field].setdefault(value, set()).add(transaction_id)
+        bisect.insort(self._order, (sort_key(record), transaction_id))
+
+    def _unindex(self, transaction_id: str, record: TransactionRecord) -> None:
+        for field, value in secondary_values(record).items():
+            ids = self._indexes[field].get(value)
+            if ids is not None:
+                ids.discard(transaction_id)
+                if not ids:
+                    del self._indexes[field][value]
+        position = bisect.bisect_left(self._order, (sort_key(record), transaction_id))
+        if position < len(self._order) and self._order[position][1] == transaction_id:
+            del self._order[position]
+
+    def _remove(self, transaction_id: str) -> bool:
+        record = self._records.pop(transaction_id, None)
+        if record is None:
+            return False
+        self._unindex(transaction_id, record)
+        return True
+
+    def _candidates(self, **values: Optional[str]) -> Iterable[Tuple[str, TransactionRecord]]:
+        """Records narrowed through the smallest matching secondary index (all records if none given)"""
+        sets = [self._indexes[field].get(value, set()) for field, value in values.items() if value is not None]
+        if not sets:
+            return self._records.items()
+        ids = min(sets, key=len)
+        return ((key, self._records[key]) for key in ids)
+
+    def _expire(self) -> None:
+        for transaction_id in self._wheel.advance():
+            if self._remove(transaction_id):
+                self._counters["expired"] += 1
+
+    async def get(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        self._expire()
+        self._counters["reads"] += 1
+        record = self._records.get(transaction_id)
+        return record.to_dict() if record is not None else None
+
+    def _store(self, transaction_id: str, record: Dict[str, Any], expires_at: Optional[float]) -> None:
+        self._remove(transaction_id)
+        compact = self._records[transaction_id] = TransactionRecord.from_dict(record)
+        self._index(transaction_id, compact)
+        if expires_at is None:
+            self._wheel.cancel(transaction_id)
+        else:
+            self._wheel.schedule(transaction_id, expires_at)
+
+    async def put(self, transaction_id: str, record: Dict[str, Any]) -> None:
+        self._expire()
+        self._counters["writes"] += 1
+        self._store(transaction_id, record, self.expires_at_for(record, self.clock()))
+
+    async def delete(self, transaction_id: str) -> bool:
+        self._counters["writes"] += 1
+        self._wheel.cancel(transaction_id)
+        return self._remove(transaction_id)
+
+    async def find(self, order_id: Optional[str] = None, status: Optional[str] = None,
+                   limit: Optional[int] = None, provider_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        self._expire()
+        self._counters["reads"] += 1
+        found = [
+            (key, record) for key, record in self._candidates(order_id=order_id, status=status, provider_id=provider_id)
+            if matches(record, order_id=order_id, status=status, provider_id=provider_id)
+        ]
+        found.sort(key=lambda item: sort_key(item[1]), reverse=True)
+        if limit is not None:
+            found = found[:limit]
+        return {key: record.to_dict() for key, record in found}
+
+    async def page(self, limit: int, cursor: Optional[str] = None, status: Optional[str] = None,
+                   provider_id: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        self._expire()
+        self._counters["reads"] += 1
+        if status is None and provider_id is None:
+            # Seek in the sorted index: since/until/cursor are bounds, the page is the slice below them
+            low = bisect.bisect_left(self._order, (since, "")) if since is not None else 0
+            high = len(self._order)
+            if until is not None:
+                high = bisect.bisect_left(self._order, (until, ""))
+            if after is not None:
+                high = min(high, bisect.bisect_left(self._order, after))
+            positions = self._order[max(low, high - limit - 1):high]
+            positions.reverse()
+            return self._page_result([(k, t, self._records[t].to_dict()) for k, t in positions], limit)
+        candidates = (
+            (sort_key(record), key, record)
+            for key, record in self._candidates(status=status, provider_id=provider_id)
+            if matches(record, status=status, provider_id=provider_id, since=since, until=until)
+        )
+        if after is not None:
+            candidates = (c for c in candidates if c[:2] < after)
+        # Keep only limit + 1 rows instead of sorting everything
+        rows = heapq.nlargest(limit + 1, candidates, key=lambda c: c[:2])
+        return self._page_result([(k, t, r.to_dict()) for k, t, r in rows], limit)
+
+    async def counts(self, field: str) -> Dict[str, int]:
+        self._expire()
+        return {value: len(ids) for value, ids in self._indexes[field].items()}
+
+    async def count(self) -> int:
+        self._expire()
+        return len(self._records)
+
+
+class JournaledTransactionStore(InMemoryTransactionStore):
+    """
+    In-memory store whose every state change (put/delete) is appended to a
+    TransactionJournal before the call returns, with fsyncs shared by concurrent
+    writers. Every TRANSACTION_JOURNAL_SNAPSHOT_EVERY events the live records are
+    written as a compacted snapshot; loading reads the snapshot and replays only
+    the journal tail after it. Loads lazily on first use when start() was not called.
+    """
+
+    backend = "journal"
+
+    def __init__(self, namespace: str, directory: Optional[str] = None,
+                 retention: Optional[Dict[str, float]] = None, archive_statuses: Optional[List[str]] = None,
+                 clock: Callable[[], float] = time.time, commit_interval: Optional[float] = None,
+                 snapshot_every: Optional[int] = None):
+        super().__init__(namespace, retention, archive_statuses, clock)
+        self.journal = TransactionJournal(
+            directory or settings.TRANSACTION_JOURNAL_DIR, namespace,
+            commit_interval if commit_interval is not None else settings.TRANSACTION_JOURNAL_COMMIT_INTERVAL,
+        )
+        self.snapshot_every = snapshot_every or settings.TRANSACTION_JOURNAL_SNAPSHOT_EVERY
+        # Highest journal seq reflected in memory; appends still waiting for their fsync are above it
+        self._applied_seq = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._snapshot_task: Optional[asyncio.Task] = None
+
+    async def _load(self) -> None:
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            entries, tail = await asyncio.to_thread(self.journal.load)
+            for transaction_id, record, expires_at in entries:
+                self._store(transaction_id, record, expires_at)
+            for event in tail:
+                if event["op"] == "put":
+                    # Expiry counts from the original write, not from the replay
+                    self._store(event["id"], event["record"], self.expires_at_for(event["record"], event["at"]))
+                else:
+                    self._wheel.cancel(event["id"])
+                    self._remove(event["id"])
+            self._applied_seq = self.journal.seq
+            self._loaded = True
+        logger.info(f"Transaction store '{self.namespace}' loaded {len(entries)} snapshot records "
+                    f"and replayed {len(tail)} journal events")
+
+    async def start(self) -> None:
+        await self._load()
+
+    async def get(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        await self._load()
+        return await super().get(transaction_id)
+
+    async def put(self, transaction_id: str, record: Dict[str, Any]) -> None:
+        await self._load()
+        # Journal first: a failed append leaves the in-memory state untouched
+        record = dict(record)
+        seq = await self.journal.append({"op": "put", "id": transaction_id, "record": record, "at": self.clock()})
+        await super().put(transaction_id, record)
+        self._applied(seq)
+
+    async def delete(self, transaction_id: str) -> bool:
+        await self._load()
+        self._expire()
+        if transaction_id not in self._records:
+            return False
+        seq = await self.journal.append({"op": "delete", "id": transaction_id, "at": self.clock()})
+        await super().delete(transaction_id)
+        self._applied(seq)
+        return True
+
+    async def find(self, order_id: Optional[str] = None, status: Optional[str] = None,
+                   limit: Optional[int] = None, provider_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        await self._load()
+        return await super().find(order_id, status, limit, provider_id)
+
+    async def page(self, limit: int, cursor: Optional[str] = None, status: Optional[str] = None,
+                   provider_id: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+        await self._load()
+        return await super().page(limit, cursor, status, provider_id, since, until)
+
+    async def counts(self, field: str) -> Dict[str, int]:
+        await self._load()
+        return await super().counts(field)
+
+    async def count(self) -> int:
+        await self._load()
+        return await super().count()
+
+    def _applied(self, seq: int) -> None:
+        # Group commits resolve their waiters in seq order and nothing awaits between
+        # the fsync and the in-memory change, so events are applied in seq order
+        self._applied_seq = max(self._applied_seq, seq)
+        self._maybe_snapshot()
+
+    def _maybe_snapshot(self) -> None:
+        if self.journal.events_since_snapshot >= self.snapshot_every and (
+                self._snapshot_task is None or self._snapshot_task.done()):
+            self._snapshot_task = asyncio.create_task(self.snapshot())
+
+    async def snapshot(self) -> None:
+        """Write the live records as a snapshot covering every journal event applied so far"""
+        # Records are replaced, never mutated, on write, so capturing references is a consistent copy.
+        # Events journaled but not yet applied (their fsync is still running) stay in the tail.
+        seq = self._applied_seq
+        captured = [(key, record, self._wheel.deadline(key)) for key, record in self._records.items()]
+        lines = (dumps([key, record.to_dict(), deadline]) for key, record, deadline in captured)
+        await self.journal.write_snapshot(seq, lines)
+
+    async def close(self) -> None:
+        if self._snapshot_task is not None:
+            await self._snapshot_task
+        if self._loaded and self.journal.events_since_snapshot:
+            # Leave a fresh snapshot so the next start replays nothing
+            await self.snapshot()
+        await self.journal.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "journal": self.journal.stats()}
+
+
+class SQLiteTransactionStore(TransactionStore):
+    """
+    SQLite store in WAL mode, shared by every worker process using the same file.
+    Writes are buffered (latest value per key wins) and committed in one batch every
+    flush_interval seconds or once batch_size records are pending. Reads check the
+    pending buffer first, so a worker always sees its own writes; other workers see
+    them after the next flush.
+
+    Each row carries an indexed expires_at. Reads ignore expired rows, and every
+    flush (at least once per TRANSACTION_RETENTION_TICK while in use) moves expired
+    archive-status rows to transactions_archive and deletes the rest with an index
+    range query, so no worker ever scans the whole table.
+    """
+
+    backend = "sqlite"
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transactions (
+            namespace TEXT NOT NULL,
+            transaction_id TEXT NOT NULL,
+            order_id TEXT,
+            status TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            data TEXT NOT NULL,
+            expires_at REAL,
+            provider_id TEXT,
+            PRIMARY KEY (namespace, transaction_id)
+        );
+        CREATE TABLE IF NOT EXISTS transactions_archive (
+            namespace TEXT NOT NULL,
+            transaction_id TEXT NOT NULL,
+            order_id TEXT,
+            status TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            data TEXT NOT NULL,
+            archived_at REAL NOT NULL,
+            PRIMARY KEY (namespace, transaction_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_transactions_order_id ON transactions (namespace, order_id);
+        CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions (namespace, status);
+        CREATE INDEX IF NOT EXISTS idx_transactions_updated_at ON transactions (namespace, updated_at);
+    """
+
+    # Columns added after the first release, migrated into existing files on open
+    _ADDED_COLUMNS = {"expires_at": "REAL", "provider_id": "TEXT"}
+
+    _INDEXES = """
+        CREATE INDEX IF NOT EXISTS idx_transactions_expires_at ON transactions (namespace, expires_at);
+        CREATE INDEX IF NOT EXISTS idx_transactions_provider_id ON transactions (namespace, provider_id);
+        CREATE INDEX IF NOT EXISTS idx_transactions_page ON transactions (namespace, updated_at, transaction_id);
+    """
+
+    _LIVE = "(expires_at IS NULL OR expires_at > ?)"
+
+    _UPSERT = (
+        "INSERT OR REPLACE INTO transactions "
+        "(namespace, transaction_id, order_id, status, provider_id, created_at, updated_at, data, expires_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+    # Pending-buffer marker for a delete not yet flushed
+    _DELETED = object()
+
+    def __init__(self, namespace: str, path: Optional[str] = None,
+                 flush_interval: Optional[float] = None, batch_size: Optional[int] = None,
+                 retention: Optional[Dict[str, float]] = None, archive_statuses: Optional[List[str]] = None):
+        super().__init__(namespace, retention, archive_statuses)
+        self.path = path or settings.TRANSACTION_STORE_PATH
+        self.flush_interval = flush_interval if flush_interval is not None else settings.TRANSACTION_STORE_FLUSH_INTERVAL
+        self.batch_size = batch_size or settings.TRANSACTION_STORE_BATCH_SIZE
+        self.sweep_interval = settings.TRANSACTION_RETENTION_TICK
+
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        # transaction_id -> (record, expires_at) or _DELETED
+        self._pending: Dict[str, Any] = {}
+        self._flushing: Dict[str, Any] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._next_sweep = 0.0
+        self._counters.update({"flushes": 0, "flushed_rows": 0, "flush_errors": 0})
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _open(self) -> None:
+        if self._reader is not None:
+            return
+        with self._open_lock:
+            if self._reader is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._writer = self._connect()
+            self._writer.executescript(self._SCHEMA)
+            columns = {row[1] for row in self._writer.execute("PRAGMA table_info(transactions)")}
+            for column, column_type in self._ADDED_COLUMNS.items():
+                if column not in columns:
+                    self._writer.execute(f"ALTER TABLE transactions ADD COLUMN {column} {column_type}")
+            self._writer.executescript(self._INDEXES)
+            self._reader = self._connect()
+        logger.info(f"Transaction store '{self.namespace}' opened at {self.path}")
+
+    async def start(self) -> None:
+        self._open()
+        # Sweep rows that expired while no worker was running
+        self._next_sweep = 0.0
+        await self.flush()
+
+    async def get(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        self._counters["reads"] += 1
+        now = time.time()
+        self._maybe_sweep(now)
+        pending = self._pending.get(transaction_id, self._flushing.get(transaction_id))
+        if pending is self._DELETED:
+            return None
+        if pending is not None:
+            record, expires_at = pending
+            return dict(record) if expires_at is None or expires_at > now else None
+
+        # Indexed point lookup on the read connection; WAL readers never wait for the writer
+        rows = await asyncio.to_thread(
+            self._fetch,
+            f"SELECT data FROM transactions WHERE namespace = ? AND transaction_id = ? AND {self._LIVE}",
+            (self.namespace, transaction_id, now), lambda row: json.loads(row[0]),
+        )
+        return rows[0] if rows else None
+
+    async def put(self, transaction_id: str, record: Dict[str, Any]) -> None:
+        self._counters["writes"] += 1
+        self._pending[transaction_id] = (dict(record), self.expires_at_for(record))
+        self._schedule_flush()
+
+    async def delete(self, transaction_id: str) -> bool:
+        existed = await self.get(transaction_id) is not None
+        self._counters["writes"] += 1
+        self._pending[transaction_id] = self._DELETED
+        self._schedule_flush()
+        return existed
+
+    async def find(self, order_id: Optional[str] = None, status: Optional[str] = None,
+                   limit: Optional[int] = None, provider_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        # Queries run against the table, so push our own pending writes first
+        await self.flush()
+        self._counters["reads"] += 1
+
+        query = f"SELECT transaction_id, data FROM transactions WHERE namespace = ? AND {self._LIVE}"
+        params: List[Any] = [self.namespace, time.time()]
+        for column, value in (("order_id", order_id), ("status", status), ("provider_id", provider_id)):
+            if value is not None:
+                query += f" AND {column} = ?"
+                params.append(value)
+        query += " ORDER BY updated_at DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        rows = await asyncio.to_thread(self._fetch, query, params, lambda row: (row[0], json.loads(row[1])))
+        return dict(rows)
+
+    async def page(self, limit: int, cursor: Optional[str] = None, status: Optional[str] = None,
+                   provider_id: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        await self.flush()
+        self._counters["reads"] += 1
+
+        # Keyset pagination: each page is an index range scan from the previous position
+        query = f"SELECT updated_at, transaction_id, data FROM transactions WHERE namespace = ? AND {self._LIVE}"
+        params: List[Any] = [self.namespace, time.time()]
+        for clause, value in (("status = ?", status), ("provider_id = ?", provider_id),
+                              ("updated_at >= ?", since), ("updated_at < ?", until)):
+            if value is not None:
+                query += f" AND {clause}"
+                params.append(value)
+        if after is not None:
+            query += " AND (updated_at, transaction_id) < (?, ?)"
+            params.extend(after)
+        query += " ORDER BY updated_at DESC, transaction_id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = await asyncio.to_thread(self._fetch, query, params,
+                                       lambda row: (row[0], row[1], json.loads(row[2])))
+        return self._page_result(rows, limit)
+
+    async def counts(self, field: str) -> Dict[str, int]:
+        if field not in SECONDARY_INDEXES:
+            raise KeyError(field)
+        await self.flush()
+        # Grouped over the (namespace, field) index
+        rows = await asyncio.to_thread(
+            self._fetch,
+            f"SELECT {field}, COUNT(*) FROM transactions WHERE namespace = ? AND {self._LIVE} "
+            f"AND {field} IS NOT NULL GROUP BY {field}",
+            (self.namespace, time.time()),
+        )
+        return dict(rows)
+
+    async def count(self) -> int:
+        await self.flush()
+        rows = await asyncio.to_thread(
+            self._fetch,
+            f"SELECT COUNT(*) FROM transactions WHERE namespace = ? AND {self._LIVE}",
+            (self.namespace, time.time()),
+        )
+        return rows[0][0]
+
+    def _fetch(self, query: str, params: Iterable[Any],
+               convert: Optional[Callable[[Tuple[Any, ...]], Any]] = None) -> List[Any]:
+        """Run a read on the reader connection; called from a worker thread so the loop never waits on disk"""
+        self._open()
+        with self._read_lock:
+            rows = self._reader.execute(query, params).fetchall()
+        return rows if convert is None else [convert(row) for row in rows]
+
+    async def update(self, transaction_id: str, default: Optional[Dict[str, Any]] = None,
+                     **fields: Any) -> Optional[Dict[str, Any]]:
+        """Merge fields into a record atomically (no lost updates between workers); default upserts"""
+        pending = self._pending.get(transaction_id, self._flushing.get(transaction_id))
+        if pending is not None:
+            # Merged into the newer buffered value without an await, so updates in this worker cannot interleave
+            record = None
+            if pending is not self._DELETED:
+                record, expires_at = pending
+                if expires_at is not None and expires_at <= time.time():
+                    record = None
+            if record is None:
+                if default is None:
+                    return None
+                record = default
+            record = {**record, **fields}
+            await self.put(transaction_id, record)
+            return dict(record)
+        self._counters["writes"] += 1
+        return await asyncio.to_thread(self._update_row, transaction_id, fields, default)
+
+    def _update_row(self, transaction_id: str, fields: Dict[str, Any],
+                    default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Read, merge and write one row in a single write transaction"""
+        now = time.time()
+        with self._write_lock:
+            self._open()
+            try:
+                self._writer.execute("BEGIN IMMEDIATE")
+                row = self._writer.execute(
+                    f"SELECT data FROM transactions WHERE namespace = ? AND transaction_id = ? AND {self._LIVE}",
+                    (self.namespace, transaction_id, now),
+                ).fetchone()
+                if row is None and default is None:
+                    self._writer.execute("COMMIT")
+                    return None
+                record = {**(json.loads(row[0]) if row is not None else default), **fields}
+                self._writer.execute(
+                    self._UPSERT,
+                    (self.namespace, transaction_id, *indexed_values(record), json.dumps(record, default=str),
+                     self.expires_at_for(record, now)),
+                )
+                self._writer.execute("COMMIT")
+            except Exception as e:
+                self._rollback()
+                logger.error(f"Transaction store '{self.namespace}' update of {transaction_id} failed: {e}")
+                raise
+        return record
+
+    def _rollback(self) -> None:
+        # BEGIN itself may have failed (e.g. database locked), leaving nothing to roll back
+        if self._writer.in_transaction:
+            self._writer.execute("ROLLBACK")
+
+    def _maybe_sweep(self, now: float) -> None:
+        # A flush already under way (or scheduled) sweeps too; reads must not pile up tasks behind it
+        if now >= self._next_sweep and (self._flush_task is None or self._flush_task.done()):
+            self._start_flush(delay=0.0)
+
+    def _schedule_flush(self) -> None:
+        if len(self._pending) >= self.batch_size or self.flush_interval <= 0:
+            self._start_flush(delay=0.0)
+        elif self._flush_task is None or self._flush_task.done():
+            self._start_flush(delay=self.flush_interval)
+
+    def _start_flush(self, delay: float) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_batch(self._take_pending())
+            return
+        if delay == 0.0 or self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._delayed_flush(delay))
+
+    async def _delayed_flush(self, delay: float) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        await self.flush()
+
+    def _take_pending(self) -> Dict[str, Any]:
+        batch, self._pending = self._pending, {}
+        return batch
+
+    async def flush(self) -> None:
+        """Commit all pending writes (and sweep expired rows when due) in one transaction"""
+        # Serialized so batches reach the database in the order they were taken
+        async with self._flush_lock:
+            if not self._pending and time.time() < self._next_sweep:
+                return
+            batch = self._flushing = self._take_pending()
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception:
+                # Put unflushed writes back unless newer values arrived meanwhile
+                for key, value in batch.items():
+                    self._pending.setdefault(key, value)
+                raise
+            finally:
+                self._flushing = {}
+
+    def _write_batch(self, batch: Dict[str, Any]) -> None:
+        now = time.time()
+        upserts = []
+        deletes = []
+        for transaction_id, entry in batch.items():
+            if entry is self._DELETED:
+                deletes.append((self.namespace, transaction_id))
+                continue
+            record, expires_at = entry
+            upserts.append((
+                self.namespace, transaction_id,
+                *indexed_values(record),
+                json.dumps(record, default=str),
+                expires_at,
+            ))
+        sweep = now >= self._next_sweep
+
+        with self._write_lock:
+            self._open()
+            try:
+                self._writer.execute("BEGIN IMMEDIATE")
+                if upserts:
+                    self._writer.executemany(self._UPSERT, upserts)
+                if deletes:
+                    self._writer.executemany(
+                        "DELETE FROM transactions WHERE namespace = ? AND transaction_id = ?", deletes
+                    )
+                archived = expired = 0
+                if sweep:
+                    archived, expired = self._sweep(now)
+                self._writer.execute("COMMIT")
+            except Exception as e:
+                self._rollback()
+                self._counters["flush_errors"] += 1
+                logger.error(f"Transaction store '{self.namespace}' flush failed: {e}")
+                raise
+
+        if sweep:
+            self._next_sweep = now + self.sweep_interval
+            self._counters["archived"] += archived
+            self._counters["expired"] += expired
+        if batch:
+            self._counters["flushes"] += 1
+            self._counters["flushed_rows"] += len(batch)
+
+    def _sweep(self, now: float) -> Tuple[int, int]:
+        """Archive/delete expired rows via the expires_at index; returns (archived, expired)"""
+        archived = 0
+        if self.archive_statuses:
+            placeholders = ",".join("?" * len(self.archive_statuses))
+            archived = self._writer.execute(
+                "INSERT OR REPLACE INTO transactions_archive "
+                "(namespace, transaction_id, order_id, status, created_at, updated_at, data, archived_at) "
+                "SELECT namespace, transaction_id, order_id, status, created_at, updated_at, data, ? "
+                f"FROM transactions WHERE namespace = ? AND expires_at <= ? AND status IN ({placeholders})",
+                (now, self.namespace, now, *sorted(self.archive_statuses)),
+            ).rowcount
+        removed = self._writer.execute(
+            "DELETE FROM transactions WHERE namespace = ? AND expires_at <= ?", (self.namespace, now)
+        ).rowcount
+        return archived, removed - archived
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        for conn in (self._reader, self._writer):
+            if conn is not None:
+                conn.close()
+        self._reader = self._writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "pending": len(self._pending), "path": self.path}
+
+
+def create_transaction_store(namespace: str, backend: Optional[str] = None,
+                             retention: Optional[Dict[str, float]] = None) -> TransactionStore:
+    """Build the configured backend (TRANSACTION_STORE_BACKEND) for a namespace"""
+    backend = (backend or settings.TRANSACTION_STORE_BACKEND).lower()
+    if backend == "sqlite":
+        return SQLiteTransactionStore(namespace, retention=retention)
+    if backend == "memory":
+        return InMemoryTransactionStore(namespace, retention=retention)
+    if backend == "journal":
+        return JournaledTransactionStore(namespace, retention=retention)
+    raise ValueError(f"Unknown transaction store backend: {backend}")
+
+
+# Global transaction store instances
+ekyc_store = create_transaction_store("ekyc")
+ekyc_session_store = create_transaction_store("ekyc_sessions")
+order_store = create_transaction_store("orders")
+flow_store = create_transaction_store("flows", retention=settings.FLOW_STATE_RETENTION)
+
+transaction_stores = [ekyc_store, ekyc_session_store, order_store, flow_store]
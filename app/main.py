@@ -3,14 +3,44 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from app.api.routes import api_router
+from app.core.catalog_sync import catalog_sync
 from app.core.config import settings
+from app.core.http_client import http_client
+from app.core.logging_config import log_writer
+from app.core.ondc_auth import ONDCAuthMiddleware
+from app.core.ondc_crypto import keyring
+from app.core.ondc_dispatcher import dispatcher
+from app.core.ondc_responses import FastJSONResponse
+from app.core.transaction_store import transaction_stores
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    yield
+    log_writer.start()
+    await http_client.start()
+    await dispatcher.start()
+    await catalog_sync.start()
+    await keyring.start_watching()
+    for store in transaction_stores:
+        await store.start()
+    try:
+        yield
+    finally:
+        for store in transaction_stores:
+            await store.close()
+        await keyring.stop_watching()
+        await catalog_sync.stop()
+        await dispatcher.stop()
+        await http_client.close()
+        log_writer.stop()
 
 
-app = FastAPI(title=settings.APP_NAME, version=settings.VERSION, lifespan=lifespan)
+app = FastAPI(
+    title=settings.APP_NAME,
+    version=settings.VERSION,
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+app.add_middleware(ONDCAuthMiddleware)
 app.include_router(api_router)
 
@@ -10,11 +10,6 @@ import time
 import uuid
 import base64
 from datetime import datetime, timezone
-from nacl.signing import SigningKey
-
-def crypto_sign_ed25519_sk_to_seed(sk):
-    """Convert Ed25519 private key to seed"""
-    return sk[:32]
 
 class CompleteONDCTester:
     def __init__(self):
@@ -37,40 +32,26 @@ class CompleteONDCTester:
         self.load_keys()
         
     def load_keys(self):
-        """Load cryptographic keys"""
-        try:
-            with open('secrets/ondc_credentials.json', 'r') as f:
-                creds = json.load(f)
-            
-            # Load signing key
-            private_key_b64 = creds['signing_keys']['private_key']
-            private_key_bytes = base64.b64decode(private_key_b64)
-            seed = crypto_sign_ed25519_sk_to_seed(private_key_bytes)
-            self.signing_key = SigningKey(seed)
-            
-            # Store keys
-            self.signing_public_key = creds['signing_keys']['public_key']
-            self.encryption_public_key = creds['encryption_keys']['public_key']
-            self.request_id = creds['request_id']
-            
-            print("✅ Keys loaded successfully")
-            
-        except Exception as e:
-            print(f"❌ Error loading keys: {e}")
-            raise
+        """Load cryptographic keys from the shared ONDC key ring"""
+        from app.core.ondc_crypto import keyring
+        
+        if not keyring.available:
+            print("❌ Error loading keys: secrets/ondc_credentials.json not found or invalid")
+            raise RuntimeError("ONDC key ring not available")
+        
+        self.keyring = keyring
+        self.signing_public_key = keyring.material.signing_public_key
+        self.encryption_public_key = keyring.material.encryption_public_key
+        self.request_id = keyring.material.credentials.get('request_id')
+        print("✅ Keys loaded successfully")
     
     def generate_signature(self, payload: str) -> str:
         """Generate Ed25519 signature for payload"""
-        signature = self.signing_key.sign(payload.encode('utf-8'))
-        return base64.b64encode(signature.signature).decode('utf-8')
+        return base64.b64encode(self.keyring.sign(payload.encode('utf-8'))).decode('utf-8')
     
     def generate_authorization_header(self, payload: str) -> str:
         """Generate authorization header with signature"""
-        signature = self.generate_signature(payload)
-        timestamp = str(int(time.time()))
-        
-        auth_string = f'Signature keyId="{self.subscriber_id}",algorithm="ed25519",headers="(created) (expires) digest",signature="{signature}",created="{timestamp}",expires="{int(time.time()) + 300}"'
-        return auth_string
+        return self.keyring.sign_request(payload.encode('utf-8'))
     
     def save_response(self, test_name: str, url: str, request_data: dict, response, method: str = "GET"):
         """Save request and response data"""
@@ -10,11 +10,14 @@ import json
 from datetime import datetime, timezone
 from typing import Dict, List, Any, Optional
 
+from app.core.ondc_context import ContextFactory, format_ondc_timestamp
+
 class ONDCTransactionManager:
     
     def __init__(self, bap_id="neo-server.rozana.in", bap_uri="https://neo-server.rozana.in"):
         self.bap_id = bap_id
         self.bap_uri = bap_uri
+        self.contexts = ContextFactory(bap_id=bap_id, bap_uri=bap_uri)
         self.active_transactions = {}
     
     def generate_transaction_id(self) -> str:
@@ -29,11 +32,11 @@ class ONDCTransactionManager:
         Generate ONDC compliant message ID
         Rule: UUID v4 for each request/response
         """
-        return str(uuid.uuid4())
+        return self.contexts.next_message_id()
     
     def get_current_timestamp(self) -> str:
         """Generate ONDC compliant timestamp"""
-        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        return format_ondc_timestamp()
     
     def start_new_flow(self, flow_type: str) -> str:
         """
@@ -50,27 +53,7 @@ class ONDCTransactionManager:
     
     def create_context(self, action: str, transaction_id: str, bpp_id: str = None, bpp_uri: str = None) -> dict:
         """Create ONDC compliant context object"""
-        context = {
-            "domain": "ONDC:RET10",
-            "country": "IND",
-            "city": "std:011",
-            "action": action,
-            "core_version": "1.2.0",
-            "bap_id": self.bap_id,
-            "bap_uri": self.bap_uri,
-            "transaction_id": transaction_id,  # Same transaction_id for entire flow
-            "message_id": self.generate_message_id(),  # New message_id for each call
-            "timestamp": self.get_current_timestamp(),
-            "ttl": "PT30S"
-        }
-        
-        # Add BPP details if provided
-        if bpp_id:
-            context["bpp_id"] = bpp_id
-        if bpp_uri:
-            context["bpp_uri"] = bpp_uri
-            
-        return context
+        return self.contexts.build(action, transaction_id, bpp_id=bpp_id, bpp_uri=bpp_uri)
     
     def create_order_flow_messages(self, transaction_id: str) -> Dict[str, Any]:
         """
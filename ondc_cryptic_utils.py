@@ -1,5 +1,6 @@
 import base64
 import datetime
+import functools
 import os
 import re
 import json
@@ -36,10 +37,16 @@ digest: BLAKE-512={digest_base64}"""
     return signing_string
 
 
-def sign_response(signing_key, private_key):
+@functools.lru_cache(maxsize=8)
+def _signer_for(private_key):
+    # decode the key and build the SigningKey once per private key
     private_key64 = base64.b64decode(private_key)
     seed = crypto_sign_ed25519_sk_to_seed(private_key64)
-    signer = SigningKey(seed)
+    return SigningKey(seed)
+
+
+def sign_response(signing_key, private_key):
+    signer = _signer_for(private_key)
     signed = signer.sign(bytes(signing_key, encoding='utf8'))
     signature = base64.b64encode(signed.signature).decode()
     return signature
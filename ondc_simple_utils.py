@@ -10,7 +10,6 @@ import json
 import sys
 import nacl.encoding
 import nacl.hash
-from nacl.bindings import crypto_sign_ed25519_sk_to_seed
 from nacl.signing import SigningKey, VerifyKey
 from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
 from cryptography.hazmat.primitives import serialization
@@ -74,8 +73,10 @@ def generate_key_pairs():
         "encryption_public_key": encryption_public_key_b64
     }
 
-def create_authorization_header(request_body_path="ondc_request_body.json", private_key=None):
-    """Create authorization header for ONDC API calls"""
+def create_authorization_header(request_body_path="ondc_request_body.json", credentials_path=None):
+    """Create authorization header for ONDC API calls, signed with the ONDC key ring"""
+    from app.core.ondc_crypto import KeyRing, keyring
+    
     try:
         # Load request body
         with open(request_body_path, 'r') as f:
@@ -84,28 +85,16 @@ def create_authorization_header(request_body_path="ondc_request_body.json", priv
         # Minify the payload
         request_body_str = json.dumps(request_body, separators=(',', ':'))
         
-        # Hash the message
-        digest = hash_message(request_body_str)
-        
-        # Create signing string
-        created = int(datetime.datetime.now().timestamp())
-        expires = int((datetime.datetime.now() + datetime.timedelta(hours=1)).timestamp())
-        signing_string = create_signing_string(digest, created, expires)
-        
-        # Sign the string
-        if private_key:
-            private_key_bytes = base64.b64decode(private_key)
-            seed = crypto_sign_ed25519_sk_to_seed(private_key_bytes)
-            signer = SigningKey(seed)
-            signed = signer.sign(bytes(signing_string, encoding='utf8'))
-            signature = base64.b64encode(signed.signature).decode()
+        # Sign with the configured credentials, or with the given credentials file
+        signer = KeyRing(credentials_path) if credentials_path else keyring
+        if signer.available:
+            auth_header = signer.sign_request(request_body_str.encode('utf-8'))
         else:
             # Use a test signature for demonstration
-            signature = "test_signature_base64_encoded"
-        
-        # Create authorization header
-        key_id = "neo-server.rozana.in|key_1755737751|ed25519"
-        auth_header = f'Signature keyId="{key_id}",algorithm="ed25519",created="{created}",expires="{expires}",headers="(created) (expires) digest",signature="{signature}"'
+            created = int(datetime.datetime.now().timestamp())
+            expires = int((datetime.datetime.now() + datetime.timedelta(hours=1)).timestamp())
+            key_id = "neo-server.rozana.in|key_1755737751|ed25519"
+            auth_header = f'Signature keyId="{key_id}",algorithm="ed25519",created="{created}",expires="{expires}",headers="(created) (expires) digest",signature="test_signature_base64_encoded"'
         
         print(f"Authorization Header: {auth_header}")
         return auth_header
@@ -119,7 +108,7 @@ def main():
     if len(sys.argv) < 2:
         print("Usage:")
         print("  python ondc_simple_utils.py generate_key_pairs")
-        print("  python ondc_simple_utils.py create_auth_header [private_key]")
+        print("  python ondc_simple_utils.py create_auth_header [credentials_path]")
         return
     
     command = sys.argv[1]
@@ -127,8 +116,8 @@ def main():
     if command == "generate_key_pairs":
         generate_key_pairs()
     elif command == "create_auth_header":
-        private_key = sys.argv[2] if len(sys.argv) > 2 else None
-        create_authorization_header(private_key=private_key)
+        credentials_path = sys.argv[2] if len(sys.argv) > 2 else None
+        create_authorization_header(credentials_path=credentials_path)
     else:
         print(f"Unknown command: {command}")
 
@@ -11,11 +11,14 @@ from datetime import datetime, timezone
 import hashlib
 import base64
 
+from app.core.ondc_context import ContextFactory, format_ondc_timestamp
+
 class PramaanMessageGenerator:
     
     def __init__(self, bap_id="neo-server.rozana.in", bap_uri="https://neo-server.rozana.in"):
         self.bap_id = bap_id
         self.bap_uri = bap_uri
+        self.contexts = ContextFactory(bap_id=bap_id, bap_uri=bap_uri)
     
     def generate_transaction_id(self) -> str:
         """Generate ONDC compliant transaction ID"""
@@ -27,39 +30,19 @@ class PramaanMessageGenerator:
     def generate_message_id(self) -> str:
         """Generate ONDC compliant message ID"""
         # Format: UUID v4
-        return str(uuid.uuid4())
+        return self.contexts.next_message_id()
     
     def get_current_timestamp(self) -> str:
         """Generate ONDC compliant timestamp"""
         # ISO 8601 format with milliseconds and Z suffix
-        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        return format_ondc_timestamp()
     
     def create_context(self, action: str, transaction_id: str = None, bpp_id: str = None, bpp_uri: str = None) -> dict:
         """Create ONDC compliant context object"""
         if not transaction_id:
             transaction_id = self.generate_transaction_id()
             
-        context = {
-            "domain": "ONDC:RET10",
-            "country": "IND",
-            "city": "std:011",
-            "action": action,
-            "core_version": "1.2.0",
-            "bap_id": self.bap_id,
-            "bap_uri": self.bap_uri,
-            "transaction_id": transaction_id,
-            "message_id": self.generate_message_id(),
-            "timestamp": self.get_current_timestamp(),
-            "ttl": "PT30S"
-        }
-        
-        # Add BPP details if provided (for requests to sellers)
-        if bpp_id:
-            context["bpp_id"] = bpp_id
-        if bpp_uri:
-            context["bpp_uri"] = bpp_uri
-            
-        return context
+        return self.contexts.build(action, transaction_id, bpp_id=bpp_id, bpp_uri=bpp_uri)
     
     def create_search_message(self, transaction_id: str = None) -> dict:
         """Create search message for Pramaan testing"""
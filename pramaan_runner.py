@@ -10,17 +10,12 @@ import time
 import uuid
 import base64
 from datetime import datetime, timezone
-from nacl.signing import SigningKey
 from nacl.public import PrivateKey, PublicKey
 from nacl.utils import random
 from nacl.secret import SecretBox
 import hashlib
 import hmac
 
-def crypto_sign_ed25519_sk_to_seed(sk):
-    """Convert Ed25519 private key to seed"""
-    return sk[:32]
-
 class PramaanAPITester:
     def __init__(self):
         self.base_url = "https://pramaan.ondc.org"
@@ -28,41 +23,25 @@ class PramaanAPITester:
         self.load_keys()
         
     def load_keys(self):
-        """Load cryptographic keys"""
-        try:
-            # Load Ed25519 signing key
-            with open('ed25519_private_key.txt', 'r') as f:
-                private_key_b64 = f.read().strip()
-            private_key_bytes = base64.b64decode(private_key_b64)
-            seed = crypto_sign_ed25519_sk_to_seed(private_key_bytes)
-            self.signing_key = SigningKey(seed)
-            
-            # Load X25519 public key (as string, not object)
-            with open('x25519_public_key.txt', 'r') as f:
-                self.encryption_public_key = f.read().strip()
-            
-            # Load request ID
-            with open('ondc_request_id.txt', 'r') as f:
-                self.request_id = f.read().strip()
-                
-            print("✅ Keys loaded successfully")
-            
-        except Exception as e:
-            print(f"❌ Error loading keys: {e}")
-            raise
+        """Load cryptographic keys from the shared ONDC key ring"""
+        from app.core.ondc_crypto import keyring
+        
+        if not keyring.available:
+            print("❌ Error loading keys: secrets/ondc_credentials.json not found or invalid")
+            raise RuntimeError("ONDC key ring not available")
+        
+        self.keyring = keyring
+        self.encryption_public_key = keyring.material.encryption_public_key
+        self.request_id = keyring.material.credentials.get('request_id')
+        print("✅ Keys loaded successfully")
     
     def generate_signature(self, payload: str) -> str:
         """Generate Ed25519 signature for payload"""
-        signature = self.signing_key.sign(payload.encode('utf-8'))
-        return base64.b64encode(signature.signature).decode('utf-8')
+        return base64.b64encode(self.keyring.sign(payload.encode('utf-8'))).decode('utf-8')
     
     def generate_authorization_header(self, payload: str) -> str:
         """Generate authorization header with signature"""
-        signature = self.generate_signature(payload)
-        timestamp = str(int(time.time()))
-        
-        auth_string = f'Signature keyId="{self.subscriber_id}",algorithm="ed25519",headers="(created) (expires) digest",signature="{signature}",created="{timestamp}",expires="{int(time.time()) + 300}"'
-        return auth_string
+        return self.keyring.sign_request(payload.encode('utf-8'))
     
     def test_health_check(self):
         """Test Pramaan health endpoint"""
@@ -491,11 +470,8 @@ def main():
         tester.run_all_tests()
     except Exception as e:
         print(f"❌ Failed to initialize tester: {e}")
-        print("Make sure all key files are present:")
-        print("  - ed25519_private_key.txt")
-        print("  - x25519_private_key.txt")
-        print("  - x25519_public_key.txt")
-        print("  - ondc_request_id.txt")
+        print("Make sure the ONDC credentials file is present:")
+        print("  - secrets/ondc_credentials.json (python scripts/generate_ondc_keys.py)")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
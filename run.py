@@ -3,7 +3,7 @@
 """
 🎯 ONDC BAP API Tester - Complete Test Suite with Pramaan Integration
 Run all APIs with: python3 run.py
-Uses only built-in Python modules (no external dependencies)
+Uses built-in Python modules plus the app's ONDC context factory
 
 🔄 ENHANCED WITH ONDC BUYER FLOW PREREQUISITES:
 - Pramaan Beta Mock Store Configuration (pramaan_provider_1)
@@ -28,6 +28,9 @@ import sys
 import ssl
 from typing import Dict, Any, List
 
+from app.core.catalog_store import CatalogStore
+from app.core.ondc_context import ContextFactory, format_ondc_timestamp
+
 class ONDCAPITester:
     def __init__(self, base_url="https://pramaan.ondc.org/beta/preprod/mock/seller"):
         self.base_url = base_url
@@ -46,29 +49,43 @@ class ONDCAPITester:
             "environment": "preprod"  # Must match Pramaan form selection
         }
         
-        # Catalog storage for on_search results (simulated)
-        self.saved_catalog = {
-            "provider_id": "pramaan_provider_1",
-            "items": [
-                {"id": "item_001", "name": "Test Product 1", "available": True},
-                {"id": "item_002", "name": "Test Product 2", "available": True}
-            ],
-            "catalog_received": True,
-            "last_updated": self.get_timestamp()
-        }
+        # Static context fields are cached once; only ids and timestamps vary per call
+        self.contexts = ContextFactory(domain=self.pramaan_config["domain"])
+        
+        # Catalog storage for on_search results, seeded with the mock seller's catalog
+        self.saved_catalog = CatalogStore()
+        self.saved_catalog.ingest({"bpp_id": self.pramaan_config["bpp_id"]}, self.get_sample_on_search_catalog())
         
         # Create SSL context that doesn't verify certificates (for testing)
         self.ssl_context = ssl.create_default_context()
         self.ssl_context.check_hostname = False
         self.ssl_context.verify_mode = ssl.CERT_NONE
         
+    def get_sample_on_search_catalog(self) -> Dict[str, Any]:
+        """on_search catalog as received from the Pramaan mock seller"""
+        return {
+            "bpp/descriptor": {"name": "Pramaan Mock Seller"},
+            "bpp/providers": [{
+                "id": self.pramaan_config["store_name"],
+                "descriptor": {"name": self.pramaan_config["store_name"], "symbol": self.pramaan_config["store_icon"]},
+                "locations": [{"id": "L1", "address": {"area_code": pin}} for pin in self.pramaan_config["serviceable_pin_codes"][:1]],
+                "categories": [{"id": "Packaged Commodities", "descriptor": {"name": "Packaged Commodities"}}],
+                "items": [
+                    {"id": "item_001", "descriptor": {"name": "Test Product 1"}, "category_id": "Packaged Commodities",
+                     "location_id": "L1", "price": {"currency": "INR", "value": "100.00"}},
+                    {"id": "item_002", "descriptor": {"name": "Test Product 2"}, "category_id": "Packaged Commodities",
+                     "location_id": "L1", "price": {"currency": "INR", "value": "250.00"}}
+                ]
+            }]
+        }
+
     def generate_message_id(self) -> str:
         """Generate unique message ID"""
-        return str(uuid.uuid4())
+        return self.contexts.next_message_id()
     
     def get_timestamp(self) -> str:
         """Generate ONDC compliant timestamp"""
-        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        return format_ondc_timestamp()
     
     def create_context(self, action: str, bpp_id: str = None, bpp_uri: str = None) -> dict:
         """
@@ -80,25 +97,13 @@ class ONDCAPITester:
         if bpp_id and bpp_id != self.pramaan_config["bpp_id"]:
             print(f"⚠️ Warning: BPP ID mismatch. Expected: {self.pramaan_config['bpp_id']}, Got: {bpp_id}")
         
-        context = {
-            "domain": self.pramaan_config["domain"],  # Use configured domain
-            "country": "IND",
-            "city": "std:011",  # Delhi for PIN 110037, configurable for 122007
-            "action": action,
-            "core_version": "1.2.0",
-            "bap_id": "neo-server.rozana.in",
-            "bap_uri": "https://neo-server.rozana.in",
-            "transaction_id": self.transaction_id,
-            "message_id": self.generate_message_id(),
-            "timestamp": self.get_timestamp(),
-            "ttl": "PT30S"
-        }
-        
-        # Add BPP details (use pramaan_config if not provided)
-        context["bpp_id"] = bpp_id or self.pramaan_config["bpp_id"]
-        context["bpp_uri"] = bpp_uri or self.pramaan_config["bpp_uri"]
-            
-        return context
+        # BPP details default to pramaan_config
+        return self.contexts.build(
+            action,
+            self.transaction_id,
+            bpp_id=bpp_id or self.pramaan_config["bpp_id"],
+            bpp_uri=bpp_uri or self.pramaan_config["bpp_uri"],
+        )
     
     def get_serviceable_pin_code(self, preferred_pin: str = None) -> str:
         """
@@ -131,9 +136,10 @@ class ONDCAPITester:
         print(f"   ✅ Domain: {self.pramaan_config['domain']} (matches Pramaan form)")
         print(f"   ✅ Environment: {self.pramaan_config['environment']} (matches Pramaan form)")
         
-        if self.saved_catalog["catalog_received"]:
+        items = list(self.saved_catalog.items_for_provider(self.pramaan_config["bpp_id"], self.pramaan_config["store_name"]))
+        if items:
             print(f"   ✅ on_search catalog: Received and saved")
-            print(f"   📦 Available items: {len(self.saved_catalog['items'])}")
+            print(f"   📦 Available items: {len(items)}")
         else:
             print("   ❌ on_search catalog: NOT received - flow may fail")
             return False
@@ -595,7 +601,7 @@ class ONDCAPITester:
                         "id": self.pramaan_config["store_name"]  # Use configured store name
                     },
                     "items": [{
-                        "id": self.saved_catalog["items"][0]["id"],  # Use catalog item ID
+                        "id": self.saved_catalog.get_item("item_001", self.pramaan_config["store_name"]).id,  # Use catalog item ID
                         "quantity": {
                             "count": 2
                         }
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark ONDC on_subscribe challenge decryption
+Compares per-challenge cost with and without the memoized shared key
+"""
+
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives import hashes, padding, serialization
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from app.core.ondc_crypto import KeyRing, ONDCCrypto
+
+
+def build_crypto():
+    """ONDCCrypto over throwaway keys where we also hold the 'ONDC' side"""
+    ours = X25519PrivateKey.generate()
+    registry = X25519PrivateKey.generate()
+    registry_public_der = registry.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    credentials = {
+        "subscriber_id": "bench.example.com",
+        "unique_key_id": "bench_key",
+        "signing_keys": {"private_key": base64.b64encode(os.urandom(32)).decode(), "public_key": ""},
+        "encryption_keys": {
+            "private_key": base64.b64encode(ours.private_bytes(
+                serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption()
+            )).decode(),
+            "public_key": "",
+        },
+        "ondc_public_keys": {"pre_prod": base64.b64encode(registry_public_der).decode()},
+    }
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(credentials, f)
+    keyring = KeyRing(credentials_path=f.name)
+    os.unlink(f.name)
+
+    # Encrypt a challenge the way the registry does
+    shared = registry.exchange(ours.public_key())
+    key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'').derive(shared)
+    iv = os.urandom(16)
+    padder = padding.PKCS7(128).padder()
+    plaintext = padder.update(b"ondc-challenge-" + os.urandom(16).hex().encode()) + padder.finalize()
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    challenge = base64.b64encode(iv + encryptor.update(plaintext) + encryptor.finalize()).decode()
+
+    return ONDCCrypto(keyring), challenge
+
+
+def bench(label, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call_us = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<40} {per_call_us:>10.1f} us/challenge")
+    return per_call_us
+
+
+def main(iterations: int = 5000):
+    crypto, challenge = build_crypto()
+    assert crypto.decrypt_challenge(challenge, "pre_prod")
+
+    def uncached():
+        crypto.invalidate_shared_keys()
+        crypto.decrypt_challenge(challenge, "pre_prod")
+
+    def cached():
+        crypto.decrypt_challenge(challenge, "pre_prod")
+
+    print(f"Challenge decryption, {iterations} iterations")
+    before = bench("per-call DER parse + X25519 + HKDF", uncached, iterations)
+    after = bench("memoized shared key (AES-CBC only)", cached, iterations)
+    print(f"Speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark ONDC response serialization
+Compares FastAPI's default path (jsonable_encoder + stdlib json) with orjson and the ACK byte templates
+"""
+
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core.ondc_responses import FastJSONResponse, ack_body
+
+
+def build_context(action: str) -> dict:
+    return {
+        "domain": "ONDC:RET10",
+        "country": "IND",
+        "city": "std:011",
+        "action": action,
+        "core_version": "1.2.0",
+        "bap_id": "neo-server.rozana.in",
+        "bap_uri": "https://neo-server.rozana.in",
+        "transaction_id": str(uuid.uuid4()),
+        "message_id": str(uuid.uuid4()),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "ttl": "PT30S",
+    }
+
+
+def build_payloads(catalog_items: int) -> dict:
+    ack = {"context": build_context("on_select"), "message": {"ack": {"status": "ACK"}}}
+    ekyc_status = {
+        "context": build_context("status"),
+        "message": {
+            "ack": {"status": "ACK"},
+            "order": {
+                "id": "ekyc_order_1700000000",
+                "status": "VERIFIED",
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "verification_result": {
+                    "status": "SUCCESS", "verified": True, "confidence_score": 0.95,
+                    "document_type": "AADHAAR", "verification_id": "verify_1700000000",
+                },
+            },
+        },
+    }
+    catalog = {
+        "context": build_context("on_search"),
+        "message": {"catalog": {"bpp/providers": [{
+            "id": "P1",
+            "descriptor": {"name": "Store"},
+            "items": [{
+                "id": f"I{i}",
+                "descriptor": {"name": f"Item {i}", "short_desc": "A grocery item", "images": [f"https://img/{i}.png"]},
+                "price": {"currency": "INR", "value": f"{i % 500}.00", "maximum_value": f"{i % 500 + 10}.00"},
+                "category_id": "Grocery",
+                "quantity": {"available": {"count": "99"}, "maximum": {"count": "10"}},
+                "@ondc/org/returnable": True,
+                "tags": [{"code": "origin", "list": [{"code": "country", "value": "IND"}]}],
+            } for i in range(catalog_items)],
+        }]}},
+    }
+    return {"ack": ack, "ekyc_status": ekyc_status, f"catalog_{catalog_items}_items": catalog}
+
+
+def bench(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(catalog_items: int = 2000):
+    payloads = build_payloads(catalog_items)
+    print(f"{'payload':<22} {'default (us)':>14} {'orjson (us)':>12} {'direct (us)':>12} {'template (us)':>14}")
+
+    for name, payload in payloads.items():
+        iterations = 50 if name.startswith("catalog") else 20000
+
+        default = bench(lambda: JSONResponse(jsonable_encoder(payload)), iterations)
+        encoded_orjson = bench(lambda: FastJSONResponse(jsonable_encoder(payload)), iterations)
+        direct = bench(lambda: FastJSONResponse(payload), iterations)
+        template = "-"
+        if name == "ack":
+            context = payload["context"]
+            template = f"{bench(lambda: ack_body(context), iterations):.1f}"
+
+        print(f"{name:<22} {default:>14.1f} {encoded_orjson:>12.1f} {direct:>12.1f} {template:>14}")
+
+    print("\ndefault  = jsonable_encoder + stdlib json (FastAPI default)")
+    print("orjson   = jsonable_encoder + orjson (default_response_class only)")
+    print("direct   = handler returns FastJSONResponse, no jsonable_encoder")
+    print("template = precomputed ACK bytes with only the context serialized")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
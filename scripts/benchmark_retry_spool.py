@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark the outbound retry spool
+Spools N failed calls (fsynced, group-committed), replays them after a restart and drains them
+through a sender that fails each call once before delivering it
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ondc_context import context_factory
+from app.core.ondc_responses import dumps
+from app.core.retry_spool import DELIVERED, RETRY, RetrySpool
+
+DESTINATIONS = [f"bpp-{n}.example.com" for n in range(20)]
+
+
+def build_body(n: int) -> bytes:
+    """A select of a few items, about 1 KB like the ones the BAP sends"""
+    context = context_factory.build("select", bpp_id=DESTINATIONS[n % len(DESTINATIONS)],
+                                    bpp_uri=f"https://{DESTINATIONS[n % len(DESTINATIONS)]}")
+    items = [{"id": f"item_{n}_{i}", "quantity": {"count": 1 + i},
+              "fulfillment_id": "F1", "location_id": "L1"} for i in range(5)]
+    return dumps({"context": context, "message": {"order": {
+        "provider": {"id": "P1", "locations": [{"id": "L1"}]}, "items": items,
+        "fulfillments": [{"end": {"location": {"gps": "12.9716,77.5946", "address": {"area_code": "560001"}}}}],
+    }}})
+
+
+async def spool_calls(directory: str, count: int, concurrency: int) -> float:
+    spool = RetrySpool(directory=directory, base_delay=3600.0, rng=lambda: 0.5)
+    spool.start()
+    bodies = [build_body(n) for n in range(count)]
+    expires_at = time.time() + 7200
+
+    async def failing_worker(offset: int):
+        for n in range(offset, count, concurrency):
+            destination = DESTINATIONS[n % len(DESTINATIONS)]
+            await spool.add("select", f"https://{destination}/select", destination, bodies[n], expires_at,
+                            str(uuid.uuid4()), str(uuid.uuid4()))
+
+    started = time.perf_counter()
+    # Concurrent failures share fsyncs, as dispatcher workers do
+    await asyncio.gather(*(failing_worker(offset) for offset in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    print(f"spool {count:,} calls ({concurrency} concurrent): {elapsed:.2f}s, {count / elapsed:,.0f} calls/s, "
+          f"{spool.stats()['commits']:,} fsyncs, {sum(os.path.getsize(p) for _, p in spool.segments()) / 1e6:.1f} MB")
+    await spool.stop()
+    return elapsed
+
+
+async def replay_and_drain(directory: str, count: int) -> None:
+    delivered = asyncio.Event()
+
+    async def sender(entry, body):
+        # The BPP is back after the first retry
+        if entry.attempts < 2:
+            return RETRY
+        if spool.stats()["delivered"] == count - 1:
+            delivered.set()
+        return DELIVERED
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    spool = RetrySpool(directory=directory, base_delay=0.001, max_delay=0.001, per_destination=4,
+                       clock=lambda: time.time() + 7200 - 60)
+    spool.start(sender)
+    replayed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"replay {spool.stats()['replayed']:,} entries after restart: {replayed:.2f}s, "
+          f"peak {peak / 1e6:.1f} MB (segments are read whole)")
+
+    started = time.perf_counter()
+    await delivered.wait()
+    elapsed = time.perf_counter() - started
+    stats = spool.stats()
+    print(f"drain {count:,} calls ({stats['attempts']:,} attempts, {len(DESTINATIONS)} hosts x 4 concurrent): "
+          f"{elapsed:.2f}s, {count / elapsed:,.0f} calls/s")
+    await spool.stop()
+
+
+async def main(count: int = 10_000):
+    with tempfile.TemporaryDirectory(prefix="spool-bench-") as directory:
+        await spool_calls(directory, count, concurrency=32)
+        await replay_and_drain(directory, count)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000))
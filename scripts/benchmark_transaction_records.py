@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark transaction record memory
+Compares bytes per transaction for plain dict records and slotted TransactionRecords
+"""
+
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ondc_context import format_ondc_timestamp
+from app.core.transaction_records import TransactionRecord
+
+PROVIDERS = ["pramaan.ondc.org", "uidai.ondc.org", "digilocker.ondc.org", "ekyc.example.com"]
+STATUSES = ["INITIATED", "VERIFIED", "FAILED"]
+
+
+def build_payloads(count: int):
+    """Records as they arrive: decoded from JSON, so no string is shared between records"""
+    base = 1_700_000_000_000
+    for i in range(count):
+        status = STATUSES[i % len(STATUSES)]
+        record = {
+            "order_id": f"ekyc_order_{base // 1000 + i}",
+            "status": status,
+            "provider": PROVIDERS[i % len(PROVIDERS)],
+            "created_at": format_ondc_timestamp.millis(base + i * 7),
+            "updated_at": format_ondc_timestamp.millis(base + i * 7 + 1500),
+        }
+        if status == "VERIFIED":
+            record["verification_result"] = {
+                "status": "SUCCESS", "verified": True, "confidence_score": 0.95,
+                "document_type": "AADHAAR", "verification_id": f"verify_{base // 1000 + i}",
+                "verified_at": record["updated_at"],
+            }
+        yield json.loads(json.dumps(record))
+
+
+def measure(count: int, convert) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = {f"txn-{i}": convert(payload) for i, payload in enumerate(build_payloads(count))}
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Keys are the same for both layouts; report record bytes only
+    keys = sum(sys.getsizeof(key) for key in store) + sys.getsizeof(store)
+    del store
+    return (current - keys) / count, elapsed
+
+
+def main(count: int = 1_000_000):
+    print(f"{count:,} transactions (1/3 VERIFIED with a verification_result)")
+    print(f"{'layout':<20} {'bytes/txn':>10} {'build (s)':>10}")
+    results = {}
+    for name, convert in (("dict", dict), ("TransactionRecord", TransactionRecord.from_dict)):
+        per_record, elapsed = measure(count, convert)
+        results[name] = per_record
+        print(f"{name:<20} {per_record:>10.0f} {elapsed:>10.1f}")
+    print(f"\nsaving: {1 - results['TransactionRecord'] / results['dict']:.0%} per transaction")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -15,56 +15,37 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.core.org_config import OrganizationConfig
 
-def crypto_sign_ed25519_sk_to_seed(sk):
-    """Convert Ed25519 private key to seed"""
-    return sk[:32]
-
 class ONDCSearchClient:
     def __init__(self):
         self.subscriber_id = OrganizationConfig.SUBSCRIBER_ID
         self.load_keys()
     
     def load_keys(self):
-        """Load cryptographic keys"""
-        try:
-            with open('secrets/ondc_credentials.json', 'r') as f:
-                creds = json.load(f)
-            
-            # Load signing key
-            private_key_b64 = creds['signing_keys']['private_key']
-            private_key_bytes = base64.b64decode(private_key_b64)
-            seed = crypto_sign_ed25519_sk_to_seed(private_key_bytes)
-            
-            # Import nacl for signing
-            from nacl.signing import SigningKey
-            self.signing_key = SigningKey(seed)
-            
-            # Store keys
-            self.signing_public_key = creds['signing_keys']['public_key']
-            self.encryption_public_key = creds['encryption_keys']['public_key']
-            self.request_id = creds['request_id']
-            
+        """Load cryptographic keys from the shared ONDC key ring"""
+        from app.core.ondc_crypto import keyring
+        
+        self.keyring = keyring if keyring.available else None
+        if self.keyring:
+            self.signing_public_key = keyring.material.signing_public_key
+            self.encryption_public_key = keyring.material.encryption_public_key
+            self.request_id = keyring.material.credentials.get('request_id')
             print("✅ Keys loaded successfully")
-            
-        except Exception as e:
-            print(f"❌ Error loading keys: {e}")
-            self.signing_key = None
+        else:
+            print("❌ Error loading keys: secrets/ondc_credentials.json not found or invalid")
     
     def generate_signature(self, payload: str) -> str:
         """Generate Ed25519 signature for payload"""
-        if not self.signing_key:
+        if not self.keyring:
             return "placeholder_signature"
         
-        signature = self.signing_key.sign(payload.encode('utf-8'))
-        return base64.b64encode(signature.signature).decode('utf-8')
+        return base64.b64encode(self.keyring.sign(payload.encode('utf-8'))).decode('utf-8')
     
     def generate_authorization_header(self, payload: str) -> str:
         """Generate authorization header with signature"""
-        signature = self.generate_signature(payload)
-        timestamp = str(int(time.time()))
+        if not self.keyring:
+            return 'Signature signature="placeholder_signature"'
         
-        auth_string = f'Signature keyId="{self.subscriber_id}",algorithm="ed25519",headers="(created) (expires) digest",signature="{signature}",created="{timestamp}",expires="{int(time.time()) + 300}"'
-        return auth_string
+        return self.keyring.sign_request(payload.encode('utf-8'))
     
     def create_search_payload(self):
         """Create a search payload for ONDC gateway"""
@@ -1,8 +1,13 @@
 import os
 import sys
+import tempfile
 
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+# Keep app-level tests off the on-disk transaction database and retry spool
+os.environ.setdefault("TRANSACTION_STORE_BACKEND", "memory")
+os.environ.setdefault("ONDC_RETRY_SPOOL_DIR", tempfile.mkdtemp(prefix="ondc-spool-"))
+
@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+import pytest
+from httpx import AsyncClient
+
+from app.core.callback_registry import CallbackRegistry, DuplicateMessageId
+from app.core.ondc_dispatcher import dispatcher
+from app.main import app
+
+
+def context(message_id, transaction_id="txn-1", ttl="PT5S"):
+    return {"message_id": message_id, "transaction_id": transaction_id, "ttl": ttl}
+
+
+@pytest.mark.asyncio
+async def test_registry_resolves_and_drops_late_duplicate_and_unknown_callbacks():
+    now = [1000.0]
+    registry = CallbackRegistry(clock=lambda: now[0])
+    answered = registry.register("select", context("m1"))
+    expiring = registry.register("init", context("m2"))
+
+    assert registry.resolve("on_init", context("m1")) == "mismatched"
+    assert registry.resolve("on_select", context("m1"), {"order": {}}) == "resolved"
+    assert (await registry.wait(answered)).message == {"order": {}}
+    assert registry.resolve("on_select", context("m1")) == "duplicate"
+    assert registry.resolve("on_select", context("m-other")) == "unknown"
+
+    # A reused in-flight message_id is refused; the first request keeps waiting
+    with pytest.raises(DuplicateMessageId):
+        registry.register("init", context("m2"))
+    assert registry.stats()["reused"] == 1 and len(registry) == 1
+
+    now[0] += 6
+    assert registry.resolve("on_init", context("m2")) == "late"
+    with pytest.raises(asyncio.TimeoutError):
+        await registry.wait(expiring)
+    stats = registry.stats()
+    assert stats["pending"] == 0 and stats["resolved"] == 1 and stats["expired"] == 1 and stats["late"] == 1
+
+
+@pytest.mark.asyncio
+async def test_wait_facade_returns_the_callback(monkeypatch):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, json={"message": {"ack": {"status": "ACK"}}})))
+    monkeypatch.setattr(dispatcher, "client_factory", lambda: client)
+    select_context = {"action": "select", "bpp_id": "bpp-w", "bpp_uri": "https://bpp-w",
+                      "transaction_id": "txn-wait", "message_id": "msg-wait", "ttl": "PT2S"}
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        waiting = asyncio.create_task(ac.post("/select", params={"wait": "true"},
+                                              json={"context": select_context, "message": {"order": {}}}))
+        await asyncio.sleep(0.05)
+        ack = await ac.post("/on_select", json={"context": {**select_context, "action": "on_select"},
+                                                "message": {"order": {"quote": {"price": {"value": "10"}}}}})
+        answer = await asyncio.wait_for(waiting, 2)
+        # A BPP resending its callback is ACKed; the flow has already moved on
+        duplicate = await ac.post("/on_select", json={"context": {**select_context, "action": "on_select"},
+                                                      "message": {"order": {}}})
+        flow = await ac.get("/flows/txn-wait")
+
+    assert ack.json()["message"]["ack"]["status"] == "ACK"
+    assert duplicate.status_code == 200 and duplicate.json()["message"]["ack"]["status"] == "ACK"
+    assert flow.json()["state"] == "SELECTED"
+    assert answer.status_code == 200
+    assert answer.json()["message"]["order"]["quote"]["price"]["value"] == "10"
+    assert answer.json()["context"]["action"] == "on_select"
+    await dispatcher.join()
+    await dispatcher.stop()
+    await client.aclose()
@@ -0,0 +1,88 @@
+import json
+import random
+
+import httpx
+import pytest
+
+from app.core.catalog_download import CatalogDownload, CatalogDownloader, CatalogStreamParser
+from app.core.catalog_store import CatalogStore
+
+
+def linked_catalog():
+    providers = [
+        {"id": "P1", "descriptor": {"name": "Café ₹ store"},
+         "items": [{"id": f"I{n}", "descriptor": {"name": f"Coffee {n}"}, "price": {"value": n * 1.5}}
+                   for n in range(1, 40)]},
+        # Items before the provider id are held until the id arrives
+        {"items": [{"id": "X1", "descriptor": {"name": "Tea"}}], "id": "P2", "locations": [{"id": "L1"}]},
+    ]
+    return {"context": {"action": "on_search"}, "message": {"catalog": {"bpp/providers": providers}}}
+
+
+def parse(data, sizes):
+    parser = CatalogStreamParser()
+    events, offset = [], 0
+    while offset < len(data):
+        size = sizes()
+        events += parser.feed(data[offset:offset + size])
+        offset += size
+    return events + parser.close()
+
+
+def test_parser_yields_items_and_providers_for_any_chunking():
+    data = json.dumps(linked_catalog(), indent=1, ensure_ascii=False).encode("utf-8")
+    whole = parse(data, lambda: len(data))
+    rng = random.Random(7)
+    assert parse(data, lambda: rng.randint(1, 7)) == whole
+
+    items = [(event[1], event[2]["id"]) for event in whole if event[0] == "item"]
+    assert items[:2] == [("P1", "I1"), ("P1", "I2")] and items[-1] == ("P2", "X1") and len(items) == 40
+    providers = [event[1] for event in whole if event[0] == "provider"]
+    assert providers[0]["descriptor"]["name"] == "Café ₹ store" and "items" not in providers[0]
+    assert providers[1]["locations"] == [{"id": "L1"}]
+
+    with pytest.raises(ValueError):
+        parse(data[:-3], lambda: 64)
+
+
+class DroppedConnection(httpx.AsyncByteStream):
+    def __init__(self, data):
+        self.data = data
+
+    async def __aiter__(self):
+        yield self.data
+        raise httpx.ReadError("connection reset")
+
+
+@pytest.mark.asyncio
+async def test_download_resumes_with_range_and_replaces_provider_items():
+    data = json.dumps(linked_catalog()).encode("utf-8")
+    cut = len(data) // 2
+    ranges = []
+
+    def handler(request):
+        ranges.append(request.headers.get("range"))
+        if "range" not in request.headers:
+            return httpx.Response(200, headers={"content-length": str(len(data))},
+                                  stream=DroppedConnection(data[:cut]))
+        start = int(request.headers["range"][len("bytes="):-1])
+        return httpx.Response(206, content=data[start:],
+                              headers={"content-range": f"bytes {start}-{len(data) - 1}/{len(data)}"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    store = CatalogStore()
+    store.upsert_item("bpp-a", "P1", {"id": "I-old"})
+    downloader = CatalogDownloader(store=store, chunk_size=256, client_factory=lambda: client)
+    reindexed = []
+
+    download = CatalogDownload("bpp-a", "https://bpp-a/catalog.json")
+    await downloader.download(download, on_provider=reindexed.append)
+
+    # Resumes after the last whole chunk handed to the parser
+    assert ranges == [None, f"bytes={cut - cut % 256}-"]
+    assert download.resumes == 1 and download.bytes_received == len(data) == download.total_bytes
+    assert download.items == 40 and download.removed == 1
+    assert store.get_item("I-old", "P1", "bpp-a") is None
+    assert store.get_item("I39", "P1", "bpp-a").price == "58.5"
+    assert reindexed == [("bpp-a", "P1"), ("bpp-a", "P2")]
+    await client.aclose()
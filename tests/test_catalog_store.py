@@ -0,0 +1,56 @@
+import pytest
+from httpx import AsyncClient
+
+from app.core.catalog_store import CatalogStore, catalog_store
+from app.main import app
+
+
+def catalog(provider_id, items):
+    return {"bpp/providers": [{
+        "id": provider_id,
+        "categories": [{"id": "beverages"}],
+        "items": [{"id": item_id, "descriptor": {"name": name}, "category_id": "beverages",
+                   "price": {"currency": "INR", "value": price}} for item_id, name, price in items],
+    }]}
+
+
+def test_indexes_follow_upserts_and_removals():
+    store = CatalogStore()
+    store.ingest({"bpp_id": "bpp-a"}, catalog("P1", [("I1", "Filter Coffee", "120.00"),
+                                                     ("I2", "Masala Chai", "40.00")]))
+    store.ingest({"bpp_id": "bpp-b"}, catalog("P9", [("I1", "Cold Coffee", "150.00")]))
+
+    assert {item.bpp_id for item in store.search("coffee")} == {"bpp-a", "bpp-b"}
+    assert [item.id for item in store.search("coffee", provider_id="P1", bpp_id="bpp-a")] == ["I1"]
+    assert len(store.search(category_id="beverages")) == 3
+    assert store.get_item("I1", "P9", "bpp-b").price == "150.00"
+
+    store.upsert_item("bpp-a", "P1", {"id": "I1", "descriptor": {"name": "Espresso"}, "price": {"value": "90"}})
+    assert [item.bpp_id for item in store.search("coffee")] == ["bpp-b"]
+    assert store.search("espresso")[0].to_dict()["price"]["value"] == "90"
+
+    assert store.missing_order_items("bpp-a", "P1", [{"id": "I2"}, {"id": "I7"}]) == ["I7"]
+    assert store.missing_order_items("bpp-a", "unknown", [{"id": "I7"}]) == []
+    # Without the BPP, the provider id index narrows the lookup
+    assert store.has_provider("P9") and store.get_item("I1", "P9").bpp_id == "bpp-b"
+    assert store.missing_order_items(None, "P9", [{"id": "I1"}, {"id": "I2"}]) == ["I2"]
+
+    assert store.remove_provider("bpp-a", "P1") == 2
+    assert store.search("chai") == [] and not store.has_provider("P1")
+    assert store.stats()["items"] == 1
+
+
+@pytest.mark.asyncio
+async def test_catalog_endpoints_and_select_item_check():
+    catalog_store.ingest({"bpp_id": "bpp-cat"}, catalog("P-cat", [("I-latte", "Iced Latte", "180.00")]))
+    context = {"bpp_id": "bpp-cat", "bpp_uri": "https://bpp-cat", "action": "select"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        found = await ac.get("/catalog/search", params={"q": "latte"})
+        item = await ac.get("/catalog/items/I-latte", params={"provider_id": "P-cat"})
+        unknown = await ac.post("/select", json={"context": context, "message": {
+            "order": {"provider": {"id": "P-cat"}, "items": [{"id": "I-missing"}]}}})
+
+    assert [entry["id"] for entry in found.json()["items"]] == ["I-latte"]
+    assert item.json()["price"] == {"currency": "INR", "value": "180.00"}
+    assert unknown.status_code == 400
+    assert unknown.json()["error"]["code"] == "30004"
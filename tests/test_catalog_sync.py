@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core.catalog_download import CatalogDownloader
+from app.core.catalog_store import CatalogStore
+from app.core.catalog_sync import CatalogSync, tag_values
+from app.core.ondc_context import format_ondc_timestamp
+
+
+def provider(items, provider_id="P1"):
+    return {"bpp/providers": [{"id": provider_id, "items": items}]}
+
+
+def item(item_id, price, **extra):
+    return {"id": item_id, "descriptor": {"name": f"Item {item_id}"}, "price": {"currency": "INR", "value": price},
+            **extra}
+
+
+def make_sync():
+    now = [1_700_000_000.0]
+    sent = []
+    sync = CatalogSync(store=CatalogStore(), interval=60, clock=lambda: now[0],
+                       submit=lambda action, payload: sent.append(payload))
+    return sync, now, sent
+
+
+def full_catalog(sync, sent, items):
+    sync.request_full("bpp-a", "https://bpp-a")
+    transaction_id = sent[-1]["context"]["transaction_id"]
+    return sync.apply({"transaction_id": transaction_id, "bpp_id": "bpp-a"}, provider(items))
+
+
+def test_contiguous_windows_apply_deltas_and_skip_unchanged_items():
+    sync, now, sent = make_sync()
+    full_catalog(sync, sent, [item("I1", "10"), item("I2", "20"), item("I3", "30")])
+    high_water = sync.high_water("bpp-a", "P1")
+
+    now[0] += 60
+    start, end = sync.request_window()
+    assert start == high_water
+    window = tag_values(sent[-1]["message"]["intent"], "catalog_inc")
+    assert window == {"start_time": format_ondc_timestamp.millis(start), "end_time": format_ondc_timestamp.millis(end)}
+
+    counts = sync.apply(
+        {"transaction_id": sent[-1]["context"]["transaction_id"], "bpp_id": "bpp-a"},
+        provider([item("I1", "10"), item("I2", "25"), item("I3", "30", time={"label": "disable"})]),
+    )
+    assert counts == {"upserted": 1, "unchanged": 1, "removed": 1}
+    assert sync.store.get_item("I2", "P1", "bpp-a").price == "25"
+    assert sync.store.get_item("I3", "P1", "bpp-a") is None
+    assert sync.high_water("bpp-a", "P1") == end
+    assert sync.stats()["gaps"] == 0
+
+
+def test_gap_triggers_one_full_reindex():
+    sync, now, sent = make_sync()
+    full_catalog(sync, sent, [item("I1", "10"), item("I2", "20")])
+
+    # A window that starts after the high-water mark leaves changes unseen
+    late = {"tags": [{"code": "catalog_inc", "list": [
+        {"code": "start_time", "value": format_ondc_timestamp.millis(int(now[0] * 1000) + 3_600_000)},
+        {"code": "end_time", "value": format_ondc_timestamp.millis(int(now[0] * 1000) + 7_200_000)},
+    ]}]}
+    sync.register("txn-late", late)
+    context = {"transaction_id": "txn-late", "bpp_id": "bpp-a", "bpp_uri": "https://bpp-a"}
+    sync.apply(context, provider([item("I3", "30")]))
+    sync.apply(context, provider([item("I4", "40")]))
+    assert sync.stats()["gaps"] == 1 and sync.stats()["full_requests"] == 2 and sync.stats()["stale_providers"] == 1
+
+    # The full catalog replaces the provider's items
+    counts = sync.apply({"transaction_id": sent[-1]["context"]["transaction_id"], "bpp_id": "bpp-a"},
+                        provider([item("I1", "10"), item("I4", "40")]))
+    assert counts == {"upserted": 0, "unchanged": 2, "removed": 2}
+    assert {i.id for i in sync.store.items_for_provider("bpp-a", "P1")} == {"I1", "I4"}
+    assert sync.stats()["stale_providers"] == 0
+
+
+def test_provider_first_seen_in_a_plain_search_is_not_a_gap():
+    sync, now, sent = make_sync()
+    sync.apply({"transaction_id": "txn-plain", "bpp_id": "bpp-a"}, provider([item("I1", "10")]))
+    assert sync.high_water("bpp-a", "P1") == int(now[0] * 1000)
+
+    now[0] += 60
+    sync.request_window()
+    sync.apply({"transaction_id": sent[-1]["context"]["transaction_id"], "bpp_id": "bpp-a",
+                "bpp_uri": "https://bpp-a"}, provider([item("I1", "12")]))
+    assert sync.stats()["gaps"] == 0 and sync.stats()["full_requests"] == 0
+    assert CatalogSync(store=CatalogStore()).interval == 0
+
+
+@pytest.mark.asyncio
+async def test_catalog_links_are_followed_only_for_signed_full_catalogs_on_the_bpp_host():
+    fetched = []
+
+    def handler(request):
+        fetched.append(str(request.url))
+        return httpx.Response(200, content=json.dumps(provider([item("I9", "90")])).encode("utf-8"))
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    sync, now, sent = make_sync()
+    sync.downloader = CatalogDownloader(store=sync.store, client_factory=lambda: client)
+    sync.request_full("bpp-a", "https://bpp-a.example.com")
+    context = {"transaction_id": sent[-1]["context"]["transaction_id"], "bpp_id": "bpp-a",
+               "bpp_uri": "https://bpp-a.example.com"}
+
+    def linked(url):
+        return {"tags": [{"code": "catalog_link", "list": [{"code": "type_value", "value": url}]}]}
+
+    sync.apply(context, linked("https://bpp-a.example.com/unsigned.json"))
+    sync.apply({**context, "transaction_id": "txn-unsolicited"}, linked("https://bpp-a.example.com/c.json"), True)
+    sync.apply(context, linked("http://bpp-a.example.com/plain.json"), True)
+    sync.apply(context, linked("https://169.254.169.254/latest/meta-data"), True)
+    assert sync.stats()["links_refused"] == 4
+
+    sync.apply(context, linked("https://bpp-a.example.com/catalog.json"), True)
+    while sync.downloader.stats()["completed"] < 1:
+        await asyncio.sleep(0.01)
+    assert fetched == ["https://bpp-a.example.com/catalog.json"]
+    assert sync.store.get_item("I9", "P1", "bpp-a") is not None and sync.high_water("bpp-a", "P1") is not None
+    await client.aclose()
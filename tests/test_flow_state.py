@@ -0,0 +1,76 @@
+import pytest
+from httpx import AsyncClient
+
+from app.core.flow_state import FlowStateMachine, FlowTransitionError
+from app.core.ondc_context import Deadline
+from app.core.ondc_dispatcher import dispatcher
+from app.core.transaction_store import InMemoryTransactionStore, SQLiteTransactionStore
+from app.main import app
+
+
+@pytest.mark.asyncio
+async def test_order_flow_rejects_out_of_order_and_repeated_steps():
+    now = [1000.0]
+    flows = FlowStateMachine(store=InMemoryTransactionStore("flows", clock=lambda: now[0]), clock=lambda: now[0])
+
+    with pytest.raises(FlowTransitionError):
+        await flows.advance("t1", "confirm")
+    for action in ("search", "select", "on_select", "init", "on_init", "confirm"):
+        await flows.advance("t1", action, Deadline(now[0] + 30, lambda: now[0]))
+    with pytest.raises(FlowTransitionError) as rejected:
+        await flows.advance("t1", "confirm")
+    assert rejected.value.state == "CONFIRMING"
+
+    # An errored on_confirm returns the flow to INITIALIZED, so confirm can be retried
+    await flows.advance("t1", "on_confirm", failed=True)
+    assert await flows.state("t1") == "INITIALIZED"
+    await flows.advance("t1", "confirm", Deadline(now[0] + 30, lambda: now[0]))
+    await flows.advance("t1", "on_confirm")
+    await flows.advance("t1", "status")
+    await flows.advance("t1", "on_status")
+    assert (await flows.describe("t1"))["state"] == "CONFIRMED"
+
+    # A request whose callback never came leaves the flow where it was once its deadline passes
+    await flows.advance("t1", "cancel", Deadline(now[0] + 30, lambda: now[0]))
+    now[0] += 31
+    assert await flows.state("t1") == "CONFIRMED"
+    await flows.advance("t1", "cancel", Deadline(now[0] + 30, lambda: now[0]))
+    with pytest.raises(FlowTransitionError):
+        await flows.advance("t1", "cancel")
+    assert flows.stats()["rejected"] == 3
+
+
+@pytest.mark.asyncio
+async def test_flow_state_survives_restart(tmp_path):
+    path = str(tmp_path / "flows.db")
+    flows = FlowStateMachine(store=SQLiteTransactionStore("flows", path=path, flush_interval=0.0))
+    for action in ("select", "on_select", "init"):
+        transition = await flows.advance("t2", action)
+    await flows.undo(transition)
+    await flows.store.close()
+
+    restarted = FlowStateMachine(store=SQLiteTransactionStore("flows", path=path))
+    assert await restarted.state("t2") == "SELECTED"
+    with pytest.raises(FlowTransitionError):
+        await restarted.advance("t2", "on_select")
+    await restarted.store.close()
+
+
+@pytest.mark.asyncio
+async def test_out_of_order_action_is_nacked_before_dispatch():
+    body = {"context": {"transaction_id": "txn-flow-confirm", "bpp_id": "bpp.example.com",
+                        "bpp_uri": "https://bpp.example.com"},
+            "message": {"order": {"provider": {"id": "P1"}}}}
+    submitted = dispatcher.stats()["submitted"]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/confirm", json=body)
+        callback = await ac.post("/on_init", json={"context": {**body["context"], "action": "on_init"},
+                                                   "message": {"order": {}}})
+        state = await ac.get("/flows/txn-flow-confirm")
+
+    assert response.status_code == 409
+    assert response.json()["error"]["code"] == "20007"
+    # A callback no request is waiting for is ACKed and dropped, not NACKed
+    assert callback.status_code == 200 and callback.json()["message"]["ack"]["status"] == "ACK"
+    assert state.json()["state"] == "NEW" and "select" in state.json()["allowed"]
+    assert dispatcher.stats()["submitted"] == submitted
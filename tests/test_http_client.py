@@ -0,0 +1,16 @@
+import pytest
+
+from app.core.http_client import ONDCHttpClient
+
+
+@pytest.mark.asyncio
+async def test_shared_client_is_reused_and_closed():
+    shared = ONDCHttpClient()
+    await shared.start()
+    client = shared.get_client()
+    assert shared.get_client() is client
+
+    await shared.close()
+    assert client.is_closed
+    assert shared.get_client() is not client
+    await shared.close()
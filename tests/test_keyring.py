@@ -0,0 +1,74 @@
+import base64
+import json
+
+from app.core.ondc_crypto import (KeyRing, create_signing_string, generate_credentials, hash_message,
+                                  parse_authorization_header)
+
+
+def write_credentials(tmp_path):
+    """Fresh credentials for a test key ring; nothing is read from secrets/"""
+    credentials_path = tmp_path / "ondc_credentials.json"
+    credentials_path.write_text(json.dumps(generate_credentials("bap.example.com")))
+    return credentials_path
+
+
+def test_sign_request_builds_verifiable_header(tmp_path):
+    credentials_path = write_credentials(tmp_path)
+
+    keyring = KeyRing(str(credentials_path))
+    body = b'{"context":{"action":"search"},"message":{}}'
+    header = keyring.sign_request(body, created=1700000000, expires=1700000300)
+
+    params = parse_authorization_header(header)
+    credentials = json.loads(credentials_path.read_text())
+    assert params["keyId"] == f"{credentials['subscriber_id']}|{credentials['unique_key_id']}|ed25519"
+    assert params["created"] == "1700000000"
+
+    signing_string = create_signing_string(hash_message(body), 1700000000, 1700000300)
+    keyring.material.signing_key.public_key().verify(
+        base64.b64decode(params["signature"]), signing_string.encode()
+    )
+
+
+def test_missing_credentials_leave_keyring_unavailable(tmp_path):
+    keyring = KeyRing(str(tmp_path / "missing.json"))
+    assert not keyring.available
+    assert keyring.material is None
+
+
+def test_shared_key_is_memoized_until_keyring_reload(tmp_path):
+    from app.core.ondc_crypto import ONDCCrypto
+
+    credentials_path = write_credentials(tmp_path)
+
+    keyring = KeyRing(str(credentials_path))
+    crypto = ONDCCrypto(keyring)
+    shared_key = crypto.create_shared_key("pre_prod")
+    assert shared_key is not None
+    assert crypto.create_shared_key("pre_prod") is shared_key
+
+    keyring.reload()
+    reloaded = crypto.create_shared_key("pre_prod")
+    assert reloaded == shared_key
+    assert reloaded is not shared_key
+
+
+async def test_rotation_swaps_keys_and_keeps_previous_during_overlap(tmp_path):
+    credentials_path = write_credentials(tmp_path)
+    verification_path = tmp_path / "ondc-site-verification.html"
+
+    keyring = KeyRing(str(credentials_path), site_verification_path=str(verification_path))
+    old = keyring.material
+    new = await keyring.rotate()
+
+    assert keyring.material is new
+    assert new.unique_key_id != old.unique_key_id
+    assert keyring.active_materials() == [new, old]
+    assert json.loads(credentials_path.read_text())["unique_key_id"] == new.unique_key_id
+    assert verification_path.exists()
+
+    # Out-of-band edits are picked up by the file watcher check
+    assert not await keyring.check_for_changes()
+    credentials_path.write_text(json.dumps(old.credentials))
+    assert await keyring.check_for_changes()
+    assert keyring.material.unique_key_id == old.unique_key_id
@@ -0,0 +1,64 @@
+import logging
+
+from app.core.logging_config import BodyLogger, LazyJSON, LogWriter, REDACTED
+
+
+class _Exploding:
+    def __str__(self):
+        raise AssertionError("body was serialized although INFO is disabled")
+
+
+def test_body_is_not_serialized_when_level_disabled():
+    log = logging.getLogger("app.tests.disabled")
+    log.setLevel(logging.WARNING)
+    body_logger = BodyLogger(sample_rates={})
+
+    body_logger.body(log, "request", {"payload": _Exploding()}, "/search")
+    assert body_logger.stats()["disabled"] == 1
+
+
+def test_sampling_size_cap_and_header_redaction(caplog):
+    body_logger = BodyLogger(sample_rates={"/": 1.0, "/on_search": 0.0}, max_chars=20)
+    log = logging.getLogger("app.tests.bodies")
+
+    with caplog.at_level(logging.INFO, logger="app.tests.bodies"):
+        body_logger.body(log, "catalog", {"items": list(range(1000))}, "/on_search")
+        body_logger.body(log, "select", {"items": list(range(1000))}, "/select")
+        body_logger.headers(log, "headers", {"Authorization": "Signature secret", "host": "x"}, "/select")
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 2
+    assert messages[0].endswith("...[truncated]")
+    assert len(messages[0]) < 60
+    assert "secret" not in messages[1] and REDACTED in messages[1]
+    assert body_logger.stats()["sampled_out"] == 1
+    assert str(LazyJSON(b"raw-bytes", 100)) == "raw-bytes"
+
+
+def test_body_is_captured_before_the_writer_thread_formats_it():
+    body = {"items": [1, 2]}
+    raw = bytearray(b'{"raw":1}')
+    lazy_body, lazy_raw = LazyJSON(body, 100), LazyJSON(raw, 100)
+    body["items"].append(3)
+    raw[:] = b"reused"
+
+    assert str(lazy_body) == '{"items":[1,2]}'
+    assert str(lazy_raw) == '{"raw":1}'
+
+
+def test_log_writer_hands_records_to_listener():
+    writer = LogWriter()
+    writer.start("app.tests.writer", level="INFO")
+    try:
+        captured = []
+
+        class _Capture(logging.Handler):
+            def emit(self, record):
+                captured.append(record.getMessage())
+
+        writer._listener.handlers = (_Capture(),)
+        logging.getLogger("app.tests.writer").info("%s", LazyJSON({"a": 1}, 100))
+    finally:
+        writer.stop("app.tests.writer")
+
+    assert captured == ['{"a":1}']
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.core.lookup_cache import SubscriberLookupCache
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_coalesced():
+    calls = []
+
+    async def fetcher(subscriber_id, unique_key_id):
+        calls.append(subscriber_id)
+        await asyncio.sleep(0.01)
+        return {"subscriber_id": subscriber_id, "signing_public_key": "pk"}
+
+    cache = SubscriberLookupCache(fetcher)
+    results = await asyncio.gather(*(cache.get("bpp.example.com") for _ in range(10)))
+
+    assert calls == ["bpp.example.com"]
+    assert all(r["signing_public_key"] == "pk" for r in results)
+    assert (await cache.get("bpp.example.com"))["subscriber_id"] == "bpp.example.com"
+
+    stats = cache.stats()
+    assert stats["misses"] == 10
+    assert stats["coalesced"] == 9
+    assert stats["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_refreshing():
+    versions = iter(["v1", "v2"])
+
+    async def fetcher(subscriber_id, unique_key_id):
+        return {"subscriber_id": subscriber_id, "version": next(versions)}
+
+    cache = SubscriberLookupCache(fetcher, ttl=0, stale_ttl=60)
+    assert (await cache.get("bpp.example.com"))["version"] == "v1"
+    assert (await cache.get("bpp.example.com"))["version"] == "v1"
+
+    await asyncio.sleep(0)
+    assert cache.stats()["refreshes"] == 1
+    assert cache._entries[("bpp.example.com", None)].value["version"] == "v2"
+
+
+@pytest.mark.asyncio
+async def test_negative_results_and_valid_until_are_honoured():
+    async def fetcher(subscriber_id, unique_key_id):
+        if subscriber_id == "missing":
+            return {"error": "Lookup failed: 404"}
+        return [{"subscriber_id": subscriber_id, "valid_until": "2000-01-01T00:00:00.000Z"}]
+
+    cache = SubscriberLookupCache(fetcher, negative_ttl=60)
+    await cache.get("missing")
+    await cache.get("missing")
+    assert cache.stats()["negative_hits"] == 1
+
+    # Expired registry records are never served from cache
+    await cache.get("expired")
+    await cache.get("expired")
+    assert cache.stats()["hits"] == 0
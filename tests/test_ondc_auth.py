@@ -0,0 +1,122 @@
+import base64
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from fastapi import FastAPI, Request
+from httpx import AsyncClient
+
+from app.core.ondc_auth import ONDCAuthMiddleware, ONDCAuthVerifier
+from app.core.ondc_crypto import create_signing_string, hash_message
+
+
+SUBSCRIBER_ID = "bpp.example.com"
+UNIQUE_KEY_ID = "key_1"
+
+
+def _signed_header(private_key: Ed25519PrivateKey, body: bytes, offset: int = 0) -> str:
+    created = int(time.time()) + offset
+    expires = created + 300
+    signing_string = create_signing_string(hash_message(body), created, expires)
+    signature = base64.b64encode(private_key.sign(signing_string.encode())).decode()
+    return (f'Signature keyId="{SUBSCRIBER_ID}|{UNIQUE_KEY_ID}|ed25519",algorithm="ed25519",'
+            f'created="{created}",expires="{expires}",headers="(created) (expires) digest",'
+            f'signature="{signature}"')
+
+
+def _build_app(verifier: ONDCAuthVerifier) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ONDCAuthMiddleware, verifier=verifier,
+                       route_modes={"/on_": "enforce", "/on_log": "log"})
+
+    @app.post("/on_select")
+    @app.post("/on_log")
+    async def callback(request: Request):
+        body = await request.body()
+        return {"body_length": len(body), "verified": request.state.ondc_auth.verified}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_signed_callback_is_verified_and_body_replayed():
+    private_key = Ed25519PrivateKey.generate()
+    public_key_b64 = base64.b64encode(private_key.public_key().public_bytes(
+        serialization.Encoding.Raw, serialization.PublicFormat.Raw)).decode()
+
+    verifier = ONDCAuthVerifier()
+    verifier.key_cache.put(SUBSCRIBER_ID, UNIQUE_KEY_ID, public_key_b64)
+    body = b'{"context":{"action":"on_select"},"message":{}}'
+
+    async with AsyncClient(app=_build_app(verifier), base_url="http://test") as ac:
+        ok = await ac.post("/on_select", content=body,
+                           headers={"Authorization": _signed_header(private_key, body)})
+        tampered = await ac.post("/on_select", content=body + b" ",
+                                 headers={"Authorization": _signed_header(private_key, body)})
+        logged = await ac.post("/on_log", content=body)
+
+    assert ok.status_code == 200
+    assert ok.json() == {"body_length": len(body), "verified": True}
+
+    assert tampered.status_code == 401
+    assert tampered.json()["message"]["ack"]["status"] == "NACK"
+
+    assert logged.status_code == 200
+    assert logged.json()["verified"] is False
+    assert verifier.stats()["verified"] == 1
+
+
+@pytest.mark.asyncio
+async def test_signature_created_slightly_ahead_is_accepted():
+    private_key = Ed25519PrivateKey.generate()
+    verifier = ONDCAuthVerifier(clock_skew=5)
+    verifier.key_cache.put(SUBSCRIBER_ID, UNIQUE_KEY_ID, base64.b64encode(private_key.public_key().public_bytes(
+        serialization.Encoding.Raw, serialization.PublicFormat.Raw)).decode())
+    body = b'{"context":{"action":"on_select"},"message":{}}'
+
+    async with AsyncClient(app=_build_app(verifier), base_url="http://test") as ac:
+        ahead = await ac.post("/on_select", content=body,
+                              headers={"Authorization": _signed_header(private_key, body, offset=3)})
+        future = await ac.post("/on_select", content=body,
+                               headers={"Authorization": _signed_header(private_key, body, offset=60)})
+
+    assert ahead.status_code == 200 and ahead.json()["verified"] is True
+    assert future.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_cached_keys_expire_and_follow_lookup_refreshes(monkeypatch):
+    from app.core.ondc_registry import registry_client
+
+    public_key_b64 = base64.b64encode(Ed25519PrivateKey.generate().public_key().public_bytes(
+        serialization.Encoding.Raw, serialization.PublicFormat.Raw)).decode()
+    lookups = []
+
+    async def fetch(subscriber_id, unique_key_id):
+        lookups.append(subscriber_id)
+        return [{"subscriber_id": subscriber_id, "ukId": unique_key_id, "signing_public_key": public_key_b64,
+                 "valid_until": "2099-01-01T00:00:00.000Z"}]
+
+    monkeypatch.setattr(registry_client.lookup_cache, "fetcher", fetch)
+    registry_client.lookup_cache.invalidate()
+    now = [1000.0]
+    verifier = ONDCAuthVerifier()
+    verifier.key_cache.clock = lambda: now[0]
+
+    assert await verifier.resolve_key(SUBSCRIBER_ID, "key_2") is not None
+    assert verifier.key_cache.get(SUBSCRIBER_ID, "key_2") is not None
+    now[0] += verifier.key_cache.ttl
+    assert verifier.key_cache.get(SUBSCRIBER_ID, "key_2") is None
+
+    # valid_until bounds the entry, and a (re)stored lookup entry drops the decoded key
+    verifier.key_cache.put(SUBSCRIBER_ID, "key_2", public_key_b64, valid_until=now[0] + 5)
+    now[0] += 5
+    assert verifier.key_cache.get(SUBSCRIBER_ID, "key_2") is None
+    verifier.key_cache.put(SUBSCRIBER_ID, "key_2", public_key_b64)
+    registry_client.lookup_cache.invalidate(SUBSCRIBER_ID)
+    await registry_client.lookup_subscriber(SUBSCRIBER_ID, "key_2")
+    assert verifier.key_cache.get(SUBSCRIBER_ID, "key_2") is None
+    assert lookups == [SUBSCRIBER_ID, SUBSCRIBER_ID]
+    registry_client.lookup_cache.listeners.remove(verifier.key_cache.on_lookup)
+    registry_client.lookup_cache.invalidate()
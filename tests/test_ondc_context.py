@@ -0,0 +1,52 @@
+import re
+import uuid
+
+from app.core.config import settings
+from app.core.ondc_context import ContextFactory, Deadline, format_ondc_timestamp, uuid4_batch
+from app.core.ondc_models import ONDCContext
+
+
+def test_timestamp_has_millisecond_resolution():
+    assert format_ondc_timestamp(1700000000.0) == "2023-11-14T22:13:20.000Z"
+    assert format_ondc_timestamp(1700000000.9999) == "2023-11-14T22:13:20.999Z"
+    assert format_ondc_timestamp(1700000001.25) == "2023-11-14T22:13:21.250Z"
+    assert re.fullmatch(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z", format_ondc_timestamp())
+
+
+def test_batched_ids_are_unique_uuid4():
+    ids = uuid4_batch(500)
+    assert len(set(ids)) == 500
+    assert all(uuid.UUID(i).version == 4 and str(uuid.UUID(i)) == i for i in ids)
+
+
+def test_build_and_reply_copy_the_template():
+    factory = ContextFactory(bap_id="bap.example.com", bap_uri="https://bap.example.com", id_batch_size=2)
+
+    first = factory.build("search", "txn-1", bpp_id="bpp.example.com")
+    second = factory.build("select", "txn-1")
+    assert list(first)[:11] == ["domain", "country", "city", "action", "core_version", "bap_id",
+                                "bap_uri", "transaction_id", "message_id", "timestamp", "ttl"]
+    assert first["bpp_id"] == "bpp.example.com" and "bpp_id" not in second
+    assert first["message_id"] != second["message_id"]
+    assert factory.static_fields["bap_id"] == "bap.example.com"
+
+    incoming = ONDCContext(domain="ONDC:RET11", transaction_id="txn-2", message_id="m-1")
+    reply = factory.reply(incoming, "on_search")
+    assert reply["domain"] == "ONDC:RET11"
+    assert reply["city"] == "std:011"
+    assert reply["transaction_id"] == "txn-2"
+    assert reply["message_id"] != "m-1"
+
+
+def test_deadline_runs_from_context_timestamp_plus_ttl():
+    now = [1700000100.0]
+    skew = settings.ONDC_DEADLINE_CLOCK_SKEW
+    sent = {"timestamp": format_ondc_timestamp(1700000090.0), "ttl": "PT30S"}
+    deadline = Deadline.from_context(sent, clock=lambda: now[0])
+    assert deadline.remaining() == 20 + skew
+    assert deadline.clamp(5.0) == 5.0 and not deadline.expired
+
+    # No usable timestamp: the budget starts on receipt
+    assert Deadline.from_context({"ttl": "PT5S"}, clock=lambda: now[0]).remaining() == 5 + skew
+    now[0] += 21 + skew
+    assert deadline.expired and deadline.clamp(5.0) == 0.0
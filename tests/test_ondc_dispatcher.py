@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from httpx import AsyncClient
+
+from app.core.ondc_context import Deadline, format_ondc_timestamp
+from app.core.ondc_dispatcher import (DispatchDeadlineExceeded, DispatchDestinationError, DispatchQueueFull,
+                                      ONDCDispatcher, dispatcher)
+from app.main import app
+
+
+def mock_client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_limits_concurrency_per_destination():
+    active = {"bpp-a.example.com": 0, "bpp-b.example.com": 0}
+    peak = dict(active)
+
+    async def handler(request):
+        host = request.url.host
+        active[host] += 1
+        peak[host] = max(peak[host], active[host])
+        await asyncio.sleep(0.01)
+        active[host] -= 1
+        return httpx.Response(200, json={"message": {"ack": {"status": "ACK"}}})
+
+    client = mock_client(handler)
+    outbound = ONDCDispatcher(queue_size=100, workers=8, per_destination=2, client_factory=lambda: client)
+    for i in range(10):
+        host = "bpp-a.example.com" if i % 2 else "bpp-b.example.com"
+        outbound.submit("select", {"context": {"bpp_uri": f"https://{host}", "transaction_id": f"t{i}"},
+                                   "message": {}})
+    await outbound.join()
+
+    stats = outbound.stats()
+    assert stats["delivered"] == 10 and stats["queue_depth"] == 0
+    assert peak == {"bpp-a.example.com": 2, "bpp-b.example.com": 2}
+    assert stats["delivery_latency"]["count"] == 10
+    await outbound.stop()
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_destination_does_not_hold_every_worker():
+    slow_bpp = asyncio.Event()
+    sent = []
+
+    async def handler(request):
+        if request.url.host == "slow.example.com":
+            await slow_bpp.wait()
+        sent.append(request.url.host)
+        return httpx.Response(200)
+
+    client = mock_client(handler)
+    outbound = ONDCDispatcher(queue_size=10, workers=2, per_destination=1, client_factory=lambda: client)
+    for host in ("slow", "slow", "slow", "fast"):
+        outbound.submit("select", {"context": {"bpp_uri": f"https://{host}.example.com"}, "message": {}})
+    await asyncio.sleep(0.05)
+    # The second worker parked the slow BPP's backlog and went on to the fast one
+    assert sent == ["fast.example.com"]
+    assert outbound.stats()["parked"] == {"slow.example.com": 2}
+
+    slow_bpp.set()
+    await outbound.join()
+    assert outbound.stats()["delivered"] == 4 and outbound.stats()["parked"] == {}
+    await outbound.stop()
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_rejects_when_full_or_without_destination():
+    outbound = ONDCDispatcher(queue_size=1, workers=1, per_destination=1,
+                              client_factory=lambda: mock_client(lambda r: httpx.Response(200)))
+    with pytest.raises(DispatchDestinationError):
+        outbound.submit("select", {"context": {}, "message": {}})
+    outbound.submit("search", {"context": {}, "message": {}})
+    with pytest.raises(DispatchQueueFull):
+        outbound.submit("search", {"context": {}, "message": {}})
+    assert outbound.stats()["rejected"] == 1
+    await outbound.stop(drain_timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_action_endpoint_acks_without_waiting_for_delivery(monkeypatch):
+    release = asyncio.Event()
+
+    async def handler(request):
+        await release.wait()
+        return httpx.Response(200)
+
+    client = mock_client(handler)
+    monkeypatch.setattr(dispatcher, "client_factory", lambda: client)
+    body = {"context": {"transaction_id": "txn-dispatch-1", "bpp_id": "bpp.example.com",
+                        "bpp_uri": "https://bpp.example.com"},
+            "message": {"order": {"provider": {"id": "P1"}}}}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await asyncio.wait_for(ac.post("/select", json=body), timeout=1)
+
+    assert response.status_code == 200
+    assert response.json()["message"]["ack"]["status"] == "ACK"
+    assert response.json()["context"]["action"] == "select"
+    assert response.json()["context"]["transaction_id"] == "txn-dispatch-1"
+    release.set()
+    await dispatcher.join()
+    assert dispatcher.stats()["delivered"] >= 1
+    await dispatcher.stop()
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_expired_requests_are_dropped_not_sent():
+    sent = []
+
+    async def handler(request):
+        sent.append(request.url.path)
+        await asyncio.sleep(0.2)
+        return httpx.Response(200)
+
+    client = mock_client(handler)
+    outbound = ONDCDispatcher(queue_size=10, workers=2, per_destination=1, client_factory=lambda: client)
+    body = {"context": {"bpp_uri": "https://bpp.example.com"}, "message": {}}
+    outbound.submit("select", body, Deadline.after(5))
+    # Waits behind the first call for the only connection slot and runs out of budget
+    outbound.submit("init", body, Deadline.after(0.05))
+    with pytest.raises(DispatchDeadlineExceeded):
+        stale = format_ondc_timestamp(time.time() - 120)
+        outbound.submit("confirm", {"context": {**body["context"], "timestamp": stale, "ttl": "PT30S"}})
+    await outbound.join()
+
+    assert sent == ["/select"]
+    assert outbound.stats()["expired"] == 2 and outbound.stats()["delivered"] == 1
+    await outbound.stop()
+    await client.aclose()
@@ -0,0 +1,35 @@
+import pytest
+from httpx import AsyncClient
+
+from app.core.ondc_models import REQUEST_MODELS, SelectRequest
+from app.main import app
+
+
+def test_envelope_is_validated_from_raw_bytes():
+    raw = (b'{"context":{"action":"select","transaction_id":"t1","bpp_id":"bpp.example.com","x_extra":1},'
+           b'"message":{"order":{"provider":{"id":"P1"},"items":[{"id":"I1","quantity":{"count":2}}]}}}')
+
+    envelope = SelectRequest.model_validate_json(raw)
+    assert envelope.context.transaction_id == "t1"
+    assert envelope.context.x_extra == 1
+    assert envelope.message.order.provider_id == "P1"
+    assert envelope.message.order.items[0]["quantity"]["count"] == 2
+    assert REQUEST_MODELS["on_select"].model_validate_json(raw).message.order.provider_id == "P1"
+
+
+@pytest.mark.asyncio
+async def test_routes_parse_envelope_once_and_reject_bad_bodies():
+    body = {
+        "context": {"action": "initiate", "transaction_id": "txn-models-1"},
+        "message": {"order": {"provider": {"id": "uidai.ondc.org"}}},
+    }
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        ok = await ac.post("/ekyc/initiate", json=body)
+        bad = await ac.post("/update", content=b'{"context": []}')
+
+    assert ok.status_code == 200
+    data = ok.json()
+    assert data["context"]["transaction_id"] == "txn-models-1"
+    assert data["context"]["domain"] == "ONDC:RET10"
+    assert data["message"]["order"]["provider"]["id"] == "uidai.ondc.org"
+    assert bad.status_code == 400
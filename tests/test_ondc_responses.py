@@ -0,0 +1,26 @@
+import json
+
+from app.core.ondc_models import ONDCContext
+from app.core.ondc_responses import ACK_BODY, ack_body, ack_response, nack_response
+
+
+def test_ack_template_splices_context():
+    context = {"action": "on_select", "transaction_id": "t1"}
+
+    assert json.loads(ACK_BODY) == {"message": {"ack": {"status": "ACK"}}}
+    assert json.loads(ack_body(context)) == {"context": context, "message": {"ack": {"status": "ACK"}}}
+    assert json.loads(ack_body(ONDCContext(**context))) == json.loads(ack_body(context))
+
+    response = ack_response(context)
+    assert response.media_type == "application/json"
+    assert response.body == ack_body(context)
+
+
+def test_nack_template_carries_error():
+    response = nack_response("POLICY-ERROR", "10001", "signature mismatch", status_code=401)
+
+    assert response.status_code == 401
+    assert json.loads(response.body) == {
+        "message": {"ack": {"status": "NACK"}},
+        "error": {"type": "POLICY-ERROR", "code": "10001", "message": "signature mismatch"},
+    }
@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.ondc_context import Deadline
+from app.core.ondc_dispatcher import ONDCDispatcher
+from app.core.retry_spool import DELIVERED, RETRY, RetrySpool
+
+
+async def wait_until(condition, timeout=2.0):
+    started = time.monotonic()
+    while not condition():
+        assert time.monotonic() - started < timeout
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_spooled_calls_survive_restart_and_retry_within_limits(tmp_path):
+    spool = RetrySpool(directory=str(tmp_path), base_delay=10.0, rng=lambda: 1.0)
+    spool.start(sender=None)
+    expires_at = time.time() + 60
+    for i in range(6):
+        await spool.add("select", f"https://bpp-{i % 2}/select", f"bpp-{i % 2}", b'{"n": %d}' % i, expires_at,
+                        f"txn-{i}", f"msg-{i}")
+    # A call that cannot be retried before its deadline is not spooled
+    assert await spool.add("init", "https://bpp-0/init", "bpp-0", b"{}", time.time() + 1) is None
+    await spool.stop()
+
+    # After a restart the entries are due (the clock has moved past their backoff)
+    active = {"bpp-0": 0, "bpp-1": 0}
+    peak = dict(active)
+    sent = []
+
+    async def sender(entry, body):
+        active[entry.destination] += 1
+        peak[entry.destination] = max(peak[entry.destination], active[entry.destination])
+        await asyncio.sleep(0.01)
+        active[entry.destination] -= 1
+        sent.append((entry.message_id, entry.attempts, body))
+        return DELIVERED if entry.attempts >= 2 or entry.destination == "bpp-1" else RETRY
+
+    restarted = RetrySpool(directory=str(tmp_path), base_delay=0.01, per_destination=2, rng=lambda: 1.0,
+                           clock=lambda: time.time() + 20)
+    restarted.start(sender)
+    assert restarted.stats()["replayed"] == 6
+    await wait_until(lambda: len(restarted) == 0)
+
+    stats = restarted.stats()
+    assert stats["delivered"] == 6 and stats["attempts"] == 9
+    assert peak == {"bpp-0": 2, "bpp-1": 2}
+    assert ("msg-4", 2, b'{"n": 4}') in sent
+    await restarted.stop()
+
+    # Finished entries are not replayed, and their segments are gone
+    again = RetrySpool(directory=str(tmp_path))
+    again.start()
+    assert len(again) == 0 and len(again.segments()) == 1
+    await again.stop()
+
+
+@pytest.mark.asyncio
+async def test_retries_stop_at_the_deadline(tmp_path):
+    spool = RetrySpool(directory=str(tmp_path), base_delay=0.02, rng=lambda: 1.0)
+    spool.start(sender=lambda entry, body: asyncio.sleep(0, RETRY))
+    await spool.add("confirm", "https://bpp/confirm", "bpp", b"{}", time.time() + 0.1)
+    await wait_until(lambda: len(spool) == 0)
+    # 0.02 + 0.04 s of backoff fit in the deadline; the next 0.08 s do not
+    assert spool.stats()["attempts"] == 2 and spool.stats()["expired"] == 1
+    await spool.stop()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_spools_retryable_failures(tmp_path):
+    answers = [503, 200]
+
+    def handler(request):
+        return httpx.Response(answers.pop(0))
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    spool = RetrySpool(directory=str(tmp_path), base_delay=0.01)
+    outbound = ONDCDispatcher(queue_size=10, workers=1, client_factory=lambda: client, spool=spool)
+    outbound.submit("status", {"context": {"bpp_uri": "https://bpp.example.com", "transaction_id": "t1"},
+                               "message": {}}, Deadline.after(5))
+    await outbound.join()
+    await wait_until(lambda: spool.stats()["delivered"] == 1)
+
+    stats = outbound.stats()
+    assert stats["spooled"] == 1 and stats["retried"] == 1 and stats["delivered"] == 1
+    await outbound.stop()
+    await client.aclose()
+
+
+class FullDisk:
+    """Segment file whose first write stores half the data and then fails"""
+
+    def __init__(self, file):
+        self.file = file
+        self.failed = False
+
+    def write(self, data):
+        if self.failed:
+            return self.file.write(data)
+        self.failed = True
+        self.file.write(data[:len(data) // 2])
+        raise OSError(28, "No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+@pytest.mark.asyncio
+async def test_calls_spooled_after_a_failed_write_are_read_back(tmp_path):
+    sent = []
+
+    async def sender(entry, body):
+        sent.append((entry.message_id, body))
+        return DELIVERED if entry.message_id == "msg-3" else RETRY
+
+    spool = RetrySpool(directory=str(tmp_path), base_delay=0.01, rng=lambda: 1.0)
+    spool.start(sender)
+    spool._file = FullDisk(spool._file)
+    expires_at = time.time() + 60
+    with pytest.raises(OSError):
+        await spool.add("select", "https://bpp/select", "bpp", b'{"n": 1}', expires_at, "txn-1", "msg-1")
+    await spool.add("select", "https://bpp/select", "bpp", b'{"n": 2}', expires_at, "txn-2", "msg-2")
+    await spool.add("init", "https://bpp/init", "bpp", b'{"n": 3}', expires_at, "txn-3", "msg-3")
+    await wait_until(lambda: spool.stats()["delivered"] == 1)
+    await spool.stop()
+
+    assert ("msg-3", b'{"n": 3}') in sent and ("msg-2", b'{"n": 2}') in sent
+    assert "msg-1" not in [message_id for message_id, _ in sent]
+    assert spool.stats()["damaged"] == 0
+
+    # The half-written frame does not hide the frames written after it
+    sent.clear()
+    restarted = RetrySpool(directory=str(tmp_path), clock=lambda: time.time() + 30)
+    restarted.start(lambda entry, body: asyncio.sleep(0, sent.append((entry.message_id, body)) or DELIVERED))
+    assert restarted.stats()["replayed"] == 1
+    await wait_until(lambda: len(restarted) == 0)
+    assert sent == [("msg-2", b'{"n": 2}')] and restarted.stats()["damaged"] == 0
+    await restarted.stop()
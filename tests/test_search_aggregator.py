@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.search_aggregator import SearchAggregator, search_aggregator
+from app.main import app
+
+
+def on_search(bpp_id, provider_id, item_ids, transaction_id="txn-search"):
+    context = {"transaction_id": transaction_id, "bpp_id": bpp_id, "bpp_uri": f"https://{bpp_id}"}
+    catalog = {"bpp/descriptor": {"name": bpp_id},
+               "bpp/providers": [{"id": provider_id, "items": [{"id": i} for i in item_ids]}]}
+    return context, catalog
+
+
+@pytest.mark.asyncio
+async def test_aggregator_merges_callbacks_until_ttl():
+    now = [1000.0]
+    aggregator = SearchAggregator(retention=60, clock=lambda: now[0])
+    aggregator.open("txn-search", "PT10S")
+
+    await aggregator.merge(*on_search("bpp-a", "P1", ["I1", "I2"]))
+    await aggregator.merge(*on_search("bpp-a", "P1", ["I2", "I3"]))
+    await aggregator.merge(*on_search("bpp-b", "P1", ["I9"]))
+
+    partial = aggregator.snapshot("txn-search")
+    assert not partial["complete"]
+    assert partial["responses"] == 3 and partial["provider_count"] == 2 and partial["item_count"] == 4
+
+    now[0] += 11
+    assert await aggregator.merge(*on_search("bpp-c", "P7", ["I1"])) is None
+    assert aggregator.stats()["late"] == 1
+    assert aggregator.snapshot("txn-search")["complete"]
+    assert len([chunk async for chunk in aggregator.stream("txn-search")]) == 3
+
+    now[0] += 61
+    assert aggregator.get("txn-search") is None
+
+
+@pytest.mark.asyncio
+async def test_repeated_search_after_the_window_starts_a_new_session():
+    now = [1000.0]
+    aggregator = SearchAggregator(retention=60, clock=lambda: now[0])
+    first = aggregator.open("txn-again", "PT10S")
+    await aggregator.merge(*on_search("bpp-a", "P1", ["I1"], transaction_id="txn-again"))
+    assert aggregator.open("txn-again", "PT30S") is first
+
+    now[0] += 11
+    second = aggregator.open("txn-again", "PT10S")
+    assert second is not first and second.expires_at == now[0] + 10
+    assert await aggregator.merge(*on_search("bpp-b", "P2", ["I2"], transaction_id="txn-again")) is not None
+    assert aggregator.snapshot("txn-again")["provider_count"] == 1
+
+    # The new session's retention replaces the old one's
+    now[0] += 55
+    assert aggregator.get("txn-again") is second
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_callbacks_as_they_arrive():
+    aggregator = SearchAggregator()
+    aggregator.open("txn-live", "PT0.3S")
+
+    async def consume():
+        return [chunk["bpp_id"] async for chunk in aggregator.stream("txn-live")]
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    await aggregator.merge(*on_search("bpp-a", "P1", ["I1"], "txn-live"))
+    await asyncio.sleep(0.05)
+    await aggregator.merge(*on_search("bpp-b", "P2", ["I2"], "txn-live"))
+    assert await asyncio.wait_for(consumer, 1) == ["bpp-a", "bpp-b"]
+
+
+@pytest.mark.asyncio
+async def test_on_search_endpoint_acks_and_serves_partial_results():
+    search_aggregator.open("txn-endpoint", "PT0.2S")
+    context, catalog = on_search("bpp-a", "P1", ["I1", "I2"], "txn-endpoint")
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        ack = await ac.post("/on_search", json={"context": {**context, "action": "on_search"},
+                                                "message": {"catalog": catalog}})
+        partial = await ac.get("/search/txn-endpoint/results")
+        streamed = await ac.get("/search/txn-endpoint/results", params={"format": "ndjson"})
+        missing = await ac.get("/search/unknown/results")
+
+    assert ack.json()["message"]["ack"]["status"] == "ACK"
+    assert partial.json()["item_count"] == 2
+    assert [json.loads(line)["bpp_id"] for line in streamed.text.splitlines()] == ["bpp-a"]
+    assert missing.status_code == 404
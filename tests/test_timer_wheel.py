@@ -0,0 +1,18 @@
+from app.core.timer_wheel import TimerWheel
+
+
+def test_timer_wheel_expires_due_keys_and_honours_cancel():
+    wheel = TimerWheel(tick=1.0, slots=8, clock=lambda: 0.0)
+    wheel.schedule("a", 3.0)
+    wheel.schedule("b", 5.0)
+    wheel.schedule("c", 20.0)  # more than one revolution away
+    wheel.schedule("d", 4.0)
+    assert wheel.cancel("d")
+    assert len(wheel) == 3
+
+    assert wheel.advance(2.0) == []
+    assert wheel.advance(3.0) == ["a"]
+    assert wheel.advance(12.0) == ["b"]
+    assert "c" in wheel
+    assert wheel.advance(100.0) == ["c"]
+    assert len(wheel) == 0
@@ -0,0 +1,41 @@
+import sys
+
+from app.core.transaction_records import TransactionRecord, TransactionStatus
+
+
+def test_record_round_trips_to_the_json_shape():
+    data = {
+        "order_id": "ekyc_order_1",
+        "status": "VERIFIED",
+        "provider_id": "uidai.ondc.org",
+        "created_at": "2024-01-01T00:00:05.123Z",
+        "updated_at": "2024-01-01T10:00:00+00:00",  # not ONDC format: kept verbatim
+        "verification_result": {"verified": True},
+        "auth_type": "OTP",
+    }
+    record = TransactionRecord.from_dict(data)
+
+    assert record.to_dict() == data
+    assert record.status is TransactionStatus.VERIFIED
+    assert record.created_at == 1704067205123
+    assert record.get("provider_id") == "uidai.ondc.org"
+    assert record.get("provider") is None
+    assert record.get("updated_at") == "2024-01-01T10:00:00+00:00"
+    assert not hasattr(record, "__dict__")
+
+
+def test_unknown_statuses_and_providers_are_interned():
+    first = TransactionRecord.from_dict({"status": "".join(["Acc", "epted"]), "provider": "".join(["p", "1"])})
+    second = TransactionRecord.from_dict({"status": "".join(["Accep", "ted"]), "provider": "".join(["p1"])})
+    assert first.status is second.status is sys.intern("Accepted")
+    assert first.provider is second.provider
+
+
+def test_explicit_none_values_survive_and_differ_from_missing_keys():
+    data = {"order_id": None, "status": "INITIATED", "verification_result": None}
+    record = TransactionRecord.from_dict(data)
+
+    assert record.to_dict() == data
+    assert record.get("order_id", "missing") is None
+    assert record.get("verification_result", "missing") is None
+    assert record.get("provider_id", "missing") == "missing"
@@ -0,0 +1,277 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.transaction_store import (InMemoryTransactionStore, JournaledTransactionStore, SQLiteTransactionStore,
+                                        ekyc_store)
+from app.main import app
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_batches_writes_and_is_shared_across_instances(tmp_path):
+    path = str(tmp_path / "transactions.db")
+    store = SQLiteTransactionStore("ekyc", path=path, flush_interval=60, batch_size=1000)
+
+    for i in range(50):
+        await store.put(f"txn-{i}", {"order_id": f"order-{i % 5}", "status": "INITIATED",
+                                     "updated_at": f"2024-01-01T00:00:{i:02d}.000Z"})
+    # Reads see pending (not yet committed) writes
+    assert (await store.get("txn-7"))["order_id"] == "order-2"
+    assert store.stats()["pending"] == 50
+
+    await store.update("txn-7", status="VERIFIED")
+    await store.delete("txn-8")
+    await store.flush()
+    assert store.stats()["flushes"] == 1
+
+    # A second worker opening the same file sees the committed state
+    other = SQLiteTransactionStore("ekyc", path=path)
+    assert (await other.get("txn-7"))["status"] == "VERIFIED"
+    assert await other.get("txn-8") is None
+    assert await other.count() == 49
+    assert list(await other.find(order_id="order-2", limit=2)) == ["txn-47", "txn-42"]
+    assert list(await other.find(status="VERIFIED")) == ["txn-7"]
+
+    # Namespaces do not see each other's records
+    assert await SQLiteTransactionStore("orders", path=path).count() == 0
+
+    await store.close()
+    await other.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_flushes_in_background(tmp_path):
+    store = SQLiteTransactionStore("ekyc", path=str(tmp_path / "t.db"), flush_interval=0.01)
+    await store.put("txn-1", {"status": "INITIATED"})
+    await asyncio.sleep(0.1)
+    assert store.stats()["pending"] == 0
+    assert store.stats()["flushed_rows"] == 1
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_reads_due_for_a_sweep_start_one_flush(tmp_path):
+    store = SQLiteTransactionStore("ekyc", path=str(tmp_path / "t.db"), flush_interval=60)
+    await store.start()
+    flushes = []
+    original = store._delayed_flush
+
+    def counting(delay):
+        flushes.append(delay)
+        return original(delay)
+
+    store._delayed_flush = counting
+    store._next_sweep = 0.0
+    await asyncio.gather(*(store.get(f"txn-{i}") for i in range(20)))
+    await store._flush_task
+    assert flushes == [0.0]
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_store_update_returns_none_for_missing():
+    store = InMemoryTransactionStore("ekyc")
+    assert await store.update("missing", status="VERIFIED") is None
+    await store.put("txn-1", {"status": "INITIATED"})
+    assert (await store.update("txn-1", status="VERIFIED"))["status"] == "VERIFIED"
+    assert await store.count() == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_updates_are_not_lost(tmp_path):
+    path = str(tmp_path / "t.db")
+    first = SQLiteTransactionStore("ekyc", path=path, flush_interval=0.0)
+    await first.put("txn-1", {"status": "INITIATED"})
+    await first.flush()
+    # Two workers merge different fields into the same committed row at once
+    second = SQLiteTransactionStore("ekyc", path=path)
+    await asyncio.gather(*(store.update("txn-1", **{f"{name}_{i}": i})
+                           for i in range(10) for name, store in (("first", first), ("second", second))))
+    await first.flush()
+    await second.flush()
+    merged = await SQLiteTransactionStore("ekyc", path=path).get("txn-1")
+    assert len(merged) == 21
+
+    # A failed BEGIN leaves no transaction to roll back; the original error surfaces
+    second._writer.execute("BEGIN IMMEDIATE")
+    first._writer.execute("PRAGMA busy_timeout = 0")
+    await first.put("txn-2", {"status": "INITIATED"})
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        await first.flush()
+    second._writer.execute("ROLLBACK")
+    await first.close()
+    await second.close()
+
+    journaled = JournaledTransactionStore("ekyc", directory=str(tmp_path / "journal"), commit_interval=0.001)
+    await journaled.put("txn-1", {"status": "INITIATED"})
+    await asyncio.gather(*(journaled.update("txn-1", **{f"field_{i}": i}) for i in range(10)))
+    assert len(await journaled.get("txn-1")) == 11
+    await journaled.close()
+
+
+@pytest.mark.asyncio
+async def test_update_with_default_upserts(tmp_path):
+    store = SQLiteTransactionStore("orders", path=str(tmp_path / "t.db"), flush_interval=60)
+    assert await store.update("missing", status="UPDATED") is None
+    # Created from the default whether the row is buffered, committed or absent
+    await store.put("buffered", {"created_at": "old"})
+    await store.update("buffered", default={"created_at": "new"}, status="UPDATED")
+    await store.flush()
+    await asyncio.gather(*(store.update("new", default={"created_at": "new"}, **{f"field_{i}": i})
+                           for i in range(5)))
+    await store.flush()
+
+    assert await store.get("buffered") == {"created_at": "old", "status": "UPDATED"}
+    assert await store.get("new") == {"created_at": "new", **{f"field_{i}": i for i in range(5)}}
+    await store.close()
+
+    memory = InMemoryTransactionStore("orders")
+    assert await memory.update("new", default={"n": 0}, status="UPDATED") == {"n": 0, "status": "UPDATED"}
+
+
+@pytest.mark.asyncio
+async def test_memory_store_evicts_per_status_retention():
+    now = [1000.0]
+    store = InMemoryTransactionStore("ekyc", retention={"INITIATED": 10, "VERIFIED": 100, "*": 0},
+                                     clock=lambda: now[0])
+    await store.put("initiated", {"status": "INITIATED"})
+    await store.put("verified", {"status": "VERIFIED"})
+    await store.put("forever", {"status": "OTHER"})
+
+    now[0] += 11
+    assert await store.get("initiated") is None
+    assert await store.count() == 2
+
+    # A write re-arms the expiry from the new status
+    await store.update("verified", status="INITIATED")
+    now[0] += 11
+    assert await store.count() == 1
+    assert store.stats()["expired"] == 2
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_archives_and_drops_expired_rows(tmp_path):
+    path = str(tmp_path / "t.db")
+    store = SQLiteTransactionStore("ekyc", path=path, flush_interval=60,
+                                   retention={"INITIATED": 0.05, "VERIFIED": 0.05, "*": 0},
+                                   archive_statuses=["VERIFIED"])
+    await store.put("initiated", {"status": "INITIATED"})
+    await store.put("verified", {"status": "VERIFIED"})
+    await store.put("kept", {"status": "OTHER"})
+    await store.flush()
+    assert await store.count() == 3
+
+    await asyncio.sleep(0.1)
+    # Expired rows are hidden before the sweep runs
+    assert await store.get("verified") is None
+    store._next_sweep = 0.0
+    await store.flush()
+
+    assert await store.count() == 1
+    assert store.stats()["archived"] == 1
+    assert store.stats()["expired"] == 1
+    archived = store._reader.execute("SELECT transaction_id FROM transactions_archive").fetchall()
+    assert archived == [("verified",)]
+    await store.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+async def test_store_pages_with_cursor_and_filters(tmp_path, backend):
+    if backend == "memory":
+        store = InMemoryTransactionStore("ekyc")
+    else:
+        store = SQLiteTransactionStore("ekyc", path=str(tmp_path / "t.db"), flush_interval=60)
+    for i in range(25):
+        await store.put(f"txn-{i:02d}", {"status": "VERIFIED" if i % 2 else "INITIATED",
+                                         "provider": f"p{i % 3}",
+                                         "updated_at": f"2024-01-01T00:00:{i:02d}.000Z"})
+
+    page, cursor = await store.page(10)
+    assert list(page)[:2] == ["txn-24", "txn-23"]
+    seen = list(page)
+    while cursor:
+        page, cursor = await store.page(10, cursor)
+        seen.extend(page)
+    assert seen == [f"txn-{i:02d}" for i in reversed(range(25))]
+
+    filtered = [key async for key, _ in store.iter_records(batch_size=2, status="VERIFIED", provider_id="p0",
+                                                           since="2024-01-01T00:00:05")]
+    assert filtered == ["txn-21", "txn-15", "txn-09"]
+    window = [key async for key, _ in store.iter_records(batch_size=3, since="2024-01-01T00:00:05",
+                                                         until="2024-01-01T00:00:12")]
+    assert window == [f"txn-{i:02d}" for i in reversed(range(5, 12))]
+    assert await store.counts("status") == {"VERIFIED": 12, "INITIATED": 13}
+    assert (await store.get_by_order("missing")) is None
+
+    # Rewrites and deletes move records within the listing order
+    await store.put("txn-00", {"status": "INITIATED", "updated_at": "2024-01-01T00:01:00.000Z"})
+    await store.delete("txn-24")
+    assert list((await store.page(3))[0]) == ["txn-00", "txn-23", "txn-22"]
+
+    with pytest.raises(ValueError):
+        await store.page(10, "not-a-cursor")
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_ekyc_transactions_endpoint_paginates_and_streams_ndjson():
+    for i in range(5):
+        await ekyc_store.put(f"list-{i}", {"status": "INITIATED", "provider": "list.example.com",
+                                           "updated_at": f"2030-01-01T00:00:0{i}.000Z"})
+    params = {"provider": "list.example.com", "limit": 2}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        first = (await ac.get("/ekyc/transactions", params=params)).json()
+        second = (await ac.get("/ekyc/transactions", params={**params, "cursor": first["next_cursor"]})).json()
+        streamed = await ac.get("/ekyc/transactions", params={**params, "format": "ndjson"})
+        bad = await ac.get("/ekyc/transactions", params={"cursor": "???"})
+
+    assert list(first["transactions"]) == ["list-4", "list-3"]
+    assert list(second["transactions"]) == ["list-2", "list-1"]
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [line["transaction_id"] for line in lines] == ["list-4", "list-3", "list-2", "list-1", "list-0"]
+    assert bad.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_memory_store_secondary_indexes_follow_state_changes():
+    store = InMemoryTransactionStore("ekyc")
+    await store.put("txn-1", {"order_id": "order-1", "status": "INITIATED", "provider": "p1"})
+    await store.put("txn-2", {"order_id": "order-2", "status": "INITIATED", "provider": "p1"})
+    await store.update("txn-1", status="VERIFIED")
+    await store.delete("txn-2")
+
+    assert await store.counts("status") == {"VERIFIED": 1}
+    assert await store.counts("provider_id") == {"p1": 1}
+    assert (await store.resolve(order_id="order-1"))[0] == "txn-1"
+    assert await store.resolve("missing", "order-2") is None
+    assert list(await store.find(status="INITIATED")) == []
+
+
+@pytest.mark.asyncio
+async def test_ekyc_status_resolves_by_order_id_only():
+    await ekyc_store.put("txn-order-lookup", {"order_id": "order-lookup", "status": "VERIFIED",
+                                              "updated_at": "2024-01-01T00:00:00.000Z"})
+    body = {"context": {"action": "status"}, "message": {"order_id": "order-lookup"}}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/ekyc/status", json=body)
+
+    assert response.status_code == 200
+    assert response.json()["context"]["transaction_id"] == "txn-order-lookup"
+    assert response.json()["message"]["order"]["status"] == "VERIFIED"
+
+
+@pytest.mark.asyncio
+async def test_stats_endpoint_awaits_record_counts():
+    before = await ekyc_store.count()
+    await ekyc_store.put("txn-stats", {"status": "INITIATED"})
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        stats = (await ac.get("/transactions/stats")).json()
+
+    assert "size" not in ekyc_store.stats()
+    assert stats["ekyc"]["size"] == before + 1
+    assert stats["ekyc"]["by_status"]["INITIATED"] >= 1